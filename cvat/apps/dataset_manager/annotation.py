@@ -7,6 +7,7 @@ from copy import copy, deepcopy
 import numpy as np
 from itertools import chain
 from scipy.optimize import linear_sum_assignment
+import shapely
 from shapely import geometry
 
 from cvat.apps.engine.models import ShapeType
@@ -200,6 +201,16 @@ class ObjectManager:
     def _modify_unmached_object(self, obj, end_frame):
         raise NotImplementedError()
 
+    @classmethod
+    def _calc_cost_matrix(cls, int_objects, old_objects, start_frame, overlap):
+        cost_matrix = np.empty(shape=(len(int_objects), len(old_objects)),
+            dtype=float)
+        for i, int_obj in enumerate(int_objects):
+            for j, old_obj in enumerate(old_objects):
+                cost_matrix[i][j] = 1 - cls._calc_objects_similarity(
+                    int_obj, old_obj, start_frame, overlap)
+        return cost_matrix
+
     def merge(self, objects, start_frame, overlap):
         # 1. Split objects on two parts: new and which can be intersected
         # with existing objects.
@@ -233,13 +244,9 @@ class ObjectManager:
             if frame in old_objects_by_frame:
                 int_objects = int_objects_by_frame[frame]
                 old_objects = old_objects_by_frame[frame]
-                cost_matrix = np.empty(shape=(len(int_objects), len(old_objects)),
-                    dtype=float)
                 # 5.1 Construct cost matrix for the frame.
-                for i, int_obj in enumerate(int_objects):
-                    for j, old_obj in enumerate(old_objects):
-                        cost_matrix[i][j] = 1 - self._calc_objects_similarity(
-                            int_obj, old_obj, start_frame, overlap)
+                cost_matrix = self._calc_cost_matrix(int_objects, old_objects,
+                    start_frame, overlap)
 
                 # 6. Find optimal solution using Hungarian algorithm.
                 row_ind, col_ind = linear_sum_assignment(cost_matrix)
@@ -348,6 +355,102 @@ class ShapeManager(ObjectManager):
                 return 0 # FIXME: need some similarity for points and polylines
         return 0
 
+    @staticmethod
+    def _get_boxes(points):
+        # (N, 4) array of [xmin, ymin, xmax, ymax]
+        return np.array([
+            [min(p[0::2]), min(p[1::2]), max(p[0::2]), max(p[1::2])] for p in points
+        ], dtype=float).reshape(-1, 4)
+
+    @staticmethod
+    def _get_boxes_intersection(boxes0, boxes1):
+        width = np.minimum(boxes0[:, None, 2], boxes1[None, :, 2]) - \
+            np.maximum(boxes0[:, None, 0], boxes1[None, :, 0])
+        height = np.minimum(boxes0[:, None, 3], boxes1[None, :, 3]) - \
+            np.maximum(boxes0[:, None, 1], boxes1[None, :, 1])
+        return width, height
+
+    @classmethod
+    def _calc_rectangles_similarity(cls, points0, points1):
+        boxes0 = cls._get_boxes(points0)
+        boxes1 = cls._get_boxes(points1)
+        width, height = cls._get_boxes_intersection(boxes0, boxes1)
+        overlap_area = np.clip(width, 0, None) * np.clip(height, 0, None)
+
+        area0 = (boxes0[:, 2] - boxes0[:, 0]) * (boxes0[:, 3] - boxes0[:, 1])
+        area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+        union_area = area0[:, None] + area1[None, :] - overlap_area
+
+        similarity = np.zeros(overlap_area.shape, dtype=float)
+        np.divide(overlap_area, union_area, out=similarity,
+            where=(area0[:, None] != 0) & (area1[None, :] != 0))
+        return similarity
+
+    @classmethod
+    def _calc_polygons_similarity(cls, points0, points1):
+        polygons0 = [geometry.Polygon(pairwise(p)) for p in points0]
+        polygons1 = [geometry.Polygon(pairwise(p)) for p in points1]
+
+        # Only the pairs with intersecting bounding boxes can overlap
+        width, height = cls._get_boxes_intersection(
+            cls._get_boxes(points0), cls._get_boxes(points1))
+        rows, cols = np.nonzero((0 < width) & (0 < height))
+
+        similarity = np.zeros((len(polygons0), len(polygons1)), dtype=float)
+        if not len(rows):
+            return similarity
+
+        if hasattr(shapely, 'intersection'): # the vectorized API of Shapely 2.0+
+            polygons0 = np.array(polygons0, dtype=object)
+            polygons1 = np.array(polygons1, dtype=object)
+            valid0, area0 = shapely.is_valid(polygons0), shapely.area(polygons0)
+            valid1, area1 = shapely.is_valid(polygons1), shapely.area(polygons1)
+
+            # an invalid polygon gives 0 similarity
+            mask = valid0[rows] & valid1[cols] & (area0[rows] != 0) & (area1[cols] != 0)
+            rows, cols = rows[mask], cols[mask]
+            overlap_area = shapely.area(shapely.intersection(polygons0[rows], polygons1[cols]))
+        else:
+            valid0 = [p.is_valid for p in polygons0]
+            valid1 = [p.is_valid for p in polygons1]
+            area0 = np.array([p.area for p in polygons0])
+            area1 = np.array([p.area for p in polygons1])
+
+            mask = [valid0[i] and valid1[j] and area0[i] != 0 and area1[j] != 0
+                for i, j in zip(rows, cols)]
+            rows, cols = rows[mask], cols[mask]
+            overlap_area = np.array([polygons0[i].intersection(polygons1[j]).area
+                for i, j in zip(rows, cols)], dtype=float)
+
+        similarity[rows, cols] = overlap_area / (area0[rows] + area1[cols] - overlap_area)
+        return similarity
+
+    @classmethod
+    def _calc_cost_matrix(cls, int_objects, old_objects, start_frame, overlap):
+        # Computes the same values as _calc_objects_similarity(),
+        # but for all the pairs of the same type at once
+        similarity = np.zeros((len(int_objects), len(old_objects)), dtype=float)
+
+        for shape_type, calc_similarity in (
+            (ShapeType.RECTANGLE, cls._calc_rectangles_similarity),
+            (ShapeType.POLYGON, cls._calc_polygons_similarity),
+        ):
+            int_idx = [i for i, obj in enumerate(int_objects) if obj["type"] == shape_type]
+            old_idx = [j for j, obj in enumerate(old_objects) if obj["type"] == shape_type]
+            if not int_idx or not old_idx:
+                continue
+
+            int_labels = np.array([int_objects[i].get("label_id") for i in int_idx], dtype=object)
+            old_labels = np.array([old_objects[j].get("label_id") for j in old_idx], dtype=object)
+            has_same_label = int_labels[:, None] == old_labels[None, :]
+
+            type_similarity = calc_similarity(
+                [int_objects[i]["points"] for i in int_idx],
+                [old_objects[j]["points"] for j in old_idx])
+            similarity[np.ix_(int_idx, old_idx)] = np.where(has_same_label, type_similarity, 0)
+
+        return 1 - similarity
+
     @staticmethod
     def _unite_objects(obj0, obj1):
         # TODO: improve the trivial implementation
@@ -764,6 +867,46 @@ class TrackManager(ObjectManager):
 
         return shapes
 
+    @staticmethod
+    def clip_track(track, start_frame, stop_frame):
+        """
+        Returns a copy of the track with shapes on the [start_frame, stop_frame]
+        frames only. The state of the track on the first visible frame of the
+        range becomes a keyframe. Returns None if the track isn't visible
+        on the frames.
+        """
+        if not track["shapes"]:
+            return None
+
+        track = deepcopy(track)
+        shapes = []
+        for shape in TrackManager.get_interpolated_shapes(track,
+                start_frame, stop_frame + 1):
+            keyframe = shape.pop("keyframe")
+            if not start_frame <= shape["frame"] <= stop_frame:
+                continue
+            if not shapes:
+                # The track is hidden on the first frames of the range
+                if shape["outside"]:
+                    continue
+                if not keyframe:
+                    # An interpolated shape isn't stored in the DB
+                    shape.pop("id", None)
+            elif not keyframe:
+                continue
+            shapes.append(shape)
+
+        if not shapes:
+            return None
+
+        track["shapes"] = shapes
+        track["frame"] = shapes[0]["frame"]
+        if track.get("elements"):
+            track["elements"] = [element for element in (
+                TrackManager.clip_track(element, start_frame, stop_frame)
+                for element in track["elements"]) if element is not None]
+        return track
+
     @staticmethod
     def _unite_objects(obj0, obj1):
         track = obj0 if obj0["frame"] < obj1["frame"] else obj1
@@ -8,6 +8,7 @@ import rq
 import os.path as osp
 from attr import attrib, attrs
 from collections import namedtuple
+from itertools import chain
 from types import SimpleNamespace
 from pathlib import Path
 from typing import (Any, Callable, DefaultDict, Dict, List, Literal, Mapping,
@@ -64,6 +65,13 @@ class InstanceLabelData:
                 **attr_mapping['immutable'],
             }
 
+        # Attribute ids are unique across labels
+        self._attribute_names = {
+            attr_id: attr_name
+            for attr_mapping in self._attribute_mapping_merged.values()
+            for attr_id, attr_name in attr_mapping.items()
+        }
+
     def _get_label_id(self, label_name):
         for db_label in self._label_mapping.values():
             if label_name == db_label.name:
@@ -74,9 +82,7 @@ class InstanceLabelData:
         return self._label_mapping[label_id].name
 
     def _get_attribute_name(self, attribute_id):
-        for attribute_mapping in self._attribute_mapping_merged.values():
-            if attribute_id in attribute_mapping:
-                return attribute_mapping[attribute_id]
+        return self._attribute_names.get(attribute_id)
 
     def _get_attribute_id(self, label_id, attribute_name, attribute_type=None):
         if attribute_type:
@@ -148,7 +154,7 @@ class InstanceLabelData:
                 **self._attribute_mapping[label_id]['mutable'],
                 **self._attribute_mapping[label_id]['immutable'],
             }
-
+            self._attribute_names[spec_id] = attribute.name
 
         return { 'spec_id': spec_id, 'value': value }
 
@@ -179,8 +185,16 @@ class TaskData(InstanceLabelData):
         'Frame', 'idx, id, frame, name, width, height, labeled_shapes, tags, shapes, labels')
     Labels = namedtuple('Label', 'id, name, color, type')
 
-    def __init__(self, annotation_ir, db_task, host='', create_callback=None):
+    def __init__(self, annotation_ir, db_task, host='', create_callback=None,
+            annotation_parts=None):
         self._annotation_ir = annotation_ir
+        # An optional iterable of (AnnotationIR, completed frame) pairs,
+        # which can be iterated several times. It allows to export
+        # annotations without keeping all of them in memory. Each part
+        # contains only objects, which can't be changed by the next parts,
+        # and all objects on frames before the completed frame are
+        # already returned when the pair is received.
+        self._annotation_parts = annotation_parts
         self._db_task = db_task
         self._host = host
         self._create_callback = create_callback
@@ -390,78 +404,117 @@ class TaskData(InstanceLabelData):
             type=label.type
         )
 
+    def _iter_annotation_parts(self):
+        if self._annotation_parts is None:
+            yield self._annotation_ir, self._db_task.data.size
+        else:
+            yield from self._annotation_parts
+
+    def _iter_tracks(self):
+        idx = 0
+        for annotation_ir, _ in self._iter_annotation_parts():
+            for track in annotation_ir.tracks:
+                yield track, idx
+                idx += 1
+
     def group_by_frame(self, include_empty=False):
-        frames = {}
-        def get_frame(idx):
+        def make_frame(idx):
             frame_info = self._frame_info[idx]
-            frame = self.abs_frame_id(idx)
-            if frame not in frames:
-                frames[frame] = TaskData.Frame(
-                    idx=idx,
-                    id=frame_info.get('id',0),
-                    frame=frame,
-                    name=frame_info['path'],
-                    height=frame_info["height"],
-                    width=frame_info["width"],
-                    labeled_shapes=[],
-                    tags=[],
-                    shapes=[],
-                    labels={}
-                )
-            return frames[frame]
+            return TaskData.Frame(
+                idx=idx,
+                id=frame_info.get('id',0),
+                frame=self.abs_frame_id(idx),
+                name=frame_info['path'],
+                height=frame_info["height"],
+                width=frame_info["width"],
+                labeled_shapes=[],
+                tags=[],
+                shapes=[],
+                labels={}
+            )
 
-        if include_empty:
-            for idx in self._frame_info:
-                if idx not in self._deleted_frames:
-                    get_frame(idx)
-
-        anno_manager = AnnotationManager(self._annotation_ir)
-        shape_data = ''
-        for shape in sorted(anno_manager.to_shapes(self._db_task.data.size),
-                key=lambda shape: shape.get("z_order", 0)):
-            if shape['frame'] not in self._frame_info or shape['frame'] in self._deleted_frames:
-                # After interpolation there can be a finishing frame
-                # outside of the task boundaries. Filter it out to avoid errors.
-                # https://github.com/openvinotoolkit/cvat/issues/2827
-                # Also we skipped deleted frames here
-                continue
-            if 'track_id' in shape:
-                if shape['outside']:
+        # The label table is the same for all frames, so it is exported once
+        exported_labels = {}
+        for label in self._label_mapping.values():
+            label = self._export_label(label)
+            exported_labels[label.id] = label
+
+        def export_frame(idx, shapes, tags):
+            frame = make_frame(idx)
+            # The sort is stable, so shapes with the same z_order keep
+            # the order, in which they were added
+            for shape in sorted(shapes, key=lambda shape: shape.get("z_order", 0)):
+                if 'track_id' in shape:
+                    frame.labeled_shapes.append(self._export_tracked_shape(shape))
+                else:
+                    frame.labeled_shapes.append(self._export_labeled_shape(shape))
+                    frame.shapes.append(self._export_shape(shape))
+
+            if frame.shapes:
+                frame.labels.update(exported_labels)
+
+            for tag in tags:
+                frame.tags.append(self._export_tag(tag))
+
+            return frame
+
+        def is_exported_frame(idx):
+            # After interpolation there can be a finishing frame
+            # outside of the task boundaries. Filter it out to avoid errors.
+            # https://github.com/openvinotoolkit/cvat/issues/2827
+            # Also we skipped deleted frames here
+            return idx in self._frame_info and idx not in self._deleted_frames
+
+        # Objects are accumulated per frame and frames are returned in order
+        # as soon as they can't get new objects
+        frame_shapes = {}
+        frame_tags = {}
+        next_frame = 0
+        track_offset = 0
+        for annotation_ir, completed_frame in self._iter_annotation_parts():
+            tracks = TrackManager(annotation_ir.tracks)
+            track_shapes = tracks.to_shapes(self._db_task.data.size)
+            for shape in track_shapes:
+                shape["track_id"] += track_offset
+            track_offset += len(annotation_ir.tracks)
+
+            for shape in chain(annotation_ir.shapes, track_shapes):
+                if not is_exported_frame(shape['frame']) or \
+                        shape.get('outside', False) and 'track_id' in shape:
                     continue
-                exported_shape = self._export_tracked_shape(shape)
-            else:
-                exported_shape = self._export_labeled_shape(shape)
-                shape_data = self._export_shape(shape)
-            get_frame(shape['frame']).labeled_shapes.append(exported_shape)
-            if shape_data:
-                get_frame(shape['frame']).shapes.append(shape_data)
-                for label in self._label_mapping.values():
-                    label = self._export_label(label)
-                    get_frame(shape['frame']).labels.update({label.id: label})
-
-        for tag in self._annotation_ir.tags:
-            if tag['frame'] not in self._frame_info or tag['frame'] in self._deleted_frames:
-                continue
-            get_frame(tag['frame']).tags.append(self._export_tag(tag))
+                frame_shapes.setdefault(shape['frame'], []).append(shape)
 
-        return iter(frames.values())
+            for tag in annotation_ir.tags:
+                if not is_exported_frame(tag['frame']):
+                    continue
+                frame_tags.setdefault(tag['frame'], []).append(tag)
+
+            completed_frame = min(completed_frame, self._db_task.data.size)
+            for idx in range(next_frame, completed_frame):
+                if idx in frame_shapes or idx in frame_tags or \
+                        include_empty and is_exported_frame(idx):
+                    yield export_frame(idx,
+                        frame_shapes.pop(idx, []), frame_tags.pop(idx, []))
+            next_frame = max(next_frame, completed_frame)
 
     @property
     def shapes(self):
-        for shape in self._annotation_ir.shapes:
-            if shape["frame"] not in self._deleted_frames:
-                yield self._export_labeled_shape(shape)
+        for annotation_ir, _ in self._iter_annotation_parts():
+            for shape in annotation_ir.shapes:
+                if shape["frame"] not in self._deleted_frames:
+                    yield self._export_labeled_shape(shape)
 
     @property
     def tracks(self):
-        for idx, track in enumerate(self._annotation_ir.tracks):
+        for track, idx in self._iter_tracks():
             yield self._export_track(track, idx)
 
     @property
     def tags(self):
-        for tag in self._annotation_ir.tags:
-            if tag["frame"] not in self._deleted_frames:
-                yield self._export_tag(tag)
+        for annotation_ir, _ in self._iter_annotation_parts():
+            for tag in annotation_ir.tags:
+                if tag["frame"] not in self._deleted_frames:
+                    yield self._export_tag(tag)
 
     @property
     def meta(self):
@@ -2,15 +2,16 @@
 #
 # SPDX-License-Identifier: MIT
 
-import os
 import os.path as osp
 import zipfile
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from io import BufferedWriter
 from tempfile import TemporaryDirectory
 from typing import Callable
 
+import cv2
 from datumaro.components.annotation import (AnnotationType, Bbox, Label,
                                             LabelCategories, Points, Polygon,
                                             PolyLine)
@@ -19,12 +20,14 @@ from datumaro.components.extractor import (DEFAULT_SUBSET_NAME, Extractor,
                                            Importer)
 from datumaro.util.image import Image
 from defusedxml import ElementTree
+from django.conf import settings
 
 from cvat.apps.dataset_manager.bindings import (ProjectData, TaskData,
                                                 get_defaulted_subset,
                                                 import_dm_annotations,
                                                 match_dm_item)
-from cvat.apps.dataset_manager.util import make_zip_archive
+from cvat.apps.dataset_manager.util import (get_export_cache, make_zip_info,
+    open_zip_entry)
 from cvat.apps.engine.frame_provider import FrameProvider
 
 from .registry import dm_env, exporter, importer
@@ -1176,49 +1179,115 @@ def dump_project_anno(dst_file: BufferedWriter, project_data: ProjectData, callb
     callback(dumper, project_data)
     dumper.close_document()
 
-def dump_media_files(task_data: TaskData, img_dir: str, project_data: ProjectData = None):
-    ext = ''
-    if task_data.meta['task']['mode'] == 'interpolation':
-        ext = FrameProvider.VIDEO_FRAME_EXT
-
-    frame_provider = FrameProvider(task_data.db_task.data)
-    frames = frame_provider.get_frames(
-        frame_provider.Quality.ORIGINAL,
-        frame_provider.Type.BUFFER)
-    for frame_id, (frame_data, _) in enumerate(frames):
-        if (project_data is not None and (task_data.db_task.id, frame_id) in project_data.deleted_frames) \
-            or frame_id in task_data.deleted_frames:
-            continue
-        frame_name = task_data.frame_info[frame_id]['path'] if project_data is None \
-            else project_data.frame_info[(task_data.db_task.id, frame_id)]['path']
-        img_path = osp.join(img_dir, frame_name + ext)
-        os.makedirs(osp.dirname(img_path), exist_ok=True)
-        with open(img_path, 'wb') as f:
-            f.write(frame_data.getvalue())
+def _encode_video_frame(image, ext, quality):
+    params = []
+    if ext.lower() in ('.jpg', '.jpeg'):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    success, result = cv2.imencode(ext, image, params)
+    if not success:
+        raise RuntimeError("Failed to encode image to '%s' format" % (ext))
+    return result.tobytes()
+
+def dump_media_files(task_data: TaskData, archive: zipfile.ZipFile, img_dir: str,
+        project_data: ProjectData = None):
+    is_video = task_data.meta['task']['mode'] == 'interpolation'
+    ext = settings.EXPORT_VIDEO_FRAME_EXT if is_video else ''
+    quality = settings.EXPORT_VIDEO_FRAME_QUALITY
+
+    db_data = task_data.db_task.data
+    frame_provider = FrameProvider(db_data)
+    chunk_size = db_data.chunk_size
+    # Encoded video frames don't depend on annotations, so they are kept
+    # in the export cache, if it is enabled, and reused by the next exports
+    cache = get_export_cache() if is_video else None
+
+    def is_deleted(frame_id):
+        return (project_data is not None and (task_data.db_task.id, frame_id) in project_data.deleted_frames) \
+            or frame_id in task_data.deleted_frames
+
+    def encode_chunk(chunk_number):
+        # Deleted frames are not encoded. They are kept in the cache as None
+        # and are encoded by the next exports, if they are restored.
+        first_frame_id = chunk_number * chunk_size
+        cache_key = 'video_frames_{}_{}_{}{}'.format(db_data.id, chunk_number,
+            ext.lower(), quality)
+        cached_frames = cache.get(cache_key) if cache is not None else None
+        if cached_frames is not None and all(frame_data is not None or is_deleted(frame_id)
+                for frame_id, frame_data in enumerate(cached_frames, first_frame_id)):
+            return cached_frames
+
+        frames = frame_provider.get_chunk_frames(chunk_number,
+            frame_provider.Quality.ORIGINAL, frame_provider.Type.NUMPY_ARRAY)
+        chunk_frames = []
+        for frame_id, (frame_data, _) in enumerate(frames, first_frame_id):
+            if cached_frames and cached_frames[frame_id - first_frame_id] is not None:
+                chunk_frames.append(cached_frames[frame_id - first_frame_id])
+            elif is_deleted(frame_id):
+                chunk_frames.append(None)
+            else:
+                chunk_frames.append(_encode_video_frame(frame_data, ext, quality))
+        if cache is not None:
+            cache.set(cache_key, chunk_frames)
+        return chunk_frames
+
+    def dump_chunk(chunk_number):
+        # Chunks are decoded and video frames are encoded in worker threads,
+        # the libraries release the GIL for the heavy work
+        if is_video:
+            frames = encode_chunk(chunk_number)
+        else:
+            frames = (frame_data.getbuffer() for frame_data, _ in
+                frame_provider.get_chunk_frames(chunk_number,
+                    frame_provider.Quality.ORIGINAL, frame_provider.Type.BUFFER))
+
+        return [(frame_id, frame_data)
+            for frame_id, frame_data in enumerate(frames, chunk_number * chunk_size)
+            if not is_deleted(frame_id)]
+
+    def write_chunk(chunk_frames):
+        # The archive is written only by the calling thread
+        for frame_id, frame_data in chunk_frames:
+            frame_name = task_data.frame_info[frame_id]['path'] if project_data is None \
+                else project_data.frame_info[(task_data.db_task.id, frame_id)]['path']
+            archive.writestr(make_zip_info(osp.join(img_dir, frame_name + ext)),
+                frame_data)
+
+    # Chunks are written in the original order, the number of chunks
+    # in flight is limited to keep memory consumption bounded
+    max_workers = settings.EXPORT_MEDIA_WORKERS
+    in_flight = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk_number in range(frame_provider.get_chunk_count()):
+                if len(in_flight) == 2 * max_workers:
+                    write_chunk(in_flight.popleft().result())
+                in_flight.append(executor.submit(dump_chunk, chunk_number))
+
+            while in_flight:
+                write_chunk(in_flight.popleft().result())
+    finally:
+        if cache is not None:
+            cache.close()
 
 def _export_task(dst_file, task_data, anno_callback, save_images=False):
-    with TemporaryDirectory() as temp_dir:
-        with open(osp.join(temp_dir, 'annotations.xml'), 'wb') as f:
+    # Annotations and media files are written directly into the archive
+    with zipfile.ZipFile(dst_file, 'w') as archive:
+        with open_zip_entry(archive, 'annotations.xml') as f:
             dump_task_anno(f, task_data, anno_callback)
 
         if save_images:
-            dump_media_files(task_data, osp.join(temp_dir, 'images'))
-
-        make_zip_archive(temp_dir, dst_file)
+            dump_media_files(task_data, archive, 'images')
 
 def _export_project(dst_file: str, project_data: ProjectData, anno_callback: Callable, save_images: bool=False):
-    with TemporaryDirectory() as temp_dir:
-        with open(osp.join(temp_dir, 'annotations.xml'), 'wb') as f:
+    with zipfile.ZipFile(dst_file, 'w') as archive:
+        with open_zip_entry(archive, 'annotations.xml') as f:
             dump_project_anno(f, project_data, anno_callback)
 
         if save_images:
             for task_data in project_data.task_data:
                 subset = get_defaulted_subset(task_data.db_task.subset, project_data.subsets)
-                subset_dir = osp.join(temp_dir, 'images', subset)
-                os.makedirs(subset_dir, exist_ok=True)
-                dump_media_files(task_data, subset_dir, project_data)
-
-        make_zip_archive(temp_dir, dst_file)
+                dump_media_files(task_data, archive, osp.join('images', subset), project_data)
 
 @exporter(name='CVAT for video', ext='ZIP', version='1.1')
 def _export_video(dst_file, instance_data, save_images=False):
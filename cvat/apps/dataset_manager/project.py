@@ -25,7 +25,7 @@ def export_project(project_id, dst_file, format_name,
     # https://github.com/opencv/cvat/issues/217
     with transaction.atomic():
         project = ProjectAnnotationAndData(project_id)
-        project.init_from_db()
+        project.init_from_db(use_cache=True)
 
     exporter = make_exporter(format_name)
     with open(dst_file, 'wb') as f:
@@ -112,12 +112,12 @@ class ProjectAnnotationAndData:
         if attributes:
             models.AttributeSpec.objects.bulk_create([a[1] for a in attributes])
 
-    def init_from_db(self):
+    def init_from_db(self, use_cache=False):
         self.reset()
 
         for task in self.db_tasks:
             annotation = TaskAnnotation(pk=task.id)
-            annotation.init_from_db()
+            annotation.init_from_db(use_cache=use_cache)
             self.task_annotations[task.id] = annotation
             self.annotation_irs[task.id] = annotation.ir_data
 
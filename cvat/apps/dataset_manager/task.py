@@ -3,10 +3,17 @@
 #
 # SPDX-License-Identifier: MIT
 
+import hashlib
+import json
+import os
+import pickle
+import tempfile
 from collections import OrderedDict
+from contextlib import ExitStack
 from enum import Enum
 
 from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
 from django.db.models.query import Prefetch
 from django.utils import timezone
 
@@ -14,10 +21,10 @@ from cvat.apps.engine import models, serializers
 from cvat.apps.engine.plugins import plugin_decorator
 from cvat.apps.profiler import silk_profile
 
-from .annotation import AnnotationIR, AnnotationManager
+from .annotation import AnnotationIR, AnnotationManager, TrackManager
 from .bindings import TaskData
 from .formats.registry import make_exporter, make_importer
-from .util import bulk_create
+from .util import bulk_create, get_export_cache
 
 
 class dotdict(OrderedDict):
@@ -69,7 +76,7 @@ def _merge_table_rows(rows, keys_for_merge, field_id):
     return list(merged_rows.values())
 
 class JobAnnotation:
-    def __init__(self, pk):
+    def __init__(self, pk, label_data=None):
         self.db_job = models.Job.objects.select_related('segment__task') \
             .select_for_update().get(id=pk)
 
@@ -78,13 +85,24 @@ class JobAnnotation:
         self.stop_frame = db_segment.stop_frame
         self.ir_data = AnnotationIR()
 
-        self.db_labels = {db_label.id:db_label
-            for db_label in (db_segment.task.project.label_set.all()
-            if db_segment.task.project_id else db_segment.task.label_set.all())}
+        if label_data is None:
+            label_data = self._get_label_data(db_segment.task)
+        self.db_labels, self.db_attributes = label_data
 
-        self.db_attributes = {}
-        for db_label in self.db_labels.values():
-            self.db_attributes[db_label.id] = {
+    @staticmethod
+    def _get_label_data(db_task):
+        """
+        Returns labels and attribute specs of the task. All jobs of a task
+        share them, so they can be read once and passed to every job.
+        """
+        db_labels = db_task.project.label_set if db_task.project_id \
+            else db_task.label_set
+        db_labels = {db_label.id:db_label
+            for db_label in db_labels.prefetch_related('attributespec_set')}
+
+        db_attributes = {}
+        for db_label in db_labels.values():
+            db_attributes[db_label.id] = {
                 "mutable": OrderedDict(),
                 "immutable": OrderedDict(),
                 "all": OrderedDict(),
@@ -95,11 +113,13 @@ class JobAnnotation:
                     ('value', db_attr.default_value),
                 ])
                 if db_attr.mutable:
-                    self.db_attributes[db_label.id]["mutable"][db_attr.id] = default_value
+                    db_attributes[db_label.id]["mutable"][db_attr.id] = default_value
                 else:
-                    self.db_attributes[db_label.id]["immutable"][db_attr.id] = default_value
+                    db_attributes[db_label.id]["immutable"][db_attr.id] = default_value
+
+                db_attributes[db_label.id]["all"][db_attr.id] = default_value
 
-                self.db_attributes[db_label.id]["all"][db_attr.id] = default_value
+        return db_labels, db_attributes
 
     def reset(self):
         self.ir_data.reset()
@@ -289,6 +309,12 @@ class JobAnnotation:
         db_task.updated_date = timezone.now()
         db_task.save()
 
+        # The job is locked, so the revision can be incremented in place.
+        # Job.save() is not used here because it adds a commit to the job.
+        self.db_job.revision += 1
+        models.Job.objects.filter(id=self.db_job.id).update(
+            revision=self.db_job.revision)
+
     def _save_to_db(self, data):
         self.reset()
         self._save_tags_to_db(data["tags"])
@@ -310,8 +336,237 @@ class JobAnnotation:
         self._create(data)
 
     def update(self, data):
-        self._delete(data)
-        self._create(data)
+        self._update(data)
+
+    TAG_FIELDS = ('frame', 'label_id', 'group', 'source')
+    SHAPE_FIELDS = ('label_id', 'type', 'frame', 'group', 'source', 'occluded',
+        'outside', 'z_order', 'rotation', 'points')
+    TRACK_FIELDS = ('label_id', 'frame', 'group', 'source')
+    TRACKED_SHAPE_FIELDS = ('type', 'frame', 'occluded', 'outside', 'z_order',
+        'rotation', 'points')
+
+    @staticmethod
+    def _update_fields(db_object, obj, fields):
+        updated = False
+        for field in fields:
+            if field in obj and getattr(db_object, field) != obj[field]:
+                setattr(db_object, field, obj[field])
+                updated = True
+
+        return updated
+
+    def _check_label(self, obj):
+        if obj["label_id"] not in self.db_labels:
+            raise AttributeError("label_id `{}` is invalid".format(obj["label_id"]))
+
+    @staticmethod
+    def _update_attributes(db_model, owner_field, owners):
+        # owners is a list of (owner id, attributes, allowed specs) items
+        if not owners:
+            return False
+
+        db_attrvals = {}
+        deleted_ids = []
+        for db_attrval in db_model.objects.filter(**{
+                owner_field + '__in': [owner[0] for owner in owners]}).order_by('id'):
+            owner_attrvals = db_attrvals.setdefault(getattr(db_attrval, owner_field), {})
+            if db_attrval.spec_id in owner_attrvals:
+                deleted_ids.append(db_attrval.id)
+            else:
+                owner_attrvals[db_attrval.spec_id] = db_attrval
+
+        created = []
+        updated = []
+        for owner_id, attributes, specs in owners:
+            owner_attrvals = db_attrvals.get(owner_id, {})
+            for attr in attributes:
+                if attr["spec_id"] not in specs:
+                    raise AttributeError("spec_id `{}` is invalid".format(attr["spec_id"]))
+                db_attrval = owner_attrvals.pop(attr["spec_id"], None)
+                if db_attrval is None:
+                    created.append(db_model(spec_id=attr["spec_id"],
+                        value=attr["value"], **{owner_field: owner_id}))
+                elif db_attrval.value != attr["value"]:
+                    db_attrval.value = attr["value"]
+                    updated.append(db_attrval)
+            deleted_ids.extend(db_attrval.id for db_attrval in owner_attrvals.values())
+
+        db_model.objects.bulk_create(created)
+        db_model.objects.bulk_update(updated, ['value'])
+        db_model.objects.filter(id__in=deleted_ids).delete()
+
+        return bool(created or updated or deleted_ids)
+
+    @staticmethod
+    def _get_db_elements(db_queryset, parent_ids):
+        db_elements = {}
+        for db_element in db_queryset.filter(parent_id__in=parent_ids):
+            db_elements.setdefault(db_element.parent_id, {})[db_element.id] = db_element
+
+        return db_elements
+
+    def _match_objects(self, objects, db_queryset):
+        # Returns pairs of objects and their rows (including elements), and
+        # objects, which should be created. If elements of a stored object
+        # were changed, the object is deleted and created again with
+        # the same id.
+        db_objects = db_queryset.filter(parent=None).in_bulk(
+            [obj["id"] for obj in objects if obj.get("id") is not None])
+        db_elements = self._get_db_elements(db_queryset, list(db_objects))
+
+        matched = []
+        new_objects = []
+        recreated_ids = []
+        for obj in objects:
+            db_object = db_objects.get(obj.get("id"))
+            if db_object is None:
+                new_objects.append(obj)
+                continue
+
+            elements = obj.get("elements", [])
+            db_object_elements = db_elements.get(db_object.id, {})
+            if set(element.get("id") for element in elements) != set(db_object_elements):
+                recreated_ids.append(db_object.id)
+                new_objects.append(obj)
+                continue
+
+            matched.append((obj, db_object))
+            matched.extend((element, db_object_elements[element["id"]])
+                for element in elements)
+
+        db_queryset.filter(id__in=recreated_ids).delete()
+
+        return matched, new_objects, bool(recreated_ids)
+
+    def _update_tags_in_db(self, tags):
+        db_tags = self.db_job.labeledimage_set.in_bulk(
+            [tag["id"] for tag in tags if tag.get("id") is not None])
+
+        new_tags = []
+        updated_db_tags = []
+        attribute_owners = []
+        for tag in tags:
+            db_tag = db_tags.get(tag.get("id"))
+            if db_tag is None:
+                new_tags.append(tag)
+                continue
+
+            self._check_label(tag)
+            if self._update_fields(db_tag, tag, self.TAG_FIELDS):
+                updated_db_tags.append(db_tag)
+            attribute_owners.append((db_tag.id, tag.get("attributes", []),
+                self.db_attributes[tag["label_id"]]["all"]))
+
+        models.LabeledImage.objects.bulk_update(updated_db_tags, self.TAG_FIELDS)
+        updated_attributes = self._update_attributes(models.LabeledImageAttributeVal,
+            'image_id', attribute_owners)
+        self._save_tags_to_db(new_tags)
+
+        return bool(new_tags or updated_db_tags or updated_attributes)
+
+    def _update_shapes_in_db(self, shapes):
+        matched, new_shapes, recreated = self._match_objects(shapes,
+            self.db_job.labeledshape_set)
+
+        updated_db_shapes = []
+        attribute_owners = []
+        for shape, db_shape in matched:
+            self._check_label(shape)
+            if self._update_fields(db_shape, shape, self.SHAPE_FIELDS):
+                updated_db_shapes.append(db_shape)
+            attribute_owners.append((db_shape.id, shape.get("attributes", []),
+                self.db_attributes[shape["label_id"]]["all"]))
+
+        models.LabeledShape.objects.bulk_update(updated_db_shapes, self.SHAPE_FIELDS)
+        updated_attributes = self._update_attributes(models.LabeledShapeAttributeVal,
+            'shape_id', attribute_owners)
+        self._save_shapes_to_db(new_shapes)
+
+        return bool(new_shapes or recreated or updated_db_shapes or updated_attributes)
+
+    def _update_tracks_in_db(self, tracks):
+        matched, new_tracks, recreated = self._match_objects(tracks,
+            self.db_job.labeledtrack_set)
+
+        db_tracked_shapes = {}
+        for db_shape in models.TrackedShape.objects.filter(
+                track_id__in=[db_track.id for _, db_track in matched]):
+            db_tracked_shapes.setdefault(db_shape.track_id, {})[db_shape.id] = db_shape
+
+        updated_db_tracks = []
+        track_attribute_owners = []
+        new_shapes = []
+        new_db_shapes = []
+        updated_db_shapes = []
+        deleted_shape_ids = []
+        shape_attribute_owners = []
+        for track, db_track in matched:
+            self._check_label(track)
+            if self._update_fields(db_track, track, self.TRACK_FIELDS):
+                updated_db_tracks.append(db_track)
+            track_attribute_owners.append((db_track.id, track.get("attributes", []),
+                self.db_attributes[track["label_id"]]["immutable"]))
+
+            mutable_specs = self.db_attributes[track["label_id"]]["mutable"]
+            db_track_shapes = db_tracked_shapes.get(db_track.id, {})
+            for shape in track["shapes"]:
+                db_shape = db_track_shapes.pop(shape.get("id"), None)
+                if db_shape is None:
+                    db_shape = models.TrackedShape(track_id=db_track.id, **{
+                        field: shape[field] for field in self.TRACKED_SHAPE_FIELDS
+                        if field in shape
+                    })
+                    new_shapes.append((shape, mutable_specs))
+                    new_db_shapes.append(db_shape)
+                    continue
+
+                if self._update_fields(db_shape, shape, self.TRACKED_SHAPE_FIELDS):
+                    updated_db_shapes.append(db_shape)
+                shape_attribute_owners.append((db_shape.id,
+                    shape.get("attributes", []), mutable_specs))
+            deleted_shape_ids.extend(db_track_shapes)
+
+        models.LabeledTrack.objects.bulk_update(updated_db_tracks, self.TRACK_FIELDS)
+        updated_attributes = self._update_attributes(models.LabeledTrackAttributeVal,
+            'track_id', track_attribute_owners)
+
+        models.TrackedShape.objects.filter(id__in=deleted_shape_ids).delete()
+        models.TrackedShape.objects.bulk_update(updated_db_shapes,
+            self.TRACKED_SHAPE_FIELDS)
+        new_db_shapes = bulk_create(
+            db_model=models.TrackedShape,
+            objects=new_db_shapes,
+            flt_param={"track__job_id": self.db_job.id}
+        )
+        for (shape, mutable_specs), db_shape in zip(new_shapes, new_db_shapes):
+            shape["id"] = db_shape.id
+            shape_attribute_owners.append((db_shape.id, shape.get("attributes", []),
+                mutable_specs))
+        updated_shape_attributes = self._update_attributes(
+            models.TrackedShapeAttributeVal, 'shape_id', shape_attribute_owners)
+
+        self._save_tracks_to_db(new_tracks)
+
+        return bool(new_tracks or recreated or updated_db_tracks or
+            updated_attributes or deleted_shape_ids or updated_db_shapes or
+            new_db_shapes or updated_shape_attributes)
+
+    def _update(self, data):
+        # Stored objects are compared with the received ones and only changed
+        # rows are updated, so ids of objects are kept. New objects are created
+        # and shapes missing in received tracks are deleted.
+        self.reset()
+        updated = self._update_tags_in_db(data["tags"])
+        updated = self._update_shapes_in_db(data["shapes"]) or updated
+        updated = self._update_tracks_in_db(data["tracks"]) or updated
+
+        self.ir_data.tags = data["tags"]
+        self.ir_data.shapes = data["shapes"]
+        self.ir_data.tracks = data["tracks"]
+
+        if updated:
+            self._set_updated_date()
+            self.db_job.save()
 
     def _delete(self, data=None):
         deleted_shapes = 0
@@ -357,12 +612,21 @@ class JobAnnotation:
                     ('value', db_attr.value),
                 ]))
 
-    def _init_tags_from_db(self):
-        db_tags = self.db_job.labeledimage_set.prefetch_related(
+    @staticmethod
+    def _filter_frames(db_queryset, start_frame, stop_frame):
+        if start_frame is None:
+            return db_queryset.all()
+        return db_queryset.filter(frame__gte=start_frame, frame__lte=stop_frame)
+
+    @classmethod
+    def _load_tags(cls, db_tags, db_attributes):
+        """Reads tags from the queryset and groups them by job ids"""
+        db_tags = db_tags.prefetch_related(
             "label",
             "labeledimageattributeval_set"
         ).values(
             'id',
+            'job_id',
             'frame',
             'label_id',
             'group',
@@ -384,19 +648,31 @@ class JobAnnotation:
             field_id='id',
         )
 
+        tags = {}
         for db_tag in db_tags:
-            self._extend_attributes(db_tag.labeledimageattributeval_set,
-                self.db_attributes[db_tag.label_id]["all"].values())
+            cls._extend_attributes(db_tag.labeledimageattributeval_set,
+                db_attributes[db_tag.label_id]["all"].values())
+            tags.setdefault(db_tag.job_id, []).append(db_tag)
 
-        serializer = serializers.LabeledImageSerializer(db_tags, many=True)
-        self.ir_data.tags = serializer.data
+        return {
+            job_id: serializers.LabeledImageSerializer(job_tags, many=True).data
+            for job_id, job_tags in tags.items()
+        }
 
-    def _init_shapes_from_db(self):
-        db_shapes = self.db_job.labeledshape_set.prefetch_related(
+    def _init_tags_from_db(self, start_frame=None, stop_frame=None):
+        tags = self._load_tags(self._filter_frames(self.db_job.labeledimage_set,
+            start_frame, stop_frame), self.db_attributes)
+        self.ir_data.tags = tags.get(self.db_job.id, [])
+
+    @classmethod
+    def _load_shapes(cls, db_shapes, db_attributes):
+        """Reads shapes from the queryset and groups them by job ids"""
+        db_shapes = db_shapes.prefetch_related(
             "label",
             "labeledshapeattributeval_set"
         ).values(
             'id',
+            'job_id',
             'label_id',
             'type',
             'frame',
@@ -426,114 +702,180 @@ class JobAnnotation:
         )
 
         shapes = {}
+        parent_shapes = {}
         for db_shape in db_shapes:
-            self._extend_attributes(db_shape.labeledshapeattributeval_set,
-                self.db_attributes[db_shape.label_id]["all"].values())
+            cls._extend_attributes(db_shape.labeledshapeattributeval_set,
+                db_attributes[db_shape.label_id]["all"].values())
 
             db_shape.elements = []
             if db_shape.parent is None:
-                shapes[db_shape.id] = db_shape
+                parent_shapes[db_shape.id] = db_shape
+                shapes.setdefault(db_shape.job_id, []).append(db_shape)
             else:
-                shapes[db_shape.parent].elements.append(db_shape)
+                parent_shapes[db_shape.parent].elements.append(db_shape)
 
-        serializer = serializers.LabeledShapeSerializer(list(shapes.values()), many=True)
-        self.ir_data.shapes = serializer.data
+        return {
+            job_id: serializers.LabeledShapeSerializer(job_shapes, many=True).data
+            for job_id, job_shapes in shapes.items()
+        }
 
-    def _init_tracks_from_db(self):
-        db_tracks = self.db_job.labeledtrack_set.prefetch_related(
-            "label",
-            "labeledtrackattributeval_set",
-            "trackedshape_set__trackedshapeattributeval_set"
-        ).values(
-            "id",
-            "frame",
-            "label_id",
-            "group",
-            "source",
-            "parent",
-            "labeledtrackattributeval__spec_id",
-            "labeledtrackattributeval__value",
-            "labeledtrackattributeval__id",
-            "trackedshape__type",
-            "trackedshape__occluded",
-            "trackedshape__z_order",
-            "trackedshape__rotation",
-            "trackedshape__points",
-            "trackedshape__id",
-            "trackedshape__frame",
-            "trackedshape__outside",
-            "trackedshape__trackedshapeattributeval__spec_id",
-            "trackedshape__trackedshapeattributeval__value",
-            "trackedshape__trackedshapeattributeval__id",
-        ).order_by('id', 'trackedshape__frame')
-
-        db_tracks = _merge_table_rows(
-            rows=db_tracks,
-            keys_for_merge={
-                "labeledtrackattributeval_set": [
-                    "labeledtrackattributeval__spec_id",
-                    "labeledtrackattributeval__value",
-                    "labeledtrackattributeval__id",
-                ],
-                "trackedshape_set":[
-                    "trackedshape__type",
-                    "trackedshape__occluded",
-                    "trackedshape__z_order",
-                    "trackedshape__points",
-                    "trackedshape__rotation",
-                    "trackedshape__id",
-                    "trackedshape__frame",
-                    "trackedshape__outside",
-                    "trackedshape__trackedshapeattributeval__spec_id",
-                    "trackedshape__trackedshapeattributeval__value",
-                    "trackedshape__trackedshapeattributeval__id",
-                ],
-            },
-            field_id="id",
-        )
+    def _init_shapes_from_db(self, start_frame=None, stop_frame=None):
+        shapes = self._load_shapes(self._filter_frames(self.db_job.labeledshape_set,
+            start_frame, stop_frame), self.db_attributes)
+        self.ir_data.shapes = shapes.get(self.db_job.id, [])
+
+    @staticmethod
+    def _get_attribute_values(db_attrvals, field_id):
+        # Attribute values are read by a separate query and grouped by the
+        # owner id. A join with the owner table would multiply rows.
+        attribute_values = {}
+        for owner_id, spec_id, value in db_attrvals.values_list(
+                field_id, 'spec_id', 'value').order_by('id'):
+            attribute_values.setdefault(owner_id, []).append(
+                OrderedDict([('spec_id', spec_id), ('value', value)]))
+
+        return attribute_values
+
+    @staticmethod
+    def _extend_attribute_values(attribute_values, default_attribute_values):
+        spec_ids = set(attr['spec_id'] for attr in attribute_values)
+        for default_value in default_attribute_values:
+            if default_value['spec_id'] not in spec_ids:
+                attribute_values.append(OrderedDict([
+                    ('spec_id', default_value['spec_id']),
+                    ('value', default_value['value']),
+                ]))
+
+        return attribute_values
+
+    def _get_tracks_queryset(self, start_frame, stop_frame):
+        db_tracks = self.db_job.labeledtrack_set.all()
+        if start_frame is None:
+            return db_tracks
+
+        # A track is visible on the frames if it starts before the end of
+        # the range and either has shapes inside the range or isn't finished
+        # by an outside shape before the range
+        db_last_shapes = models.TrackedShape.objects.filter(
+            track_id=OuterRef('id')).order_by('-frame')
+        db_parent_tracks = db_tracks.filter(parent=None, frame__lte=stop_frame) \
+            .annotate(
+                last_frame=Subquery(db_last_shapes.values('frame')[:1]),
+                last_outside=Subquery(db_last_shapes.values('outside')[:1]),
+            ).filter(Q(last_frame__gte=start_frame) | Q(last_outside=False)) \
+            .values('id')
+
+        return db_tracks.filter(Q(id__in=db_parent_tracks) |
+            Q(parent_id__in=db_parent_tracks))
+
+    @classmethod
+    def _load_tracks(cls, db_tracks, track_filter, db_attributes):
+        """
+        Reads tracks from the queryset and groups them by job ids.
+        The track_filter selects tracked shapes and attribute values
+        of the tracks.
+        """
+        # Tracks, tracked shapes and their attributes are read by separate
+        # queries and stitched together by ids. The result has the same
+        # structure as LabeledTrackSerializer output.
+        track_attribute_values = cls._get_attribute_values(
+            models.LabeledTrackAttributeVal.objects.filter(**track_filter),
+            'track_id')
+        shape_attribute_values = cls._get_attribute_values(
+            models.TrackedShapeAttributeVal.objects.filter(**{
+                'shape__' + key: value for key, value in track_filter.items()
+            }),
+            'shape_id')
+
+        tracked_shapes = {}
+        for (shape_id, track_id, shape_type, occluded, outside, z_order,
+                rotation, points, frame) in models.TrackedShape.objects.filter(
+                    **track_filter
+                ).values_list(
+                    'id', 'track_id', 'type', 'occluded', 'outside', 'z_order',
+                    'rotation', 'points', 'frame',
+                ).order_by('track_id', 'frame'):
+            tracked_shapes.setdefault(track_id, []).append(OrderedDict([
+                ('type', shape_type),
+                ('occluded', occluded),
+                ('outside', outside),
+                ('z_order', z_order),
+                ('rotation', rotation),
+                ('points', points),
+                ('id', shape_id),
+                ('frame', frame),
+                ('attributes', shape_attribute_values.get(shape_id, [])),
+            ]))
 
         tracks = {}
-        for db_track in db_tracks:
-            db_track["trackedshape_set"] = _merge_table_rows(db_track["trackedshape_set"], {
-                'trackedshapeattributeval_set': [
-                    'trackedshapeattributeval__value',
-                    'trackedshapeattributeval__spec_id',
-                    'trackedshapeattributeval__id',
-                ]
-            }, 'id')
-
-            # A result table can consist many equal rows for track/shape attributes
-            # We need filter unique attributes manually
-            db_track["labeledtrackattributeval_set"] = list(set(db_track["labeledtrackattributeval_set"]))
-            self._extend_attributes(db_track.labeledtrackattributeval_set,
-                self.db_attributes[db_track.label_id]["immutable"].values())
-
-            default_attribute_values = self.db_attributes[db_track.label_id]["mutable"].values()
-            for db_shape in db_track["trackedshape_set"]:
-                db_shape["trackedshapeattributeval_set"] = list(
-                    set(db_shape["trackedshapeattributeval_set"])
-                )
-                # in case of trackedshapes need to interpolate attriute values and extend it
-                # by previous shape attribute values (not default values)
-                self._extend_attributes(db_shape["trackedshapeattributeval_set"], default_attribute_values)
-                default_attribute_values = db_shape["trackedshapeattributeval_set"]
-
-            db_track.elements = []
-            if db_track.parent is None:
-                tracks[db_track.id] = db_track
+        parent_tracks = {}
+        for track_id, job_id, frame, label_id, group, source, parent_id in \
+                db_tracks.values_list('id', 'job_id', 'frame', 'label_id',
+                    'group', 'source', 'parent').order_by('id'):
+            db_label_attributes = db_attributes[label_id]
+            track = OrderedDict([
+                ('id', track_id),
+                ('frame', frame),
+                ('label_id', label_id),
+                ('group', group),
+                ('source', source),
+                ('shapes', tracked_shapes.get(track_id, [])),
+                ('attributes', cls._extend_attribute_values(
+                    track_attribute_values.get(track_id, []),
+                    db_label_attributes["immutable"].values())),
+            ])
+
+            # in case of trackedshapes need to interpolate attriute values and extend it
+            # by previous shape attribute values (not default values)
+            default_attribute_values = db_label_attributes["mutable"].values()
+            for shape in track['shapes']:
+                default_attribute_values = cls._extend_attribute_values(
+                    shape['attributes'], default_attribute_values)
+
+            if parent_id is None:
+                track['elements'] = []
+                parent_tracks[track_id] = track
+                tracks.setdefault(job_id, []).append(track)
             else:
-                tracks[db_track.parent].elements.append(db_track)
+                parent_tracks[parent_id]['elements'].append(track)
 
-        serializer = serializers.LabeledTrackSerializer(list(tracks.values()), many=True)
-        self.ir_data.tracks = serializer.data
+        return tracks
+
+    def _init_tracks_from_db(self, start_frame=None, stop_frame=None):
+        db_tracks = self._get_tracks_queryset(start_frame, stop_frame)
+        if start_frame is None:
+            track_filter = { 'track__job': self.db_job }
+        else:
+            track_filter = { 'track__in': db_tracks.values('id') }
+
+        tracks = self._load_tracks(db_tracks, track_filter, self.db_attributes)
+        self.ir_data.tracks = tracks.get(self.db_job.id, [])
 
     def _init_version_from_db(self):
         self.ir_data.version = 0 # FIXME: should be removed in the future
 
-    def init_from_db(self):
-        self._init_tags_from_db()
-        self._init_shapes_from_db()
-        self._init_tracks_from_db()
+    def init_from_db(self, start_frame=None, stop_frame=None):
+        """
+        Reads annotations of the job. If a frame range is specified, only
+        annotations on these frames are read, and tracks are clipped to
+        the range.
+        """
+        if start_frame is None and stop_frame is None:
+            self._init_tags_from_db()
+            self._init_shapes_from_db()
+            self._init_tracks_from_db()
+        else:
+            start_frame = self.start_frame if start_frame is None \
+                else max(start_frame, self.start_frame)
+            stop_frame = self.stop_frame if stop_frame is None \
+                else min(stop_frame, self.stop_frame)
+
+            self._init_tags_from_db(start_frame, stop_frame)
+            self._init_shapes_from_db(start_frame, stop_frame)
+            self._init_tracks_from_db(start_frame, stop_frame)
+            self.ir_data.tracks = [track for track in (
+                TrackManager.clip_track(track, start_frame, stop_frame)
+                for track in self.ir_data.tracks) if track is not None]
         self._init_version_from_db()
 
     @property
@@ -560,6 +902,101 @@ class JobAnnotation:
 
         self.create(task_data.data.slice(self.start_frame, self.stop_frame).serialize())
 
+class JobAnnotationCache:
+    """
+    Keeps annotations of jobs, as they are read from the DB, in the export
+    cache. An entry is used while the revision of the job and the label
+    specs of the task stay the same, so only changed jobs are read again.
+    If the export cache is disabled, nothing is kept.
+    """
+
+    def __init__(self, db_attributes):
+        self._cache = get_export_cache()
+        self._label_key = self._get_label_key(db_attributes)
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _get_label_key(db_attributes):
+        # Default attribute values are included into the annotations
+        label_specs = [
+            [label_id, list(label_attributes["mutable"]),
+                [[attr.spec_id, attr.value]
+                    for attr in label_attributes["all"].values()]]
+            for label_id, label_attributes in sorted(db_attributes.items())
+        ]
+        return hashlib.md5(json.dumps(label_specs).encode()).hexdigest()
+
+    @staticmethod
+    def _get_key(db_job):
+        return 'job_annotations_{}'.format(db_job.id)
+
+    def get(self, db_job):
+        if self._cache is None:
+            return None
+
+        entry = self._cache.get(self._get_key(db_job))
+        if entry is None or entry[0] != (db_job.revision, self._label_key):
+            return None
+
+        ir_data = AnnotationIR()
+        ir_data.data = entry[1]
+        return ir_data
+
+    def put(self, db_job, ir_data):
+        if self._cache is None:
+            return
+
+        self._cache.set(self._get_key(db_job),
+            ((db_job.revision, self._label_key), ir_data.data))
+
+class AnnotationPartsSpool:
+    """
+    Keeps (AnnotationIR, completed frame) pairs in a temporary file, so
+    the annotations can be read from the DB once and then iterated
+    several times without keeping all of them in memory. Every iteration
+    returns new copies of the parts, so they can be modified by the reader.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._parts = []
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def extend(self, parts):
+        for ir_data, completed_frame in parts:
+            buf = pickle.dumps((ir_data.data, completed_frame),
+                protocol=pickle.HIGHEST_PROTOCOL)
+            self._parts.append((self._file.tell(), len(buf)))
+            self._file.write(buf)
+        self._file.flush()
+
+    def __iter__(self):
+        # Positional reads don't change the file offset, so
+        # iterations can be interleaved
+        for offset, size in self._parts:
+            data, completed_frame = pickle.loads(
+                os.pread(self._file.fileno(), size, offset))
+            ir_data = AnnotationIR()
+            ir_data.data = data
+            yield ir_data, completed_frame
+
 class TaskAnnotation:
     def __init__(self, pk):
         self.db_task = models.Task.objects.prefetch_related(
@@ -614,26 +1051,187 @@ class TaskAnnotation:
             for db_job in self.db_jobs:
                 delete_job_data(db_job.id)
 
-    def init_from_db(self):
+    def init_from_db(self, use_cache=False):
+        """
+        Reads and merges annotations of all jobs. If use_cache is True,
+        annotations of unchanged jobs are taken from the export cache.
+        """
         self.reset()
 
-        for db_job in self.db_jobs:
-            annotation = JobAnnotation(db_job.id)
-            annotation.init_from_db()
-            if annotation.ir_data.version > self.ir_data.version:
-                self.ir_data.version = annotation.ir_data.version
-            db_segment = db_job.segment
-            start_frame = db_segment.start_frame
-            overlap = self.db_task.overlap
-            self._merge_data(annotation.ir_data, start_frame, overlap)
-
-    def export(self, dst_file, exporter, host='', **options):
-        task_data = TaskData(
-            annotation_ir=self.ir_data,
-            db_task=self.db_task,
-            host=host,
-        )
-        exporter(dst_file, task_data, **options)
+        # Annotations of all jobs are read by a few queries for the whole
+        # task. The jobs are locked in the same way as JobAnnotation does.
+        db_jobs = list(self.db_jobs.select_for_update())
+        _, db_attributes = JobAnnotation._get_label_data(self.db_task)
+
+        with ExitStack() as exit_stack:
+            cache = exit_stack.enter_context(JobAnnotationCache(db_attributes)) \
+                if use_cache else None
+            self._merge_from_db(db_jobs, db_attributes, cache)
+
+    def _merge_from_db(self, db_jobs, db_attributes, cache):
+        """
+        Reads annotations of the jobs, which are missing in the cache,
+        and merges annotations of all the jobs into ir_data
+        """
+        cached_data = {}
+        if cache is not None:
+            for db_job in db_jobs:
+                job_data = cache.get(db_job)
+                if job_data is not None:
+                    cached_data[db_job.id] = job_data
+
+        job_filter = { 'job_id__in': [db_job.id for db_job in db_jobs
+            if db_job.id not in cached_data] }
+        tags = JobAnnotation._load_tags(
+            models.LabeledImage.objects.filter(**job_filter), db_attributes)
+        shapes = JobAnnotation._load_shapes(
+            models.LabeledShape.objects.filter(**job_filter), db_attributes)
+        tracks = JobAnnotation._load_tracks(
+            models.LabeledTrack.objects.filter(**job_filter),
+            { 'track__' + key: value for key, value in job_filter.items() },
+            db_attributes)
+
+        def get_job_data(db_job):
+            if db_job.id in cached_data:
+                return cached_data.pop(db_job.id)
+
+            job_data = AnnotationIR()
+            job_data.tags = tags.pop(db_job.id, [])
+            job_data.shapes = shapes.pop(db_job.id, [])
+            job_data.tracks = tracks.pop(db_job.id, [])
+            if cache is not None:
+                cache.put(db_job, job_data)
+            return job_data
+
+        # Objects are collected in the order they would have
+        # if all jobs were merged into a single list
+        order = {}
+        for data, _ in self._iter_merged_data(db_jobs, get_job_data, order):
+            if data.version > self.ir_data.version:
+                self.ir_data.version = data.version
+            self.ir_data.tags.extend(data.tags)
+            self.ir_data.shapes.extend(data.shapes)
+            self.ir_data.tracks.extend(data.tracks)
+
+        for objects in (self.ir_data.tags, self.ir_data.shapes, self.ir_data.tracks):
+            objects.sort(key=lambda obj: order[id(obj)])
+
+    def _iter_merged_data(self, db_jobs, get_job_data, order=None):
+        """
+        Merges annotations of the jobs and yields (AnnotationIR, completed
+        frame) pairs. Each part contains merged objects, which can't be
+        affected by the next jobs. All objects on frames before the completed
+        frame are yielded by the moment the pair is received. Only objects
+        from the overlapping area and tracks, which are still visible,
+        are kept between jobs, so every merge compares the next job
+        only with the objects it can intersect. If the order dictionary
+        is passed, it receives positions of the objects in the merged lists.
+        """
+        ir_data = AnnotationIR()
+        annotation_manager = AnnotationManager(ir_data)
+        overlap = self.db_task.overlap
+        db_jobs = sorted(db_jobs, key=lambda db_job: db_job.segment.start_frame)
+        for i, db_job in enumerate(db_jobs):
+            job_data = get_job_data(db_job)
+            annotation_manager.merge(job_data, db_job.segment.start_frame, overlap)
+
+            if order is not None:
+                for objects in (ir_data.tags, ir_data.shapes, ir_data.tracks):
+                    for obj in objects:
+                        order.setdefault(id(obj), len(order))
+
+            if i + 1 < len(db_jobs):
+                next_start_frame = db_jobs[i + 1].segment.start_frame
+            else:
+                next_start_frame = self.db_task.data.size
+
+            completed_data = AnnotationIR()
+            completed_data.version = job_data.version
+            completed_data.tags = [tag for tag in ir_data.tags
+                if tag['frame'] < next_start_frame]
+            ir_data.tags = [tag for tag in ir_data.tags
+                if tag['frame'] >= next_start_frame]
+            completed_data.shapes = [shape for shape in ir_data.shapes
+                if shape['frame'] < next_start_frame]
+            ir_data.shapes = [shape for shape in ir_data.shapes
+                if shape['frame'] >= next_start_frame]
+
+            # A track can be merged with a track from the next job
+            # while it is visible
+            active_tracks = []
+            for track in ir_data.tracks:
+                last_shape = track['shapes'][-1]
+                if last_shape['frame'] < next_start_frame and last_shape['outside'] \
+                        or i + 1 == len(db_jobs):
+                    completed_data.tracks.append(track)
+                else:
+                    active_tracks.append(track)
+            ir_data.tracks = active_tracks
+
+            completed_frame = min([next_start_frame] +
+                [track['frame'] for track in active_tracks])
+
+            yield completed_data, completed_frame
+
+    def iter_from_db(self, use_cache=False):
+        """
+        Reads annotations job by job and yields (AnnotationIR, completed frame)
+        pairs, as described in _iter_merged_data. Only the current job and
+        the objects, which can be merged with it, are kept in memory: tracks
+        are kept until they are closed by an outside shape, but a track,
+        which is still open at the end of a job, is either continued by
+        a track of the next job or closed by the merge. So the memory usage
+        is bounded by the size of two adjacent jobs and the tracks passing
+        through them rather than the size of the task. If use_cache is True,
+        annotations of unchanged jobs are taken from the export cache.
+        The caller should run it in a transaction to get a consistent state
+        of all the jobs.
+        """
+        label_data = JobAnnotation._get_label_data(self.db_task)
+
+        with ExitStack() as exit_stack:
+            cache = exit_stack.enter_context(JobAnnotationCache(label_data[1])) \
+                if use_cache else None
+
+            def get_job_data(db_job):
+                annotation = JobAnnotation(db_job.id, label_data=label_data)
+                job_data = cache.get(annotation.db_job) if cache else None
+                if job_data is None:
+                    annotation.init_from_db()
+                    job_data = annotation.ir_data
+                    if cache:
+                        cache.put(annotation.db_job, job_data)
+                return job_data
+
+            yield from self._iter_merged_data(self.db_jobs, get_job_data)
+
+    def export(self, dst_file, exporter, host='', streaming=False,
+            use_cache=False, **options):
+        if not streaming:
+            task_data = TaskData(
+                annotation_ir=self.ir_data,
+                db_task=self.db_task,
+                host=host,
+            )
+            exporter(dst_file, task_data, **options)
+            return
+
+        with AnnotationPartsSpool() as annotation_parts:
+            # All jobs are read from the same snapshot, but they are locked
+            # only while the annotations are being read. The exporter can
+            # iterate over the annotations several times, so the parts are
+            # read once and then are replayed from the spool.
+            with transaction.atomic():
+                list(self.db_jobs.select_for_update())
+                annotation_parts.extend(self.iter_from_db(use_cache=use_cache))
+
+            task_data = TaskData(
+                annotation_ir=self.ir_data,
+                db_task=self.db_task,
+                host=host,
+                annotation_parts=annotation_parts,
+            )
+            exporter(dst_file, task_data, **options)
 
     def import_annotations(self, src_file, importer, **options):
         task_data = TaskData(
@@ -654,9 +1252,9 @@ class TaskAnnotation:
 
 @silk_profile(name="GET job data")
 @transaction.atomic
-def get_job_data(pk):
+def get_job_data(pk, start_frame=None, stop_frame=None):
     annotation = JobAnnotation(pk)
-    annotation.init_from_db()
+    annotation.init_from_db(start_frame=start_frame, stop_frame=stop_frame)
 
     return annotation.data
 
@@ -745,13 +1343,16 @@ def export_task(task_id, dst_file, format_name,
     # But there is the bug with corrupted dump file in case 2 or
     # more dump request received at the same time:
     # https://github.com/opencv/cvat/issues/217
-    with transaction.atomic():
-        task = TaskAnnotation(task_id)
-        task.init_from_db()
+    # Annotations are read job by job in one transaction before the export
+    # and are kept in a temporary file, so the jobs are not locked while
+    # the exporter runs and the whole task is never kept in memory.
+    # Only jobs changed after the previous export are read from the DB.
+    task = TaskAnnotation(task_id)
 
     exporter = make_exporter(format_name)
     with open(dst_file, 'wb') as f:
-        task.export(f, exporter, host=server_url, save_images=save_images)
+        task.export(f, exporter, host=server_url, streaming=True,
+            use_cache=True, save_images=save_images)
 
 @transaction.atomic
 def import_task_annotations(task_id, src_file, format_name):
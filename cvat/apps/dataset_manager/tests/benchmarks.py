@@ -0,0 +1,144 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+# The benchmarks are not a part of the regular test run.
+# Use the following command to run them:
+#   CVAT_BENCHMARKS=1 python manage.py test cvat.apps.dataset_manager.tests.benchmarks
+
+import logging
+import os
+import random
+from time import perf_counter
+from unittest import TestCase, skipUnless
+
+from django.test import TestCase as DbTestCase
+
+from cvat.apps.dataset_manager.annotation import (AnnotationIR,
+    AnnotationManager, ObjectManager, ShapeManager)
+from cvat.apps.dataset_manager.bindings import TaskData
+from cvat.apps.engine import models
+
+benchmark = skipUnless(os.getenv('CVAT_BENCHMARKS'),
+    'The benchmarks are enabled by the CVAT_BENCHMARKS environment variable')
+
+# The test settings silence the cvat loggers, so the results are reported
+# by a separate logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+logger.propagate = False
+
+
+def generate_shapes(frames, shapes_per_frame, labels=10, seed=0):
+    # Objects are concentrated in a small area, so that they overlap a lot
+    rng = random.Random(seed)
+    shapes = []
+    for frame in range(frames):
+        for _ in range(shapes_per_frame):
+            shape_type = rng.choice(["rectangle", "polygon"])
+            x, y = rng.uniform(0, 200), rng.uniform(0, 200)
+            if shape_type == "polygon":
+                points = []
+                for _ in range(rng.randint(3, 10)):
+                    points.extend([x + rng.uniform(0, 50), y + rng.uniform(0, 50)])
+            else:
+                points = [x, y, x + rng.uniform(5, 50), y + rng.uniform(5, 50)]
+
+            shapes.append({
+                "frame": frame,
+                "label_id": rng.randrange(labels),
+                "group": 0,
+                "source": "manual",
+                "type": shape_type,
+                "occluded": False,
+                "z_order": 0,
+                "rotation": 0,
+                "points": points,
+                "attributes": [],
+            })
+    return shapes
+
+class _BenchmarkMixin:
+    @staticmethod
+    def _measure(func, *args, **kwargs):
+        start = perf_counter()
+        result = func(*args, **kwargs)
+        return perf_counter() - start, result
+
+    def _report(self, name, seconds):
+        logger.info("%s.%s: %.3f s", type(self).__name__, name, seconds)
+
+@benchmark
+class ShapeMergeBenchmark(_BenchmarkMixin, TestCase):
+    FRAMES = 20
+    SHAPES_PER_FRAME = 300
+
+    def test_cost_matrix(self):
+        int_shapes = generate_shapes(1, self.SHAPES_PER_FRAME, seed=1)
+        old_shapes = generate_shapes(1, self.SHAPES_PER_FRAME, seed=2)
+
+        pairwise_time, expected = self._measure(
+            ObjectManager._calc_cost_matrix.__func__, ShapeManager,
+            int_shapes, old_shapes, 0, 0)
+        vectorized_time, actual = self._measure(
+            ShapeManager._calc_cost_matrix, int_shapes, old_shapes, 0, 0)
+
+        self._report("pairwise", pairwise_time)
+        self._report("vectorized", vectorized_time)
+        self.assertLess(abs(expected - actual).max(), 1e-9)
+
+    def test_merge(self):
+        overlap = self.FRAMES
+        data = AnnotationIR()
+        data.shapes = generate_shapes(self.FRAMES, self.SHAPES_PER_FRAME, seed=1)
+        job_data = AnnotationIR()
+        job_data.shapes = generate_shapes(self.FRAMES, self.SHAPES_PER_FRAME, seed=2)
+
+        merge_time, _ = self._measure(AnnotationManager(data).merge,
+            job_data, 0, overlap)
+
+        self._report("merge", merge_time)
+
+@benchmark
+class TaskExportBenchmark(_BenchmarkMixin, DbTestCase):
+    LABELS = 500
+    ATTRIBUTES_PER_LABEL = 2
+    FRAMES = 10000
+    SHAPES_PER_FRAME = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        db_data = models.Data.objects.create(size=cls.FRAMES,
+            chunk_size=36, start_frame=0, stop_frame=cls.FRAMES - 1)
+        models.Video.objects.create(data=db_data, path='video.mp4',
+            width=1920, height=1080)
+        cls.db_task = models.Task.objects.create(name='benchmark',
+            mode='interpolation', data=db_data, overlap=0)
+
+        cls.label_ids = []
+        for i in range(cls.LABELS):
+            db_label = models.Label.objects.create(task=cls.db_task,
+                name='label_{}'.format(i))
+            for j in range(cls.ATTRIBUTES_PER_LABEL):
+                models.AttributeSpec.objects.create(label=db_label,
+                    name='attribute_{}'.format(j), mutable=False,
+                    input_type=str(models.AttributeType.TEXT),
+                    default_value='', values='')
+            cls.label_ids.append(db_label.id)
+
+    def test_group_by_frame(self):
+        db_task = models.Task.objects.get(id=self.db_task.id)
+        annotations = AnnotationIR()
+        annotations.shapes = generate_shapes(self.FRAMES, self.SHAPES_PER_FRAME,
+            labels=self.LABELS)
+        for shape in annotations.shapes:
+            shape["label_id"] = self.label_ids[shape["label_id"]]
+
+        task_data = TaskData(annotation_ir=annotations, db_task=db_task)
+        export_time, frame_count = self._measure(
+            lambda: sum(1 for _ in task_data.group_by_frame(include_empty=True)))
+
+        self._report("group_by_frame", export_time)
+        self.assertEqual(frame_count, self.FRAMES)
@@ -2,10 +2,19 @@
 #
 # SPDX-License-Identifier: MIT
 
-from cvat.apps.dataset_manager.annotation import TrackManager
+from cvat.apps.dataset_manager.annotation import (AnnotationIR,
+    AnnotationManager, ObjectManager, ShapeManager, TrackManager)
+from cvat.apps.dataset_manager.task import (AnnotationPartsSpool,
+    JobAnnotationCache, TaskAnnotation, dotdict)
 
+import random
+from collections import OrderedDict
+from copy import deepcopy
+from types import SimpleNamespace
 from unittest import TestCase
 
+from django.test import SimpleTestCase, override_settings
+
 
 class TrackManagerTest(TestCase):
     def _check_interpolation(self, track):
@@ -316,3 +325,320 @@ class TrackManagerTest(TestCase):
 
         interpolated_shapes = TrackManager.get_interpolated_shapes(track, 0, 3)
         self.assertEqual(expected_shapes, interpolated_shapes)
+
+    @staticmethod
+    def _make_track(*keyframes):
+        return {
+            "frame": keyframes[0][0],
+            "label_id": 0,
+            "group": 0,
+            "source": "manual",
+            "attributes": [],
+            "elements": [],
+            "shapes": [
+                {
+                    "id": 100 + frame,
+                    "frame": frame,
+                    "points": [frame, frame, frame + 10.0, frame + 10.0],
+                    "type": "rectangle",
+                    "occluded": False,
+                    "outside": outside,
+                    "rotation": 0,
+                    "attributes": [],
+                }
+                for frame, outside in keyframes
+            ],
+        }
+
+    @staticmethod
+    def _get_clipped_shapes(track):
+        return [(shape["frame"], shape["outside"], shape.get("id"))
+            for shape in track["shapes"]]
+
+    def test_clip_track_started_before_range(self):
+        track = self._make_track((0, False), (8, False))
+
+        clipped = TrackManager.clip_track(track, 4, 6)
+
+        self.assertEqual(4, clipped["frame"])
+        self.assertEqual([(4, False, None)], self._get_clipped_shapes(clipped))
+        self.assertEqual([4.0, 4.0, 14.0, 14.0], clipped["shapes"][0]["points"])
+        self.assertEqual(0, track["frame"])
+
+    def test_clip_open_track(self):
+        track = self._make_track((0, False), (2, False))
+
+        clipped = TrackManager.clip_track(track, 4, 6)
+
+        self.assertEqual([(4, False, None)], self._get_clipped_shapes(clipped))
+        self.assertEqual([2.0, 2.0, 12.0, 12.0], clipped["shapes"][0]["points"])
+
+    def test_clip_track_keeps_keyframes_in_range(self):
+        track = self._make_track((0, False), (2, False), (3, True), (5, False))
+
+        clipped = TrackManager.clip_track(track, 1, 4)
+
+        self.assertEqual([(1, False, None), (2, False, 102), (3, True, 103)],
+            self._get_clipped_shapes(clipped))
+
+    def test_clip_track_hidden_at_range_start(self):
+        track = self._make_track((0, False), (2, True), (6, False), (9, True))
+
+        clipped = TrackManager.clip_track(track, 3, 9)
+
+        self.assertEqual(6, clipped["frame"])
+        self.assertEqual([(6, False, 106), (9, True, 109)],
+            self._get_clipped_shapes(clipped))
+
+    def test_clip_track_ended_before_range(self):
+        track = self._make_track((0, False), (2, True))
+
+        self.assertIsNone(TrackManager.clip_track(track, 2, 5))
+        self.assertIsNone(TrackManager.clip_track(track, 3, 5))
+
+    def test_clip_track_started_after_range(self):
+        track = self._make_track((6, False))
+
+        self.assertIsNone(TrackManager.clip_track(track, 2, 5))
+
+
+class ShapeManagerTest(TestCase):
+    @staticmethod
+    def _generate_shapes(count, seed):
+        rng = random.Random(seed)
+        shapes = []
+        for _ in range(count):
+            shape_type = rng.choice(["rectangle", "polygon", "points"])
+            x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+            if shape_type == "polygon":
+                points = []
+                for _ in range(rng.randint(3, 6)):
+                    points.extend([x + rng.uniform(0, 30), y + rng.uniform(0, 30)])
+            else:
+                points = [x, y, x + rng.uniform(0, 30), y + rng.uniform(0, 30)]
+
+            shapes.append({
+                "frame": 0,
+                "label_id": rng.choice([0, 1]),
+                "type": shape_type,
+                "points": points,
+            })
+        return shapes
+
+    def test_cost_matrix_matches_pairwise_similarity(self):
+        int_shapes = self._generate_shapes(40, seed=1)
+        old_shapes = self._generate_shapes(30, seed=2)
+
+        expected = ObjectManager._calc_cost_matrix.__func__(ShapeManager,
+            int_shapes, old_shapes, 0, 0)
+        actual = ShapeManager._calc_cost_matrix(int_shapes, old_shapes, 0, 0)
+
+        self.assertEqual(expected.shape, actual.shape)
+        self.assertLess(abs(expected - actual).max(), 1e-9)
+
+    def test_cost_matrix_handles_degenerate_shapes(self):
+        int_shapes = [
+            { "frame": 0, "label_id": 0, "type": "rectangle", "points": [1, 1, 1, 5] },
+            { "frame": 0, "label_id": 0, "type": "polygon", "points": [0, 0, 4, 4, 4, 0, 0, 4] },
+        ]
+        old_shapes = [
+            { "frame": 0, "label_id": 0, "type": "rectangle", "points": [0, 0, 4, 4] },
+            { "frame": 0, "label_id": 0, "type": "polygon", "points": [0, 0, 4, 0, 4, 4, 0, 4] },
+        ]
+
+        cost_matrix = ShapeManager._calc_cost_matrix(int_shapes, old_shapes, 0, 0)
+
+        # zero-area and self-intersecting shapes are not similar to anything
+        self.assertEqual(cost_matrix.tolist(), [[1, 1], [1, 1]])
+
+
+class TaskAnnotationMergeTest(TestCase):
+    SIZE = 30
+    SEGMENT_SIZE = 10
+    OVERLAP = 3
+
+    @staticmethod
+    def _generate_job_data(start_frame, stop_frame, seed):
+        rng = random.Random(seed)
+        def make_shape(frame, outside=False):
+            x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+            return {
+                "frame": frame,
+                "label_id": rng.choice([0, 1]),
+                "group": 0,
+                "source": "manual",
+                "type": "rectangle",
+                "occluded": False,
+                "outside": outside,
+                "z_order": 0,
+                "rotation": 0,
+                "points": [x, y, x + 10, y + 10],
+                "attributes": [],
+            }
+
+        data = AnnotationIR()
+        for frame in range(start_frame, stop_frame + 1):
+            data.tags.append({ "frame": frame, "label_id": rng.choice([0, 1]),
+                "group": 0, "source": "manual", "attributes": [] })
+            data.shapes.extend(make_shape(frame) for _ in range(rng.randint(0, 3)))
+
+        for _ in range(5):
+            frame = rng.randint(start_frame, stop_frame)
+            shapes = [make_shape(frame)]
+            if frame < stop_frame and rng.random() < 0.5:
+                shapes.append(make_shape(rng.randint(frame + 1, stop_frame),
+                    outside=True))
+            data.tracks.append({ "frame": frame, "label_id": shapes[0]["label_id"],
+                "group": 0, "source": "manual", "attributes": [],
+                "shapes": shapes, "elements": [] })
+
+        return data
+
+    def test_windowed_merge_keeps_objects_and_order(self):
+        db_jobs = []
+        jobs_data = {}
+        step = self.SEGMENT_SIZE - self.OVERLAP
+        for i, start_frame in enumerate(range(0, self.SIZE - self.OVERLAP, step)):
+            stop_frame = min(start_frame + self.SEGMENT_SIZE, self.SIZE) - 1
+            db_jobs.append(SimpleNamespace(id=i,
+                segment=SimpleNamespace(start_frame=start_frame)))
+            jobs_data[i] = self._generate_job_data(start_frame, stop_frame, seed=i)
+
+        expected = AnnotationIR()
+        for db_job in db_jobs:
+            AnnotationManager(expected).merge(deepcopy(jobs_data[db_job.id]),
+                db_job.segment.start_frame, self.OVERLAP)
+
+        task_annotation = SimpleNamespace(db_task=SimpleNamespace(
+            overlap=self.OVERLAP, data=SimpleNamespace(size=self.SIZE)))
+        order = {}
+        actual = AnnotationIR()
+        for data, _ in TaskAnnotation._iter_merged_data(task_annotation,
+                db_jobs, lambda db_job: deepcopy(jobs_data[db_job.id]), order):
+            actual.tags.extend(data.tags)
+            actual.shapes.extend(data.shapes)
+            actual.tracks.extend(data.tracks)
+        for objects in (actual.tags, actual.shapes, actual.tracks):
+            objects.sort(key=lambda obj: order[id(obj)])
+
+        self.assertEqual(expected.data, actual.data)
+
+    def test_open_track_is_completed_by_next_job(self):
+        db_jobs = [SimpleNamespace(id=i, segment=SimpleNamespace(start_frame=start_frame))
+            for i, start_frame in enumerate([0, 7, 14, 21])]
+        jobs_data = { db_job.id: AnnotationIR() for db_job in db_jobs }
+        # The track isn't closed by an outside shape in the first job
+        jobs_data[0].tracks.append({ "frame": 2, "label_id": 0, "group": 0,
+            "source": "manual", "attributes": [], "elements": [],
+            "shapes": [{ "frame": 2, "type": "rectangle", "occluded": False,
+                "outside": False, "z_order": 0, "rotation": 0,
+                "points": [0, 0, 10, 10], "attributes": [] }],
+        })
+
+        task_annotation = SimpleNamespace(db_task=SimpleNamespace(
+            overlap=self.OVERLAP, data=SimpleNamespace(size=self.SIZE)))
+        parts = list(TaskAnnotation._iter_merged_data(task_annotation,
+            db_jobs, lambda db_job: deepcopy(jobs_data[db_job.id])))
+
+        self.assertEqual([], parts[0][0].tracks)
+        self.assertEqual(2, parts[0][1])
+        self.assertEqual(1, len(parts[1][0].tracks))
+        self.assertTrue(parts[1][0].tracks[0]["shapes"][-1]["outside"])
+        self.assertEqual([14, 21, self.SIZE],
+            [completed_frame for _, completed_frame in parts[1:]])
+
+class AnnotationPartsSpoolTest(TestCase):
+    @staticmethod
+    def _make_part(frame):
+        data = AnnotationIR()
+        data.version = frame
+        data.tags = [{ "frame": frame, "label_id": 0, "group": 0,
+            "source": "manual", "attributes": [] }]
+        return data, frame + 1
+
+    def test_can_iterate_parts_several_times(self):
+        parts = [self._make_part(frame) for frame in range(5)]
+        with AnnotationPartsSpool() as spool:
+            spool.extend(parts)
+
+            for _ in range(2):
+                actual = [(data.data, frame) for data, frame in spool]
+                self.assertEqual([(data.data, frame) for data, frame in parts],
+                    actual)
+
+    def test_can_interleave_iterations(self):
+        parts = [self._make_part(frame) for frame in range(5)]
+        with AnnotationPartsSpool() as spool:
+            spool.extend(parts)
+
+            for (data1, frame1), (data2, frame2) in zip(spool, spool):
+                self.assertEqual(data1.data, data2.data)
+                self.assertEqual(frame1, frame2)
+
+    def test_returns_new_copies_of_parts(self):
+        with AnnotationPartsSpool() as spool:
+            spool.extend([self._make_part(0)])
+
+            data, _ = next(iter(spool))
+            data.tags.clear()
+
+            data, _ = next(iter(spool))
+            self.assertEqual(1, len(data.tags))
+
+@override_settings(EXPORT_CACHE_SIZE=16 * 1024 ** 2)
+class JobAnnotationCacheTest(SimpleTestCase):
+    DB_ATTRIBUTES = {
+        1: {
+            "mutable": OrderedDict(),
+            "immutable": OrderedDict([(2, dotdict(spec_id=2, value="a"))]),
+            "all": OrderedDict([(2, dotdict(spec_id=2, value="a"))]),
+        },
+    }
+
+    @staticmethod
+    def _make_data():
+        data = AnnotationIR()
+        data.tags = [{ "frame": 0, "label_id": 1, "group": 0, "source": "manual",
+            "attributes": [{ "spec_id": 2, "value": "a" }] }]
+        return data
+
+    def _put(self, db_job, data, db_attributes=None):
+        with JobAnnotationCache(db_attributes or self.DB_ATTRIBUTES) as cache:
+            cache.put(db_job, data)
+
+    def _get(self, db_job, db_attributes=None):
+        with JobAnnotationCache(db_attributes or self.DB_ATTRIBUTES) as cache:
+            return cache.get(db_job)
+
+    def test_can_reuse_annotations_of_unchanged_job(self):
+        db_job = SimpleNamespace(id=100000, revision=1)
+        data = self._make_data()
+        self._put(db_job, data)
+
+        cached_data = self._get(db_job)
+
+        self.assertEqual(data.data, cached_data.data)
+
+    def test_does_not_reuse_annotations_of_changed_job(self):
+        db_job = SimpleNamespace(id=100001, revision=1)
+        self._put(db_job, self._make_data())
+
+        db_job.revision += 1
+
+        self.assertIsNone(self._get(db_job))
+
+    def test_does_not_reuse_annotations_after_label_changes(self):
+        db_job = SimpleNamespace(id=100002, revision=1)
+        self._put(db_job, self._make_data())
+
+        db_attributes = deepcopy(self.DB_ATTRIBUTES)
+        db_attributes[1]["all"][2]["value"] = "b"
+
+        self.assertIsNone(self._get(db_job, db_attributes))
+
+    @override_settings(EXPORT_CACHE_SIZE=0)
+    def test_does_not_keep_annotations_if_cache_is_disabled(self):
+        db_job = SimpleNamespace(id=100003, revision=1)
+        self._put(db_job, self._make_data())
+
+        self.assertIsNone(self._get(db_job))
@@ -0,0 +1,483 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import copy
+from io import BytesIO
+
+from django.contrib.auth.models import Group, User
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from cvat.apps.engine.models import (LabeledShape, LabeledShapeAttributeVal,
+    TrackedShape, TrackedShapeAttributeVal)
+
+
+def generate_image_file(filename, size=(100, 50)):
+    f = BytesIO()
+    image = Image.new('RGB', size=size)
+    image.save(f, 'jpeg')
+    f.name = filename
+    f.seek(0)
+    return f
+
+
+class ForceLogin:
+    def __init__(self, user, client):
+        self.user = user
+        self.client = client
+
+    def __enter__(self):
+        if self.user:
+            self.client.force_login(self.user,
+                backend='django.contrib.auth.backends.ModelBackend')
+
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if self.user:
+            self.client.logout()
+
+class _JobAnnotationTestBase(APITestCase):
+    IMAGES_COUNT = 10
+
+    def setUp(self):
+        self.client = APIClient()
+
+    @classmethod
+    def setUpTestData(cls):
+        (group_admin, _) = Group.objects.get_or_create(name="admin")
+        cls.admin = User.objects.create_superuser(username="admin", email="",
+            password="admin")
+        cls.admin.groups.add(group_admin)
+
+    def _create_task(self):
+        data = {
+            "name": "my task",
+            "overlap": 0,
+            "segment_size": 100,
+            "labels": [
+                {
+                    "name": "car",
+                    "attributes": [
+                        {
+                            "name": "model",
+                            "mutable": False,
+                            "input_type": "select",
+                            "default_value": "mazda",
+                            "values": ["bmw", "mazda", "renault"]
+                        },
+                        {
+                            "name": "parked",
+                            "mutable": True,
+                            "input_type": "checkbox",
+                            "default_value": "false"
+                        },
+                    ]
+                },
+                {
+                    "name": "skeleton",
+                    "type": "skeleton",
+                    "attributes": [],
+                    "svg": "",
+                    "sublabels": [
+                        { "name": "1", "type": "points", "attributes": [] },
+                        { "name": "2", "type": "points", "attributes": [] },
+                    ]
+                },
+            ]
+        }
+
+        with ForceLogin(self.admin, self.client):
+            response = self.client.post('/api/tasks', data=data, format="json")
+            assert response.status_code == status.HTTP_201_CREATED, response.status_code
+            tid = response.data["id"]
+
+            images = { "client_files[%d]" % i: generate_image_file("image_%d.jpg" % i)
+                for i in range(self.IMAGES_COUNT) }
+            images["image_quality"] = 75
+            response = self.client.post("/api/tasks/%s/data" % tid, data=images)
+            assert response.status_code == status.HTTP_202_ACCEPTED, response.status_code
+
+            task = self.client.get("/api/tasks/%s" % tid).data
+            jobs = self.client.get("/api/tasks/%s/jobs" % tid).data
+
+        return task, jobs[0]
+
+    @staticmethod
+    def _get_label(task, name):
+        labels = list(task["labels"])
+        while labels:
+            label = labels.pop()
+            if label["name"] == name:
+                return label
+            labels.extend(label.get("sublabels", []))
+        raise KeyError(name)
+
+    @staticmethod
+    def _get_attribute(label, name):
+        return next(attr for attr in label["attributes"] if attr["name"] == name)
+
+    def _put_job_annotations(self, jid, data):
+        with ForceLogin(self.admin, self.client):
+            response = self.client.put("/api/jobs/%s/annotations" % jid,
+                data=data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return response.data
+
+    def _patch_job_annotations(self, jid, action, data):
+        with ForceLogin(self.admin, self.client):
+            response = self.client.patch(
+                "/api/jobs/%s/annotations?action=%s" % (jid, action),
+                data=data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return response.data
+
+    def _get_job_annotations(self, jid, **params):
+        with ForceLogin(self.admin, self.client):
+            response = self.client.get("/api/jobs/%s/annotations" % jid, params)
+
+        return response
+
+    @classmethod
+    def _normalize(cls, obj):
+        # Converts the response to plain objects with ordered attributes
+        if isinstance(obj, dict):
+            return {
+                key: sorted(cls._normalize(value), key=lambda a: a["spec_id"])
+                    if key == "attributes" else cls._normalize(value)
+                for key, value in obj.items()
+            }
+        elif isinstance(obj, list):
+            return [cls._normalize(value) for value in obj]
+        return obj
+
+    def _assert_annotations_match(self, expected, actual, ignore_keys=("id",)):
+        # Compares only the keys of the expected objects
+        if isinstance(expected, dict):
+            for key, value in expected.items():
+                if key not in ignore_keys:
+                    self._assert_annotations_match(value, actual[key], ignore_keys)
+        elif isinstance(expected, list):
+            self.assertEqual(len(expected), len(actual))
+            for expected_value, actual_value in zip(expected, actual):
+                self._assert_annotations_match(expected_value, actual_value, ignore_keys)
+        elif isinstance(expected, float) or isinstance(actual, float):
+            self.assertAlmostEqual(expected, actual, places=5)
+        else:
+            self.assertEqual(expected, actual)
+
+class JobAnnotationUpdateAPITestCase(_JobAnnotationTestBase):
+    def _make_annotations(self, task):
+        car = self._get_label(task, "car")
+        model = self._get_attribute(car, "model")
+        parked = self._get_attribute(car, "parked")
+        skeleton = self._get_label(task, "skeleton")
+
+        def make_shape(frame, label, points, attributes=(), **kwargs):
+            shape = {
+                "frame": frame,
+                "label_id": label["id"],
+                "group": 0,
+                "source": "manual",
+                "type": "rectangle",
+                "occluded": False,
+                "outside": False,
+                "z_order": 0,
+                "rotation": 0,
+                "points": points,
+                "attributes": [{ "spec_id": attr["id"], "value": value }
+                    for attr, value in attributes],
+            }
+            shape.update(kwargs)
+            return shape
+
+        return {
+            "version": 0,
+            "tags": [{
+                "frame": 0,
+                "label_id": car["id"],
+                "group": 0,
+                "source": "manual",
+                "attributes": [
+                    { "spec_id": model["id"], "value": "bmw" },
+                    { "spec_id": parked["id"], "value": "false" },
+                ],
+            }],
+            "shapes": [
+                make_shape(1, car, [1.5, 2.5, 10.5, 20.5],
+                    [(model, "bmw"), (parked, "false")]),
+                make_shape(2, skeleton, [], type="skeleton", elements=[
+                    make_shape(2, self._get_label(task, name), [x, x],
+                        type="points")
+                    for name, x in (("1", 5.0), ("2", 15.0))
+                ]),
+            ],
+            "tracks": [{
+                "frame": 0,
+                "label_id": car["id"],
+                "group": 0,
+                "source": "manual",
+                "attributes": [{ "spec_id": model["id"], "value": "bmw" }],
+                "elements": [],
+                "shapes": [
+                    { key: value for key, value in make_shape(frame, car,
+                        [frame, frame, frame + 10.0, frame + 10.0],
+                        [(parked, "false")]).items()
+                        if key not in ("label_id", "group", "source") }
+                    for frame in (0, 3, 6)
+                ],
+            }],
+        }
+
+    def _create_annotations(self):
+        task, job = self._create_task()
+        self._put_job_annotations(job["id"], self._make_annotations(task))
+        response = self._get_job_annotations(job["id"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return task, job, self._normalize(response.data)
+
+    def _update(self, job, data):
+        self._patch_job_annotations(job["id"], "update", data)
+        response = self._get_job_annotations(job["id"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return self._normalize(response.data)
+
+    @staticmethod
+    def _get_ids(data):
+        ids = []
+        for obj in data["tags"] + data["shapes"] + data["tracks"]:
+            ids.append(obj["id"])
+            ids.extend(element["id"] for element in obj.get("elements", []))
+            ids.extend(shape["id"] for shape in obj.get("shapes", []))
+        return ids
+
+    def test_update_keeps_ids(self):
+        task, job, saved = self._create_annotations()
+        data = copy.deepcopy(saved)
+        model = self._get_attribute(self._get_label(task, "car"), "model")
+        for attr in data["tags"][0]["attributes"]:
+            if attr["spec_id"] == model["id"]:
+                attr["value"] = "renault"
+        data["shapes"][0]["points"] = [3.0, 4.0, 30.0, 40.0]
+        data["shapes"][1]["elements"][0]["points"] = [7.0, 7.0]
+        data["tracks"][0]["shapes"][1]["points"] = [4.0, 4.0, 14.0, 14.0]
+
+        updated = self._update(job, data)
+
+        self.assertEqual(self._get_ids(saved), self._get_ids(updated))
+        self._assert_annotations_match(data, updated, ignore_keys=("version",))
+
+    def test_update_deletes_removed_track_keyframes(self):
+        _, job, saved = self._create_annotations()
+        data = copy.deepcopy(saved)
+        removed_shape = data["tracks"][0]["shapes"].pop(1)
+
+        updated = self._update(job, data)
+
+        track = updated["tracks"][0]
+        self.assertEqual(saved["tracks"][0]["id"], track["id"])
+        self.assertEqual([shape["id"] for shape in data["tracks"][0]["shapes"]],
+            [shape["id"] for shape in track["shapes"]])
+        self.assertFalse(TrackedShape.objects.filter(id=removed_shape["id"]).exists())
+        self.assertEqual(2, TrackedShape.objects.filter(track_id=track["id"]).count())
+
+    def test_update_replaces_changed_attributes(self):
+        task, job, saved = self._create_annotations()
+        parked = self._get_attribute(self._get_label(task, "car"), "parked")
+        data = copy.deepcopy(saved)
+        for obj in (data["shapes"][0], data["tracks"][0]["shapes"][0]):
+            for attr in obj["attributes"]:
+                if attr["spec_id"] == parked["id"]:
+                    attr["value"] = "true"
+
+        updated = self._update(job, data)
+
+        self._assert_annotations_match(data, updated, ignore_keys=("version",))
+        shape_id = saved["shapes"][0]["id"]
+        self.assertEqual(len(saved["shapes"][0]["attributes"]),
+            LabeledShapeAttributeVal.objects.filter(shape_id=shape_id).count())
+        self.assertEqual("true", LabeledShapeAttributeVal.objects.get(
+            shape_id=shape_id, spec_id=parked["id"]).value)
+        tracked_shape_id = saved["tracks"][0]["shapes"][0]["id"]
+        self.assertEqual(1,
+            TrackedShapeAttributeVal.objects.filter(shape_id=tracked_shape_id).count())
+        self.assertEqual("true", TrackedShapeAttributeVal.objects.get(
+            shape_id=tracked_shape_id).value)
+
+    def test_update_recreates_skeleton_with_changed_elements(self):
+        _, job, saved = self._create_annotations()
+        data = copy.deepcopy(saved)
+        skeleton = data["shapes"][1]
+        kept_element = skeleton["elements"][0]
+        skeleton["elements"][1] = {
+            key: value for key, value in skeleton["elements"][1].items()
+            if key != "id"
+        }
+        skeleton["elements"][1]["points"] = [25.0, 25.0]
+
+        updated = self._update(job, data)
+
+        updated_skeleton = updated["shapes"][1]
+        self.assertEqual(skeleton["id"], updated_skeleton["id"])
+        self.assertIn(kept_element["id"],
+            [element["id"] for element in updated_skeleton["elements"]])
+        self.assertEqual(2, LabeledShape.objects.filter(parent_id=skeleton["id"]).count())
+        self._assert_annotations_match(
+            sorted(skeleton["elements"], key=lambda e: e["points"]),
+            sorted(updated_skeleton["elements"], key=lambda e: e["points"]))
+
+    def test_put_and_get_return_same_annotations(self):
+        task, job, saved = self._create_annotations()
+
+        self._assert_annotations_match(self._normalize(self._make_annotations(task)),
+            saved, ignore_keys=("id", "version"))
+
+        updated = self._update(job, copy.deepcopy(saved))
+
+        for key in ("tags", "shapes", "tracks"):
+            self.assertEqual(saved[key], updated[key])
+
+class JobAnnotationFrameRangeAPITestCase(_JobAnnotationTestBase):
+    def setUp(self):
+        super().setUp()
+        self.task, self.job = self._create_task()
+        car = self._get_label(self.task, "car")
+
+        def make_shape(frame, outside=False):
+            return {
+                "frame": frame,
+                "type": "rectangle",
+                "occluded": False,
+                "outside": outside,
+                "z_order": 0,
+                "rotation": 0,
+                "points": [frame, frame, frame + 10.0, frame + 10.0],
+                "attributes": [],
+            }
+
+        def make_track(group, *keyframes):
+            return {
+                "frame": keyframes[0][0],
+                "label_id": car["id"],
+                "group": group,
+                "source": "manual",
+                "attributes": [],
+                "elements": [],
+                "shapes": [make_shape(frame, outside) for frame, outside in keyframes],
+            }
+
+        self._put_job_annotations(self.job["id"], {
+            "version": 0,
+            "tags": [
+                { "frame": frame, "label_id": car["id"], "group": 0,
+                    "source": "manual", "attributes": [] }
+                for frame in (2, 4, 6, 8)
+            ],
+            "shapes": [
+                dict(make_shape(frame), label_id=car["id"], group=0,
+                    source="manual")
+                for frame in (2, 4, 6, 8)
+            ],
+            "tracks": [
+                # is visible until the end of the job
+                make_track(1, (0, False), (8, False)),
+                # is finished by an outside shape
+                make_track(2, (0, False), (2, True)),
+                make_track(3, (5, False), (8, True)),
+            ],
+        })
+
+    def _get_range(self, **params):
+        response = self._get_job_annotations(self.job["id"], **params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return response.data
+
+    @staticmethod
+    def _get_frames(objects):
+        return [obj["frame"] for obj in objects]
+
+    @staticmethod
+    def _get_tracks(data):
+        return {
+            track["group"]: [(shape["frame"], shape["outside"])
+                for shape in track["shapes"]]
+            for track in data["tracks"]
+        }
+
+    def test_can_get_annotations_in_frame_range(self):
+        data = self._get_range(start_frame=4, stop_frame=6)
+
+        self.assertEqual([4, 6], self._get_frames(data["tags"]))
+        self.assertEqual([4, 6], self._get_frames(data["shapes"]))
+        self.assertEqual({ 1: [(4, False)], 3: [(5, False)] }, self._get_tracks(data))
+
+    def test_can_get_track_started_before_frame_range(self):
+        data = self._get_range(start_frame=4, stop_frame=6)
+
+        track = next(track for track in data["tracks"] if track["group"] == 1)
+        self.assertEqual(4, track["frame"])
+        self.assertEqual([4.0, 4.0, 14.0, 14.0], track["shapes"][0]["points"])
+
+    def test_does_not_return_tracks_finished_before_frame_range(self):
+        for start_frame in (2, 3):
+            data = self._get_range(start_frame=start_frame, stop_frame=6)
+
+            self.assertNotIn(2, self._get_tracks(data))
+
+    def test_returns_outside_shapes_in_frame_range(self):
+        data = self._get_range(start_frame=1, stop_frame=2)
+
+        self.assertEqual([(1, False), (2, True)], self._get_tracks(data)[2])
+
+    def test_can_get_annotations_on_range_boundaries(self):
+        data = self._get_range(start_frame=4, stop_frame=4)
+
+        self.assertEqual([4], self._get_frames(data["tags"]))
+        self.assertEqual([4], self._get_frames(data["shapes"]))
+        self.assertEqual({ 1: [(4, False)] }, self._get_tracks(data))
+
+        data = self._get_range(start_frame=8, stop_frame=9)
+
+        self.assertEqual([8], self._get_frames(data["tags"]))
+        self.assertEqual([8], self._get_frames(data["shapes"]))
+        self.assertEqual({ 1: [(8, False)] }, self._get_tracks(data))
+
+    def test_can_get_annotations_with_one_range_boundary(self):
+        data = self._get_range(start_frame=6)
+
+        self.assertEqual([6, 8], self._get_frames(data["tags"]))
+        self.assertEqual({ 1: [(6, False), (8, False)], 3: [(6, False), (8, True)] },
+            self._get_tracks(data))
+
+        data = self._get_range(stop_frame=2)
+
+        self.assertEqual([2], self._get_frames(data["tags"]))
+        self.assertEqual({ 1: [(0, False)], 2: [(0, False), (2, True)] },
+            self._get_tracks(data))
+
+    def test_returns_empty_annotations_out_of_job(self):
+        data = self._get_range(start_frame=self.IMAGES_COUNT,
+            stop_frame=self.IMAGES_COUNT + 10)
+
+        self.assertEqual([], data["tags"])
+        self.assertEqual([], data["shapes"])
+        self.assertEqual([], data["tracks"])
+
+    def test_cannot_get_annotations_with_invalid_range(self):
+        for params in [
+            { "start_frame": "a" },
+            { "stop_frame": "1.5" },
+            { "start_frame": -1 },
+            { "start_frame": 5, "stop_frame": 4 },
+        ]:
+            with self.subTest(**params):
+                response = self._get_job_annotations(self.job["id"], **params)
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -4,8 +4,12 @@
 # SPDX-License-Identifier: MIT
 
 import inspect
+import io
 import os, os.path as osp
+import time
 import zipfile
+from contextlib import contextmanager
+from diskcache import Cache
 from django.conf import settings
 
 
@@ -13,6 +17,18 @@ def current_function_name(depth=1):
     return inspect.getouterframes(inspect.currentframe())[depth].function
 
 
+def get_export_cache():
+    """
+    Returns the cache of intermediate export results, which don't change
+    between exports, or None, if the cache is disabled. Least recently used
+    entries are evicted when the size of the cache exceeds the limit.
+    """
+    if settings.EXPORT_CACHE_SIZE <= 0:
+        return None
+    return Cache(settings.EXPORT_CACHE_ROOT, size_limit=settings.EXPORT_CACHE_SIZE,
+        eviction_policy='least-recently-used')
+
+
 def make_zip_archive(src_path, dst_path):
     with zipfile.ZipFile(dst_path, 'w') as archive:
         for (dirpath, _, filenames) in os.walk(src_path):
@@ -21,6 +37,30 @@ def make_zip_archive(src_path, dst_path):
                 archive.write(path, osp.relpath(path, src_path))
 
 
+# Media files are compressed already, so they are stored in archives as is
+COMPRESSED_FILE_EXTS = ('.jpg', '.jpeg', '.png', '.webp',
+    '.mp4', '.webm', '.avi', '.mkv', '.mov', '.zip')
+
+def make_zip_info(name):
+    zip_info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    zip_info.external_attr = 0o644 << 16
+    if osp.splitext(name)[1].lower() in COMPRESSED_FILE_EXTS:
+        zip_info.compress_type = zipfile.ZIP_STORED
+    else:
+        zip_info.compress_type = zipfile.ZIP_DEFLATED
+    return zip_info
+
+@contextmanager
+def open_zip_entry(archive, name):
+    """
+    Opens a binary stream, which writes a new file directly into the archive.
+    The size of the file is not limited.
+    """
+    with io.BufferedWriter(archive.open(make_zip_info(name), 'w',
+            force_zip64=True)) as f:
+        yield f
+
+
 def bulk_create(db_model, objects, flt_param):
     if objects:
         if flt_param:
@@ -3,20 +3,29 @@
 # SPDX-License-Identifier: MIT
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
+import django_rq
 from diskcache import Cache
 from django.conf import settings
-from tempfile import NamedTemporaryFile
+from PIL import Image
 
 from cvat.apps.engine.log import slogger
 from cvat.apps.engine.media_extractors import (Mpeg4ChunkWriter,
     Mpeg4CompressedChunkWriter, ZipChunkWriter, ZipCompressedChunkWriter,
     ImageDatasetManifestReader, VideoDatasetManifestReader)
-from cvat.apps.engine.models import DataChoice, StorageChoice
+from cvat.apps.engine.models import Data, DataChoice, StorageChoice, StorageMethodChoice
 from cvat.apps.engine.models import DimensionType
 from cvat.apps.engine.cloud_provider import get_cloud_storage_instance, Credentials, Status
-from cvat.apps.engine.utils import md5_hash
+from cvat.apps.engine.utils import md5_file_hash, md5_hash
+
+class _FileDownloadError(Exception):
+    def __init__(self, file_name, error):
+        super().__init__(str(error))
+        self.file_name = file_name
+
 class CacheInteraction:
     def __init__(self, dimension=DimensionType.DIM_2D):
         self._cache = Cache(settings.CACHE_ROOT)
@@ -25,12 +34,35 @@ class CacheInteraction:
     def __del__(self):
         self._cache.close()
 
+    @staticmethod
+    def _get_key(db_data_id, chunk_number, quality):
+        return '{}_{}_{}'.format(db_data_id, chunk_number, quality)
+
+    def has_chunk(self, db_data_id, chunk_number, quality):
+        return self._get_key(db_data_id, chunk_number, quality) in self._cache
+
     def get_buff_mime(self, chunk_number, quality, db_data):
-        chunk, tag = self._cache.get('{}_{}_{}'.format(db_data.id, chunk_number, quality), tag=True)
+        chunk, tag = self.get_chunk_file(chunk_number, quality, db_data)
+        with chunk:
+            return BytesIO(chunk.read()), tag
+
+    def get_chunk_file(self, chunk_number, quality, db_data):
+        """
+        Returns the chunk as an opened binary file and its mime type.
+        The chunk is stored by the cache as a separate file, so it can be
+        sent without reading into memory. The caller has to close the file.
+        """
+        key = self._get_key(db_data.id, chunk_number, quality)
+        chunk, tag = self._cache.get(key, read=True, tag=True)
 
-        if not chunk:
-            chunk, tag = self.prepare_chunk_buff(db_data, quality, chunk_number)
-            self.save_chunk(db_data.id, chunk_number, quality, chunk, tag)
+        if chunk is None:
+            buff, tag = self.prepare_chunk_buff(db_data, quality, chunk_number)
+            self.save_chunk(db_data.id, chunk_number, quality, buff, tag)
+            chunk, tag = self._cache.get(key, read=True, tag=True)
+            if chunk is None:
+                # the chunk has been evicted already
+                buff.seek(0)
+                chunk = buff
         return chunk, tag
 
     def prepare_chunk_buff(self, db_data, quality, chunk_number):
@@ -62,6 +94,16 @@ class CacheInteraction:
                 source_path=source_path, chunk_number=chunk_number,
                 chunk_size=db_data.chunk_size, start=db_data.start_frame,
                 stop=db_data.stop_frame, step=db_data.get_frame_step())
+
+            # Original chunks, which start on a key frame, are copied from the video
+            # without decoding, if the frames of the chunk follow each other
+            if writer_classes[quality] is Mpeg4ChunkWriter and db_data.get_frame_step() == 1:
+                start_pts = reader.get_start_key_frame_pts()
+                if start_pts is not None and writer.copy_as_chunk(source_path, start_pts,
+                        len(reader.frame_range), buff):
+                    buff.seek(0)
+                    return buff, mime_type
+
             for frame in reader:
                 images.append((frame, source_path, None))
         else:
@@ -82,21 +124,50 @@ class CacheInteraction:
                     'credentials': credentials,
                     'specific_attributes': db_cloud_storage.get_specific_attributes()
                 }
+                cloud_storage_instance = get_cloud_storage_instance(cloud_provider=db_cloud_storage.provider_type, **details)
+                # Cloud storage clients aren't thread-safe, so every download
+                # thread uses its own instance
+                thread_data = threading.local()
+
+                def _get_thread_cloud_storage_instance():
+                    instance = getattr(thread_data, 'cloud_storage_instance', None)
+                    if instance is None:
+                        instance = get_cloud_storage_instance(
+                            cloud_provider=db_cloud_storage.provider_type, **details)
+                        thread_data.cloud_storage_instance = instance
+                    return instance
+
+                has_file_checksums = reader.has_file_checksums
+
+                def _get_checksum(buf):
+                    if has_file_checksums:
+                        return md5_file_hash(buf)
+                    # Manifests prepared by older versions contain hashes of decoded images
+                    return md5_hash(Image.open(buf))
+
+                def _download_image(item):
+                    file_name = f"{item['name']}{item['extension']}"
+                    try:
+                        buf = _get_thread_cloud_storage_instance().download_fileobj(file_name)
+                    except Exception as ex:
+                        raise _FileDownloadError(file_name, ex) from ex
+                    checksum = item.get('checksum', None)
+                    if not checksum:
+                        slogger.cloud_storage[db_cloud_storage.id].warning('A manifest file does not contain checksum for image {}'.format(item.get('name')))
+                    if checksum and not _get_checksum(buf) == checksum:
+                        slogger.cloud_storage[db_cloud_storage.id].warning('Hash sums of files {} do not match'.format(file_name))
+                    buf.seek(0)
+                    return buf
+
                 try:
-                    cloud_storage_instance = get_cloud_storage_instance(cloud_provider=db_cloud_storage.provider_type, **details)
-                    for item in reader:
-                        file_name = f"{item['name']}{item['extension']}"
-                        with NamedTemporaryFile(mode='w+b', prefix='cvat', suffix=file_name.replace(os.path.sep, '#'), delete=False) as temp_file:
-                            source_path = temp_file.name
-                            buf = cloud_storage_instance.download_fileobj(file_name)
-                            temp_file.write(buf.getvalue())
-                            temp_file.flush()
-                            checksum = item.get('checksum', None)
-                            if not checksum:
-                                slogger.cloud_storage[db_cloud_storage.id].warning('A manifest file does not contain checksum for image {}'.format(item.get('name')))
-                            if checksum and not md5_hash(source_path) == checksum:
-                                slogger.cloud_storage[db_cloud_storage.id].warning('Hash sums of files {} do not match'.format(file_name))
-                            images.append((source_path, source_path, None))
+                    # Images are downloaded concurrently and passed to the writer from memory
+                    with ThreadPoolExecutor(max_workers=settings.CLOUD_STORAGE_DOWNLOAD_WORKERS) as executor:
+                        downloads = [
+                            (f"{item['name']}{item['extension']}", executor.submit(_download_image, item))
+                            for item in reader
+                        ]
+                        for file_name, download in downloads:
+                            images.append((download.result(), file_name, None))
                 except Exception as ex:
                     storage_status = cloud_storage_instance.get_status()
                     if storage_status == Status.FORBIDDEN:
@@ -104,12 +175,13 @@ class CacheInteraction:
                     elif storage_status == Status.NOT_FOUND:
                         msg = 'The resource {} not found. It may have been deleted.'.format(cloud_storage_instance.name)
                     else:
-                        # check status of last file
-                        file_status = cloud_storage_instance.get_file_status(file_name)
-                        if file_status == Status.NOT_FOUND:
-                            raise Exception("'{}' not found on the cloud storage '{}'".format(file_name, cloud_storage_instance.name))
-                        elif file_status == Status.FORBIDDEN:
-                            raise Exception("Access to the file '{}' on the '{}' cloud storage is denied".format(file_name, cloud_storage_instance.name))
+                        if isinstance(ex, _FileDownloadError):
+                            # check status of the file, which failed to download
+                            file_status = cloud_storage_instance.get_file_status(ex.file_name)
+                            if file_status == Status.NOT_FOUND:
+                                raise Exception("'{}' not found on the cloud storage '{}'".format(ex.file_name, cloud_storage_instance.name))
+                            elif file_status == Status.FORBIDDEN:
+                                raise Exception("Access to the file '{}' on the '{}' cloud storage is denied".format(ex.file_name, cloud_storage_instance.name))
                         msg = str(ex)
                     raise Exception(msg)
             else:
@@ -118,11 +190,56 @@ class CacheInteraction:
                     images.append((source_path, source_path, None))
         writer.save_as_chunk(images, buff)
         buff.seek(0)
-        if db_data.storage == StorageChoice.CLOUD_STORAGE:
-            images = [image[0] for image in images if os.path.exists(image[0])]
-            for image_path in images:
-                os.remove(image_path)
         return buff, mime_type
 
     def save_chunk(self, db_data_id, chunk_number, quality, buff, mime_type):
-        self._cache.set('{}_{}_{}'.format(db_data_id, chunk_number, quality), buff, tag=mime_type)
+        # The chunk is saved as raw bytes into a separate file
+        self._cache.set(self._get_key(db_data_id, chunk_number, quality), buff,
+            read=True, tag=mime_type)
+
+def prepare_chunks(db_data_id, chunk_numbers, quality, dimension=DimensionType.DIM_2D):
+    """Builds the missing cache chunks in the background"""
+    try:
+        db_data = Data.objects.select_related('video', 'cloud_storage').get(pk=db_data_id)
+    except Data.DoesNotExist:
+        return
+
+    cache = CacheInteraction(dimension=dimension)
+
+    def _prepare_chunk(chunk_number):
+        if cache.has_chunk(db_data.id, chunk_number, quality):
+            return
+        try:
+            chunk, tag = cache.prepare_chunk_buff(db_data, quality, chunk_number)
+            cache.save_chunk(db_data.id, chunk_number, quality, chunk, tag)
+        except Exception as ex:
+            slogger.glob.warning('Failed to prepare chunk {} of data #{}: {}'.format(
+                chunk_number, db_data.id, ex))
+
+    with ThreadPoolExecutor(max_workers=settings.CHUNK_PREPARATION_WORKERS) as executor:
+        for _ in executor.map(_prepare_chunk, chunk_numbers):
+            pass
+
+def schedule_chunks_preparation(db_data, chunk_numbers, quality, dimension=DimensionType.DIM_2D):
+    if not settings.USE_CACHE or db_data.storage_method != StorageMethodChoice.CACHE:
+        return
+
+    # Chunks are usually prepared already, so the queue isn't touched then
+    cache = CacheInteraction(dimension=dimension)
+    chunk_numbers = [chunk_number for chunk_number in chunk_numbers
+        if not cache.has_chunk(db_data.id, chunk_number, quality)]
+    if not chunk_numbers:
+        return
+
+    queue = django_rq.get_queue('low')
+    rq_id = '/api/data/{}/chunks/{}/{}-{}'.format(db_data.id, quality.name.lower(),
+        chunk_numbers[0], chunk_numbers[-1])
+    rq_job = queue.fetch_job(rq_id)
+    if rq_job:
+        if not (rq_job.is_finished or rq_job.is_failed):
+            return
+        rq_job.delete()
+
+    queue.enqueue_call(func=prepare_chunks,
+        args=(db_data.id, chunk_numbers, quality, dimension),
+        job_id=rq_id, result_ttl=0)
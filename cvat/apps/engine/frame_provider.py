@@ -3,11 +3,15 @@
 # SPDX-License-Identifier: MIT
 
 import math
+from collections import OrderedDict
 from enum import Enum
 from io import BytesIO
+from threading import Lock
 
+import av
 import cv2
 import numpy as np
+from django.conf import settings
 from PIL import Image
 
 from cvat.apps.engine.cache import CacheInteraction
@@ -43,6 +47,111 @@ class RandomAccessIterator:
         self.iterator = iter(self.iterable)
         self.pos = -1
 
+class DecodedChunkCache:
+    """
+    A process-wide LRU cache of decoded chunks. Entries are keyed by
+    (data id, chunk number, quality) and the cache is bounded by the total
+    size of the decoded frames it keeps. Keys of recent chunks, which are
+    bigger than the capacity, are remembered, so such chunks aren't decoded
+    for caching again. The number of these keys is limited in the same
+    LRU way.
+    """
+
+    class _Entry:
+        def __init__(self, frames, size):
+            self.frames = frames
+            self.size = size
+
+    def __init__(self, capacity, oversized_keys_limit=1000):
+        self._capacity = capacity
+        self._size = 0
+        self._entries = OrderedDict()
+        self._oversized = OrderedDict()
+        self._oversized_keys_limit = oversized_keys_limit
+        self._lock = Lock()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def get_frame_size(frame):
+        if isinstance(frame, av.VideoFrame):
+            return sum(plane.buffer_size for plane in frame.planes)
+        return len(frame)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(key)
+            return entry.frames
+
+    def put(self, key, frames):
+        size = sum(self.get_frame_size(frame) for frame, _ in frames)
+        if self._capacity < size:
+            self.mark_oversized(key)
+            return False
+
+        with self._lock:
+            self._remove(key)
+            while self._entries and self._capacity < self._size + size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+            self._entries[key] = self._Entry(frames, size)
+            self._size += size
+        return True
+
+    def mark_oversized(self, key):
+        with self._lock:
+            self._oversized[key] = None
+            self._oversized.move_to_end(key)
+            while self._oversized_keys_limit < len(self._oversized):
+                self._oversized.popitem(last=False)
+
+    def is_oversized(self, key):
+        with self._lock:
+            if key not in self._oversized:
+                return False
+
+            self._oversized.move_to_end(key)
+            return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def invalidate(self, data_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == data_id]:
+                self._remove(key)
+            for key in [key for key in self._oversized if key[0] == data_id]:
+                del self._oversized[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._oversized.clear()
+            self._size = 0
+
+_decoded_chunk_cache = None
+
+def get_decoded_chunk_cache():
+    global _decoded_chunk_cache # pylint: disable=global-statement
+    if _decoded_chunk_cache is None:
+        _decoded_chunk_cache = DecodedChunkCache(settings.DECODED_CHUNK_CACHE_SIZE)
+    return _decoded_chunk_cache
+
 class FrameProvider:
     VIDEO_FRAME_EXT = '.PNG'
     VIDEO_FRAME_MIME = 'image/png'
@@ -57,31 +166,63 @@ class FrameProvider:
         NUMPY_ARRAY = 2
 
     class ChunkLoader:
-        def __init__(self, reader_class, path_getter):
+        def __init__(self, reader_class, path_getter, quality, db_data):
             self.chunk_id = None
-            self.chunk_reader = None
+            self.chunk_frames = None
             self.reader_class = reader_class
             self.get_chunk_path = path_getter
-
-        def load(self, chunk_id):
-            if self.chunk_id != chunk_id:
-                self.chunk_id = chunk_id
-                self.chunk_reader = RandomAccessIterator(
-                    self.reader_class([self.get_chunk_path(chunk_id)]))
-            return self.chunk_reader
-
-    class BuffChunkLoader(ChunkLoader):
-        def __init__(self, reader_class, path_getter, quality, db_data):
-            super().__init__(reader_class, path_getter)
             self.quality = quality
             self.db_data = db_data
 
+        def _get_chunk_source(self, chunk_id):
+            return self.get_chunk_path(chunk_id)
+
+        def _decode(self, chunk_id, size_limit):
+            # Frames are kept in a form that can be shared between consumers:
+            # encoded images as bytes (wrapped into a new buffer on access),
+            # decoded video frames as is (consumers don't modify them).
+            # Decoding is stopped as soon as the frames exceed the size limit.
+            frames = []
+            size = 0
+            for frame, frame_name, _ in self.reader_class([self._get_chunk_source(chunk_id)]):
+                if isinstance(frame, BytesIO):
+                    frame = frame.getvalue()
+                size += DecodedChunkCache.get_frame_size(frame)
+                if size_limit < size:
+                    return None
+                frames.append((frame, frame_name))
+            return frames
+
+        def iterate(self, chunk_id):
+            # Streams the chunk without caching, for sequential reads
+            for frame, frame_name, _ in self.reader_class([self._get_chunk_source(chunk_id)]):
+                yield frame, frame_name
+
         def load(self, chunk_id):
             if self.chunk_id != chunk_id:
+                cache = get_decoded_chunk_cache()
+                key = (self.db_data.id, chunk_id, self.quality)
+                frames = cache.get(key)
+                if frames is None and not cache.is_oversized(key):
+                    frames = self._decode(chunk_id, cache.capacity)
+                    if frames is None:
+                        cache.mark_oversized(key)
+                    else:
+                        cache.put(key, frames)
+                if frames is None:
+                    # The chunk can't be cached, so only the requested frames
+                    # are decoded. Items of the reader are
+                    # (frame, frame name, pts) tuples.
+                    frames = RandomAccessIterator(
+                        self.reader_class([self._get_chunk_source(chunk_id)]))
+
                 self.chunk_id = chunk_id
-                self.chunk_reader = RandomAccessIterator(
-                    self.reader_class([self.get_chunk_path(chunk_id, self.quality, self.db_data)[0]]))
-            return self.chunk_reader
+                self.chunk_frames = frames
+            return self.chunk_frames
+
+    class BuffChunkLoader(ChunkLoader):
+        def _get_chunk_source(self, chunk_id):
+            return self.get_chunk_path(chunk_id, self.quality, self.db_data)[0]
 
     def __init__(self, db_data, dimension=DimensionType.DIM_2D):
         self._db_data = db_data
@@ -94,6 +235,7 @@ class FrameProvider:
 
         if db_data.storage_method == StorageMethodChoice.CACHE:
             cache = CacheInteraction(dimension=dimension)
+            self._cache = cache
 
             self._loaders[self.Quality.COMPRESSED] = self.BuffChunkLoader(
                 reader_class[db_data.compressed_chunk_type],
@@ -108,10 +250,14 @@ class FrameProvider:
         else:
             self._loaders[self.Quality.COMPRESSED] = self.ChunkLoader(
                 reader_class[db_data.compressed_chunk_type],
-                db_data.get_compressed_chunk_path)
+                db_data.get_compressed_chunk_path,
+                self.Quality.COMPRESSED,
+                self._db_data)
             self._loaders[self.Quality.ORIGINAL] = self.ChunkLoader(
                 reader_class[db_data.original_chunk_type],
-                db_data.get_original_chunk_path)
+                db_data.get_original_chunk_path,
+                self.Quality.ORIGINAL,
+                self._db_data)
 
     def __len__(self):
         return self._db_data.size
@@ -170,18 +316,42 @@ class FrameProvider:
             return self._loaders[quality].get_chunk_path(chunk_number, quality, self._db_data)
         return self._loaders[quality].get_chunk_path(chunk_number)
 
+    def get_chunk_file(self, chunk_number, quality=Quality.ORIGINAL):
+        """
+        Returns an opened file and the mime type of a chunk, which is kept
+        in the cache. It is supposed to be used for the cache storage only.
+        """
+        chunk_number = self._validate_chunk_number(chunk_number)
+        return self._cache.get_chunk_file(chunk_number, quality, self._db_data)
+
+    def _make_frame(self, frame, frame_name, reader_class, out_type):
+        if isinstance(frame, bytes):
+            frame = BytesIO(frame)
+
+        frame = self._convert_frame(frame, reader_class, out_type)
+        if reader_class is VideoReader:
+            return (frame, self.VIDEO_FRAME_MIME)
+        return (frame, mimetypes.guess_type(frame_name)[0])
+
     def get_frame(self, frame_number, quality=Quality.ORIGINAL,
             out_type=Type.BUFFER):
         _, chunk_number, frame_offset = self._validate_frame_number(frame_number)
         loader = self._loaders[quality]
-        chunk_reader = loader.load(chunk_number)
-        frame, frame_name, _ = chunk_reader[frame_offset]
+        chunk_frames = loader.load(chunk_number)
+        frame, frame_name = chunk_frames[frame_offset][:2]
 
-        frame = self._convert_frame(frame, loader.reader_class, out_type)
-        if loader.reader_class is VideoReader:
-            return (frame, self.VIDEO_FRAME_MIME)
-        return (frame, mimetypes.guess_type(frame_name)[0])
+        return self._make_frame(frame, frame_name, loader.reader_class, out_type)
+
+    def get_chunk_count(self):
+        return math.ceil(self._db_data.size / self._db_data.chunk_size)
+
+    def get_chunk_frames(self, chunk_number, quality=Quality.ORIGINAL,
+            out_type=Type.BUFFER):
+        # Chunks are read independently, so they can be read concurrently
+        loader = self._loaders[quality]
+        for frame, frame_name in loader.iterate(chunk_number):
+            yield self._make_frame(frame, frame_name, loader.reader_class, out_type)
 
     def get_frames(self, quality=Quality.ORIGINAL, out_type=Type.BUFFER):
-        for idx in range(self._db_data.size):
-            yield self.get_frame(idx, quality=quality, out_type=out_type)
+        for chunk_number in range(self.get_chunk_count()):
+            yield from self.get_chunk_frames(chunk_number, quality, out_type)
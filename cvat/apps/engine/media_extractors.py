@@ -11,6 +11,7 @@ import itertools
 import struct
 from enum import IntEnum
 from abc import ABC, abstractmethod
+from bisect import bisect_right
 from contextlib import closing
 
 import av
@@ -403,11 +404,19 @@ class VideoReader(IMediaReader):
 
         return False
 
-    def _decode(self, container):
-        frame_num = 0
+    def _decode(self, container, frame_num=0, frame_pts=None):
+        # frame_pts are the expected timestamps of the frames, starting from frame_num
+        first_frame_num = frame_num
         for packet in container.demux():
             if packet.stream.type == 'video':
                 for image in packet.decode():
+                    if frame_pts is not None:
+                        position = frame_num - first_frame_num
+                        if position == len(frame_pts):
+                            return
+                        if image.pts != frame_pts[position]:
+                            raise Exception('Unexpected timestamp {} of the frame #{}'.format(
+                                image.pts, frame_num))
                     frame_num += 1
                     if self._has_frame(frame_num - 1):
                         if packet.stream.metadata.get('rotate'):
@@ -429,6 +438,75 @@ class VideoReader(IMediaReader):
 
         return self._decode(container)
 
+    def _scan_frames(self):
+        # Packets are read without decoding. Frames are numbered in the order
+        # of the packet timestamps, which is the presentation order.
+        with closing(self._get_av_container()) as container:
+            video_stream = container.streams.video[0]
+            frame_pts, key_frames_pts = [], []
+            for packet in container.demux(video_stream):
+                if not packet.size:
+                    # flushing packets don't contain frames
+                    continue
+                if packet.pts is None:
+                    return None
+                frame_pts.append(packet.pts)
+                if packet.is_keyframe:
+                    key_frames_pts.append(packet.pts)
+
+        frame_pts.sort()
+        frame_numbers = { pts: number for number, pts in enumerate(frame_pts) }
+        if len(frame_numbers) != len(frame_pts):
+            return None
+        key_frames = sorted((frame_numbers[pts], pts) for pts in key_frames_pts)
+        return frame_pts, key_frames
+
+    def split_into_segments(self, chunk_size, chunks_per_segment):
+        """
+        Splitting the video into segments of several chunks, which can be
+        decoded independently: each segment is decoded from the nearest key
+        frame before its first frame. Returns a list of
+        (key_frame, frame_pts, [(chunk_number, frame_numbers)]) tuples or
+        None, if the video can't be split by the packet timestamps.
+        """
+        if not isinstance(self._source_path[0], str):
+            return None
+
+        scanned_frames = self._scan_frames()
+        if not scanned_frames:
+            return None
+        frame_pts, key_frames = scanned_frames
+        if not key_frames or key_frames[0][0] != 0:
+            return None
+
+        frame_numbers = [i for i in range(len(frame_pts)) if self._has_frame(i)]
+        key_frame_numbers = [number for number, _ in key_frames]
+        segment_size = chunk_size * chunks_per_segment
+        segments = []
+        for segment_start in range(0, len(frame_numbers), segment_size):
+            segment_frames = frame_numbers[segment_start:segment_start + segment_size]
+            key_frame = key_frames[bisect_right(key_frame_numbers, segment_frames[0]) - 1]
+            chunks = [
+                ((segment_start + chunk_start) // chunk_size,
+                    segment_frames[chunk_start:chunk_start + chunk_size])
+                for chunk_start in range(0, len(segment_frames), chunk_size)
+            ]
+            segments.append((key_frame,
+                frame_pts[key_frame[0]:segment_frames[-1] + 1], chunks))
+        return segments
+
+    def decode_segment(self, key_frame, frame_pts):
+        """
+        Decoding the frames of a segment, starting from its key frame.
+        Timestamps of the decoded frames are checked against the expected ones.
+        """
+        frame_num, pts = key_frame
+        with closing(self._get_av_container()) as container:
+            video_stream = container.streams.video[0]
+            video_stream.thread_type = 'AUTO'
+            container.seek(offset=pts, stream=video_stream)
+            yield from self._decode(container, frame_num, frame_pts)
+
     def get_progress(self, pos):
         duration = self._get_duration()
         return pos / duration if duration else None
@@ -513,9 +591,19 @@ class ImageDatasetManifestReader(FragmentMediaReader):
         self._manifest = ImageManifestManager(manifest_path)
         self._manifest.init_index()
 
+    @property
+    def has_file_checksums(self):
+        return self._manifest.has_file_checksums
+
     def __iter__(self):
+        if not self._frame_range:
+            return
+
+        # read all the chunk items at once
+        first, last = self._frame_range[0], self._frame_range[-1]
+        items = self._manifest.get_range(first, last + 1)
         for idx in self._frame_range:
-            yield self._manifest[idx]
+            yield items[idx - first]
 
 class VideoDatasetManifestReader(FragmentMediaReader):
     def __init__(self, manifest_path, **kwargs):
@@ -546,6 +634,13 @@ class VideoDatasetManifestReader(FragmentMediaReader):
         timestamp = self._manifest[left_border].get('pts')
         return frame_number, timestamp
 
+    def get_start_key_frame_pts(self):
+        """ Getting the timestamp of the first chunk frame, if it is a key frame """
+        if not self._frame_range:
+            return None
+        frame_number, timestamp = self._get_nearest_left_key_frame()
+        return timestamp if frame_number == self._frame_range[0] else None
+
     def __iter__(self):
         start_decode_frame_number, start_decode_timestamp = self._get_nearest_left_key_frame()
         with closing(av.open(self.source_path, mode='r')) as container:
@@ -636,6 +731,9 @@ class ZipCompressedChunkWriter(IChunkWriter):
         return image_sizes
 
 class Mpeg4ChunkWriter(IChunkWriter):
+    # H.264 profiles of source videos, which can be copied into chunks as is
+    COPYABLE_PROFILES = ('Baseline', 'Constrained Baseline')
+
     def __init__(self, quality=67):
         # translate inversed range [1:100] to [0:51]
         quality = round(51 * (100 - quality) / 99)
@@ -693,6 +791,51 @@ class Mpeg4ChunkWriter(IChunkWriter):
         output_container.close()
         return [(input_w, input_h)]
 
+    def copy_as_chunk(self, source_path, start_pts, frame_count, chunk_path, frame_pts=None):
+        """
+        Writing the chunk by copying packets of the source video without
+        re-encoding. It is possible only if the chunk starts on a key frame
+        and clients can decode the video stream as is. frame_pts are the
+        expected timestamps of the chunk frames, if known.
+        Returns False if the packets can't be copied.
+        """
+        with closing(av.open(source_path, mode='r')) as container:
+            video_stream = container.streams.video[0]
+            if video_stream.codec_context.name != 'h264' or \
+                    video_stream.profile not in self.COPYABLE_PROFILES or \
+                    video_stream.metadata.get('rotate'):
+                return False
+
+            container.seek(offset=start_pts, stream=video_stream)
+            packets = []
+            for packet in container.demux(video_stream):
+                if not packet.size or (packet.pts is not None and packet.pts < start_pts):
+                    continue
+                if packet.pts is None or packet.dts is None:
+                    return False
+                if not packets and (packet.pts != start_pts or not packet.is_keyframe):
+                    return False
+                # the profiles don't reorder frames, so packets must be in the presentation order
+                if packets and packet.pts <= packets[-1].pts:
+                    return False
+                if frame_pts is not None and packet.pts != frame_pts[len(packets)]:
+                    return False
+                packets.append(packet)
+                if len(packets) == frame_count:
+                    break
+            if not packets or len(packets) != frame_count:
+                return False
+
+            with closing(av.open(chunk_path, 'w', format='mp4')) as output_container:
+                output_stream = output_container.add_stream(template=video_stream)
+                offset = packets[0].dts
+                for packet in packets:
+                    packet.pts -= offset
+                    packet.dts -= offset
+                    packet.stream = output_stream
+                    output_container.mux(packet)
+        return True
+
     @staticmethod
     def _encode_images(images, container, stream):
         for frame, _, _ in images:
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.15 on 2022-08-25 10:12
+
+import os
+
+from django.conf import settings
+from django.db import migrations
+
+import cvat.apps.engine.models
+from cvat.apps.engine.log import get_logger
+
+MIGRATION_NAME = os.path.splitext(os.path.basename(__file__))[0]
+MIGRATION_LOG = os.path.join(settings.MIGRATIONS_LOGS_ROOT, f"{MIGRATION_NAME}.log")
+
+MODEL_NAMES = ('LabeledShape', 'TrackedShape')
+BATCH_SIZE = 10000
+
+def _copy_points(apps, src_field, dst_field):
+    logger = get_logger(MIGRATION_NAME, MIGRATION_LOG)
+    for model_name in MODEL_NAMES:
+        model = apps.get_model('engine', model_name)
+        query_set = model.objects.only('id', src_field).order_by('id')
+        logger.info(f'Need to convert points of {query_set.count()} {model_name} objects.')
+
+        db_shapes = []
+        for db_shape in query_set.iterator(chunk_size=BATCH_SIZE):
+            setattr(db_shape, dst_field, getattr(db_shape, src_field))
+            db_shapes.append(db_shape)
+            if len(db_shapes) == BATCH_SIZE:
+                model.objects.bulk_update(db_shapes, [dst_field])
+                db_shapes = []
+        model.objects.bulk_update(db_shapes, [dst_field])
+
+def pack_points(apps, schema_editor):
+    _copy_points(apps, 'points', 'packed_points')
+
+def unpack_points(apps, schema_editor):
+    _copy_points(apps, 'packed_points', 'points')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0059_labeledshape_outside'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labeledshape',
+            name='packed_points',
+            field=cvat.apps.engine.models.FloatBinaryArrayField(default=[]),
+        ),
+        migrations.AddField(
+            model_name='trackedshape',
+            name='packed_points',
+            field=cvat.apps.engine.models.FloatBinaryArrayField(default=[]),
+        ),
+        migrations.RunPython(
+            code=pack_points,
+            reverse_code=unpack_points,
+        ),
+        migrations.RemoveField(
+            model_name='labeledshape',
+            name='points',
+        ),
+        migrations.RemoveField(
+            model_name='trackedshape',
+            name='points',
+        ),
+        migrations.RenameField(
+            model_name='labeledshape',
+            old_name='packed_points',
+            new_name='points',
+        ),
+        migrations.RenameField(
+            model_name='trackedshape',
+            old_name='packed_points',
+            new_name='points',
+        ),
+    ]
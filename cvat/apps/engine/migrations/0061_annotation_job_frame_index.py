@@ -0,0 +1,25 @@
+# Generated by Django 3.2.15 on 2022-08-29 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0060_shape_points_binary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labeledimage',
+            index=models.Index(fields=['job', 'frame'], name='labeledimage_job_frame_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labeledshape',
+            index=models.Index(fields=['job', 'frame'], name='labeledshape_job_frame_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labeledtrack',
+            index=models.Index(fields=['job', 'frame'], name='labeledtrack_job_frame_idx'),
+        ),
+    ]
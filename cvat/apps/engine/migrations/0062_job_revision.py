@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2022-09-01 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0061_annotation_job_frame_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -6,9 +6,11 @@
 import os
 import re
 import shutil
+from base64 import b64encode
 from enum import Enum
 from typing import Optional
 
+import numpy as np
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.storage import FileSystemStorage
@@ -188,6 +190,50 @@ class FloatArrayField(AbstractArrayField):
 class IntArrayField(AbstractArrayField):
     converter = int
 
+class FloatBinaryArrayField(models.BinaryField):
+    """
+    Stores a list of floats as packed little-endian doubles. In comparison
+    with FloatArrayField, values don't need to be formatted and parsed
+    one by one, and they take less space in the DB.
+    """
+
+    dtype = np.dtype('<f8')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **{'default': b'', **kwargs})
+
+    @classmethod
+    def to_array(cls, value):
+        if not value:
+            return np.empty(0, dtype=cls.dtype)
+        return np.frombuffer(value, dtype=cls.dtype)
+
+    @classmethod
+    def to_bytes(cls, value):
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value)
+        return np.asarray(value, dtype=cls.dtype).tobytes()
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.to_array(value).tolist()
+
+    def to_python(self, value):
+        if isinstance(value, list):
+            return value
+        if isinstance(value, str):
+            value = super().to_python(value)
+        return self.from_db_value(value, None, None)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return self.to_bytes(value)
+
+    def value_to_string(self, obj):
+        return b64encode(self.get_prep_value(self.value_from_object(obj))).decode('ascii')
+
 class Data(models.Model):
     chunk_size = models.PositiveIntegerField(null=True)
     size = models.PositiveIntegerField(default=0)
@@ -256,7 +302,7 @@ class Data(models.Model):
         return os.path.join(self.get_upload_dirname(), 'manifest.jsonl')
 
     def get_index_path(self):
-        return os.path.join(self.get_upload_dirname(), 'index.json')
+        return os.path.join(self.get_upload_dirname(), 'index.bin')
 
     def make_dirs(self):
         data_path = self.get_data_dirname()
@@ -449,6 +495,8 @@ class Job(models.Model):
     segment = models.ForeignKey(Segment, on_delete=models.CASCADE)
     assignee = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     updated_date = models.DateTimeField(auto_now=True)
+    # Incremented on every change of the job annotations
+    revision = models.PositiveIntegerField(default=0)
     # TODO: it has to be deleted in Job, Task, Project and replaced by (stage, state)
     # The stage field cannot be changed by an assignee, but state field can be. For
     # now status is read only and it will be updated by (stage, state). Thus we don't
@@ -597,6 +645,9 @@ class Annotation(models.Model):
     class Meta:
         abstract = True
         default_permissions = ()
+        indexes = [
+            models.Index(fields=['job', 'frame'], name='%(class)s_job_frame_idx'),
+        ]
 
 class Commit(models.Model):
     class JSONEncoder(DjangoJSONEncoder):
@@ -626,7 +677,7 @@ class Shape(models.Model):
     occluded = models.BooleanField(default=False)
     outside = models.BooleanField(default=False)
     z_order = models.IntegerField(default=0)
-    points = FloatArrayField(default=[])
+    points = FloatBinaryArrayField(default=[])
     rotation = FloatField(default=0)
 
     class Meta:
@@ -45,3 +45,13 @@ def delete_task_files_on_delete_task(instance, **kwargs):
 @receiver(post_delete, sender=Data, dispatch_uid="delete_data_files_on_delete_data")
 def delete_data_files_on_delete_data(instance, **kwargs):
     shutil.rmtree(instance.get_data_dirname(), ignore_errors=True)
+
+
+@receiver(post_save, sender=Data, dispatch_uid="invalidate_decoded_chunks_on_create_data")
+@receiver(post_delete, sender=Data, dispatch_uid="invalidate_decoded_chunks_on_delete_data")
+def invalidate_decoded_chunks(instance, created=True, **kwargs):
+    # Data ids can be reused (e.g. after a rollback), so drop anything
+    # cached for the id when a new object is created as well
+    if created:
+        from cvat.apps.engine.frame_provider import get_decoded_chunk_cache
+        get_decoded_chunk_cache().invalidate(instance.id)
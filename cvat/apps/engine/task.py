@@ -3,9 +3,14 @@
 #
 # SPDX-License-Identifier: MIT
 
+import functools
 import itertools
+import multiprocessing
 import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
 from rest_framework.serializers import ValidationError
 import rq
 import re
@@ -23,6 +28,8 @@ from django.conf import settings
 from django.db import transaction
 
 from cvat.apps.engine import models
+from cvat.apps.engine.cache import schedule_chunks_preparation
+from cvat.apps.engine.frame_provider import FrameProvider
 from cvat.apps.engine.log import slogger
 from cvat.apps.engine.media_extractors import (MEDIA_TYPES, Mpeg4ChunkWriter, Mpeg4CompressedChunkWriter,
     ValidateDimension, ZipChunkWriter, ZipCompressedChunkWriter, get_mime, sort)
@@ -283,6 +290,124 @@ def _download_data(urls, upload_dir):
 def _get_manifest_frame_indexer(start_frame=0, frame_step=1):
     return lambda frame_id: start_frame + frame_id * frame_step
 
+def _copy_original_chunk(original_chunk_writer, chunk_data, original_chunk_path):
+    # Video chunks, which start on a key frame, are copied from the video without re-encoding
+    first_frame, source_path, start_pts = chunk_data[0]
+    if not isinstance(original_chunk_writer, Mpeg4ChunkWriter) or \
+            not getattr(first_frame, 'key_frame', False):
+        return False
+    return original_chunk_writer.copy_as_chunk(source_path, start_pts, len(chunk_data),
+        original_chunk_path, frame_pts=[pts for _, _, pts in chunk_data])
+
+def _write_chunk(original_chunk_writer, compressed_chunk_writer, chunk_data,
+        original_chunk_path, compressed_chunk_path):
+    if not _copy_original_chunk(original_chunk_writer, chunk_data, original_chunk_path):
+        original_chunk_writer.save_as_chunk(chunk_data, original_chunk_path)
+    return compressed_chunk_writer.save_as_chunk(chunk_data, compressed_chunk_path)
+
+def _save_chunks(chunks, db_data, original_chunk_writer, compressed_chunk_writer):
+    for chunk_idx, chunk_data in chunks:
+        img_sizes = _write_chunk(original_chunk_writer, compressed_chunk_writer, chunk_data,
+            db_data.get_original_chunk_path(chunk_idx), db_data.get_compressed_chunk_path(chunk_idx))
+        yield chunk_idx, chunk_data, img_sizes
+
+def _save_chunks_in_parallel(chunks, db_data, original_chunk_writer, compressed_chunk_writer,
+        max_workers):
+    # Chunks are written by a process pool, while results are returned in the
+    # original order. The number of chunks in flight is limited to keep
+    # memory consumption bounded.
+    max_in_flight = 2 * max_workers
+    in_flight = deque()
+
+    # 'fork' is required, because the writers can't be imported without
+    # a configured Django environment
+    with ProcessPoolExecutor(max_workers=max_workers,
+            mp_context=multiprocessing.get_context('fork')) as executor:
+        for chunk_idx, chunk_data in chunks:
+            if len(in_flight) == max_in_flight:
+                done_idx, done_data, future = in_flight.popleft()
+                yield done_idx, done_data, future.result()
+
+            in_flight.append((chunk_idx, chunk_data, executor.submit(_write_chunk,
+                original_chunk_writer, compressed_chunk_writer, chunk_data,
+                db_data.get_original_chunk_path(chunk_idx),
+                db_data.get_compressed_chunk_path(chunk_idx))))
+
+        while in_flight:
+            done_idx, done_data, future = in_flight.popleft()
+            yield done_idx, done_data, future.result()
+
+def _write_video_segment(extractor, segment, chunk_paths,
+        original_chunk_writer, compressed_chunk_writer):
+    key_frame, frame_pts, chunks = segment
+    first_frame_pts = frame_pts[chunks[0][1][0] - key_frame[0]]
+
+    saved_chunks = []
+    with closing(extractor.decode_segment(key_frame, frame_pts)) as frames:
+        # frames before the segment are decoded only to get to its first frame
+        segment_frames = itertools.dropwhile(lambda f: f[2] < first_frame_pts, frames)
+        for (chunk_idx, chunk_frames), (original_chunk_path, compressed_chunk_path) \
+                in zip(chunks, chunk_paths):
+            chunk_data = list(itertools.islice(segment_frames, len(chunk_frames)))
+            if len(chunk_data) != len(chunk_frames):
+                raise Exception('Not enough frames were decoded for the chunk #{}'.format(chunk_idx))
+            img_sizes = _write_chunk(original_chunk_writer, compressed_chunk_writer, chunk_data,
+                original_chunk_path, compressed_chunk_path)
+            # decoded frames can't be passed back to the main process
+            saved_chunks.append((chunk_idx, [(None, path, pts) for _, path, pts in chunk_data],
+                img_sizes))
+    return saved_chunks
+
+def _save_video_chunks_in_parallel(extractor, segments, db_data,
+        original_chunk_writer, compressed_chunk_writer, max_workers):
+    # Segments of the video are decoded and written by a process pool, while
+    # chunks are returned in the original order. If a segment can't be decoded
+    # independently, the remaining chunks are written sequentially.
+    max_in_flight = 2 * max_workers
+    in_flight = deque()
+    next_chunk_idx = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                mp_context=multiprocessing.get_context('fork')) as executor:
+            for segment in segments:
+                if len(in_flight) == max_in_flight:
+                    for saved_chunk in in_flight.popleft().result():
+                        yield saved_chunk
+                        next_chunk_idx = saved_chunk[0] + 1
+
+                chunk_paths = [
+                    (db_data.get_original_chunk_path(chunk_idx),
+                        db_data.get_compressed_chunk_path(chunk_idx))
+                    for chunk_idx, _ in segment[2]
+                ]
+                in_flight.append(executor.submit(_write_video_segment, extractor, segment,
+                    chunk_paths, original_chunk_writer, compressed_chunk_writer))
+
+            while in_flight:
+                for saved_chunk in in_flight.popleft().result():
+                    yield saved_chunk
+                    next_chunk_idx = saved_chunk[0] + 1
+        return
+    except Exception as ex:
+        slogger.glob.warning('Video chunks of Data #{} will be written sequentially '
+            'from the chunk #{}: {}'.format(db_data.id, next_chunk_idx, ex))
+
+    for _, _, chunks in segments:
+        for chunk_idx, _ in chunks:
+            if chunk_idx < next_chunk_idx:
+                continue
+            for chunk_path in (db_data.get_original_chunk_path(chunk_idx),
+                    db_data.get_compressed_chunk_path(chunk_idx)):
+                if os.path.exists(chunk_path):
+                    os.remove(chunk_path)
+
+    counter = itertools.count()
+    generator = itertools.groupby(extractor, lambda x: next(counter) // db_data.chunk_size)
+    generator = ((chunk_idx, list(chunk_data)) for chunk_idx, chunk_data in generator
+        if chunk_idx >= next_chunk_idx)
+    yield from _save_chunks(generator, db_data, original_chunk_writer, compressed_chunk_writer)
+
 
 @transaction.atomic
 def _create_thread(db_task, data, isBackupRestore=False, isDatasetImport=False):
@@ -354,16 +479,15 @@ def _create_thread(db_task, data, isBackupRestore=False, isDatasetImport=False):
             sorted_media_without_manifest_prefix = [
                 os.path.relpath(i, cloud_storage_manifest_prefix) for i in sorted_media
             ]
-            sequence, raw_content = cloud_storage_manifest.get_subset(sorted_media_without_manifest_prefix)
+            raw_content = cloud_storage_manifest.get_subset(sorted_media_without_manifest_prefix)
             def _add_prefix(properties):
                 file_name = properties['name']
                 properties['name'] = os.path.join(cloud_storage_manifest_prefix, file_name)
                 return properties
             content = list(map(_add_prefix, raw_content))
         else:
-            sequence, content = cloud_storage_manifest.get_subset(sorted_media)
-        sorted_content = (i[1] for i in sorted(zip(sequence, content)))
-        manifest.create(sorted_content)
+            content = cloud_storage_manifest.get_subset(sorted_media)
+        manifest.create(content)
 
     av_scan_paths(upload_dir)
 
@@ -576,10 +700,13 @@ def _create_thread(db_task, data, isBackupRestore=False, isDatasetImport=False):
                         manifest.link(
                             media_file=media_files[0],
                             upload_dir=upload_dir,
-                            chunk_size=db_data.chunk_size
+                            chunk_size=db_data.chunk_size,
+                            workers=settings.CHUNK_CREATE_WORKERS,
                         )
                         manifest.create()
                         _update_status('A manifest had been created')
+                        slogger.glob.info('The manifest of task #{} was prepared at {:.1f} frames/s'.format(
+                            db_task.id, manifest.reader.throughput))
 
                         all_frames = len(manifest.reader)
                         video_size = manifest.reader.resolution
@@ -604,6 +731,7 @@ def _create_thread(db_task, data, isBackupRestore=False, isDatasetImport=False):
                         meta={ k: {'related_images': related_images[k] } for k in related_images },
                         data_dir=upload_dir,
                         DIM_3D=(db_task.dimension == models.DimensionType.DIM_3D),
+                        workers=settings.CHUNK_CREATE_WORKERS,
                     )
                     manifest.create()
                 else:
@@ -635,14 +763,28 @@ def _create_thread(db_task, data, isBackupRestore=False, isDatasetImport=False):
     if db_data.storage_method == models.StorageMethodChoice.FILE_SYSTEM or not settings.USE_CACHE:
         counter = itertools.count()
         generator = itertools.groupby(extractor, lambda x: next(counter) // db_data.chunk_size)
-        for chunk_idx, chunk_data in generator:
-            chunk_data = list(chunk_data)
-            original_chunk_path = db_data.get_original_chunk_path(chunk_idx)
-            original_chunk_writer.save_as_chunk(chunk_data, original_chunk_path)
-
-            compressed_chunk_path = db_data.get_compressed_chunk_path(chunk_idx)
-            img_sizes = compressed_chunk_writer.save_as_chunk(chunk_data, compressed_chunk_path)
+        generator = ((chunk_idx, list(chunk_data)) for chunk_idx, chunk_data in generator)
+
+        # Decoded video frames can't be passed to other processes,
+        # so the processes decode independent segments of the video themselves
+        video_segments = None
+        if db_task.mode == 'interpolation' and settings.CHUNK_CREATE_WORKERS > 1:
+            video_segments = extractor.split_into_segments(db_data.chunk_size,
+                settings.VIDEO_SEGMENT_CHUNKS)
+
+        if db_task.mode == 'annotation' and settings.CHUNK_CREATE_WORKERS > 1:
+            saved_chunks = _save_chunks_in_parallel(generator, db_data,
+                original_chunk_writer, compressed_chunk_writer,
+                max_workers=settings.CHUNK_CREATE_WORKERS)
+        elif video_segments and len(video_segments) > 1:
+            saved_chunks = _save_video_chunks_in_parallel(extractor, video_segments, db_data,
+                original_chunk_writer, compressed_chunk_writer,
+                max_workers=settings.CHUNK_CREATE_WORKERS)
+        else:
+            saved_chunks = _save_chunks(generator, db_data,
+                original_chunk_writer, compressed_chunk_writer)
 
+        for _, chunk_data, img_sizes in saved_chunks:
             if db_task.mode == 'annotation':
                 db_images.extend([
                     models.Image(
@@ -691,3 +833,12 @@ def _create_thread(db_task, data, isBackupRestore=False, isDatasetImport=False):
 
     slogger.glob.info("Found frames {} for Data #{}".format(db_data.size, db_data.id))
     _save_task_to_db(db_task, extractor)
+
+    # Prepare the first chunks of each job, so that jobs can be opened faster
+    for db_segment in db_task.segment_set.all():
+        start_chunk = db_segment.start_frame // db_data.chunk_size
+        stop_chunk = min(start_chunk + settings.CHUNK_READ_AHEAD,
+            db_segment.stop_frame // db_data.chunk_size)
+        transaction.on_commit(functools.partial(schedule_chunks_preparation, db_data,
+            range(start_chunk, stop_chunk + 1), FrameProvider.Quality.COMPRESSED,
+            db_task.dimension))
@@ -0,0 +1,207 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory, TemporaryFile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from cvat.apps.engine.frame_provider import FrameProvider
+from cvat.apps.engine.models import DataChoice, StorageMethodChoice
+from cvat.apps.engine.views import DataChunkGetter
+
+
+class DataChunkGetterRangeTest(SimpleTestCase):
+    DATA = bytes(range(100))
+    ETAG = '"1-chunk-0-original-1"'
+
+    def _get_range(self, range_header, **headers):
+        request = RequestFactory().get('/', HTTP_RANGE=range_header, **headers)
+        getter = DataChunkGetter('chunk', '0', 'original', '2d')
+        return getter._make_range_response(request, BytesIO(self.DATA),
+            len(self.DATA), 'video/mp4', self.ETAG)
+
+    def test_can_get_range(self):
+        response = self._get_range('bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[10:20])
+
+    def test_can_get_suffix_range(self):
+        response = self._get_range('bytes=-10')
+
+        self.assertEqual(response['Content-Range'], 'bytes 90-99/100')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[90:])
+
+    def test_can_get_open_range(self):
+        response = self._get_range('bytes=95-')
+
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[95:])
+
+    def test_unsatisfiable_range(self):
+        response = self._get_range('bytes=100-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_ignore_range_for_another_version(self):
+        self.assertIsNone(self._get_range('bytes=0-9',
+            HTTP_IF_RANGE='"1-chunk-0-original-2"'))
+
+    def test_ignore_multiple_ranges(self):
+        self.assertIsNone(self._get_range('bytes=0-9,20-29'))
+
+class DataChunkGetterChunkResponseTest(SimpleTestCase):
+    DATA = bytes(range(100))
+
+    def setUp(self):
+        self.db_data = SimpleNamespace(id=1, original_chunk_type=DataChoice.VIDEO)
+        self.getter = DataChunkGetter('chunk', '0', 'original', '2d')
+
+    def _get_chunk(self, chunk, **headers):
+        request = RequestFactory().get('/', **headers)
+        return self.getter._make_chunk_response(request, self.db_data,
+            chunk=chunk, mime_type='video/mp4')
+
+    def _make_file_chunk(self):
+        chunk = TemporaryFile()
+        chunk.write(self.DATA)
+        chunk.seek(0)
+        return chunk
+
+    def test_can_send_chunk_from_memory(self):
+        response = self._get_chunk(BytesIO(self.DATA))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(b''.join(response.streaming_content), self.DATA)
+
+    def test_can_send_range_of_chunk_from_memory(self):
+        response = self._get_chunk(BytesIO(self.DATA), HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[10:20])
+
+    def test_can_send_chunk_from_file_with_validators(self):
+        response = self._get_chunk(self._make_file_chunk())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(b''.join(response.streaming_content), self.DATA)
+        response.close()
+
+@override_settings(USE_CACHE=True, CHUNK_READ_AHEAD=0)
+class DataChunkGetterCacheStorageTest(SimpleTestCase):
+    CHUNK = bytes(range(100))
+    FRAME = b'frame'
+    IF_NONE_MATCH = '"1-chunk-0-original-1"'
+    IF_MODIFIED_SINCE = 'Thu, 01 Jan 2099 00:00:00 GMT'
+
+    def setUp(self):
+        self.db_data = SimpleNamespace(id=1, storage_method=StorageMethodChoice.CACHE,
+            original_chunk_type=DataChoice.VIDEO)
+
+        frame_provider = mock.Mock()
+        frame_provider.get_chunk_number.return_value = 0
+        frame_provider.get_chunk_file.side_effect = \
+            lambda *args: (self._make_chunk(), 'video/mp4')
+        frame_provider.get_frame.side_effect = \
+            lambda *args: (BytesIO(self.FRAME), 'image/png')
+
+        for patcher in [
+            mock.patch('cvat.apps.engine.views.FrameProvider',
+                return_value=frame_provider, Quality=FrameProvider.Quality),
+            mock.patch('cvat.apps.engine.views.schedule_chunks_preparation'),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _make_chunk(self):
+        # Chunks cached by older versions are read from the cache as BytesIO
+        return BytesIO(self.CHUNK)
+
+    def _get(self, data_type, **headers):
+        request = RequestFactory().get('/', **headers)
+        getter = DataChunkGetter(data_type, '0', 'original', '2d')
+        return getter(request, 0, 0, self.db_data, None)
+
+    def _get_with_validators(self, data_type):
+        return self._get(data_type, HTTP_IF_NONE_MATCH=self.IF_NONE_MATCH,
+            HTTP_IF_MODIFIED_SINCE=self.IF_MODIFIED_SINCE)
+
+    def test_can_get_chunk(self):
+        response = self._get('chunk')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(b''.join(response.streaming_content), self.CHUNK)
+
+    def test_can_get_chunk_with_validators(self):
+        response = self._get_with_validators('chunk')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CHUNK)
+
+    def test_can_get_chunk_range(self):
+        response = self._get('chunk', HTTP_RANGE='bytes=90-')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CHUNK[90:])
+
+    def test_can_get_frame(self):
+        response = self._get('frame')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(response.content, self.FRAME)
+
+    def test_can_get_frame_with_validators(self):
+        response = self._get_with_validators('frame')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.FRAME)
+
+class DataChunkGetterCacheFileTest(DataChunkGetterCacheStorageTest):
+    def setUp(self):
+        super().setUp()
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.chunk_path = os.path.join(self._tmp_dir.name, 'chunk.mp4')
+        with open(self.chunk_path, 'wb') as f:
+            f.write(self.CHUNK)
+
+    def _make_chunk(self):
+        return open(self.chunk_path, 'rb')
+
+    def _get_revalidated(self, data_type):
+        response = self._get(data_type)
+        response.close()
+        return self._get(data_type, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_can_get_chunk(self):
+        response = self._get('chunk')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertEqual(b''.join(response.streaming_content), self.CHUNK)
+        response.close()
+
+    def test_can_get_frame(self):
+        response = self._get('frame')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertEqual(response.content, self.FRAME)
+
+    def test_can_revalidate_chunk(self):
+        self.assertEqual(self._get_revalidated('chunk').status_code, 304)
+
+    def test_can_revalidate_frame(self):
+        self.assertEqual(self._get_revalidated('frame').status_code, 304)
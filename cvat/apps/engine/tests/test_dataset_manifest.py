@@ -0,0 +1,147 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from utils.dataset_manifest import ImageManifestManager
+from utils.dataset_manifest.core import _Index, _Manifest
+
+
+class _ManifestTestCase(TestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.manifest_path = os.path.join(self._tmp_dir.name, 'manifest.jsonl')
+
+    def _create_manifest(self, names):
+        manifest = ImageManifestManager(self.manifest_path)
+        manifest.create(content=[
+            { 'name': name, 'extension': '.jpg', 'width': 10, 'height': 10 }
+            for name in names
+        ])
+        return manifest
+
+class ManifestIndexTest(_ManifestTestCase):
+    def test_can_convert_legacy_index(self):
+        manifest = self._create_manifest(['a', 'b', 'c'])
+        manifest.init_index()
+        expected = [manifest[i] for i in range(3)]
+
+        index = _Index(self._tmp_dir.name)
+        index.load()
+        offsets = { i: index[i] for i in range(len(index)) }
+        index.remove()
+        with open(os.path.join(self._tmp_dir.name, _Index.LEGACY_FILE_NAME), 'w') as f:
+            json.dump(offsets, f)
+
+        manifest = ImageManifestManager(self.manifest_path)
+        manifest.init_index()
+
+        self.assertEqual(expected, [manifest[i] for i in range(3)])
+        self.assertEqual([_Index.FILE_NAME, 'manifest.jsonl'],
+            sorted(os.listdir(self._tmp_dir.name)))
+
+    def test_can_load_index_converted_by_another_process(self):
+        manifest = self._create_manifest(['a', 'b', 'c'])
+        manifest.init_index()
+        index = _Index(self._tmp_dir.name)
+        index.load()
+        offsets = { i: index[i] for i in range(len(index)) }
+        index.remove()
+        with open(os.path.join(self._tmp_dir.name, _Index.LEGACY_FILE_NAME), 'w') as f:
+            json.dump(offsets, f)
+
+        tmp_dir = self._tmp_dir.name
+        class _ConcurrentIndex(_Index):
+            def _load_legacy(self):
+                # Another process finishes the conversion first
+                _Index(tmp_dir).load()
+                super()._load_legacy()
+
+        index = _ConcurrentIndex(self._tmp_dir.name)
+        index.load()
+
+        self.assertEqual(list(offsets.values()), [index[i] for i in range(len(index))])
+
+    def test_recreates_empty_index_of_not_empty_manifest(self):
+        manifest = self._create_manifest(['a', 'b', 'c'])
+        open(os.path.join(self._tmp_dir.name, _Index.FILE_NAME), 'wb').close()
+
+        manifest.init_index()
+
+        self.assertEqual(3, len(manifest))
+        self.assertEqual('c', manifest[2]['name'])
+
+    def test_dump_does_not_leave_temporary_files(self):
+        manifest = self._create_manifest(['a', 'b'])
+        manifest.set_index()
+
+        self.assertEqual([_Index.FILE_NAME, 'manifest.jsonl'],
+            sorted(os.listdir(self._tmp_dir.name)))
+
+class ManifestVersionTest(_ManifestTestCase):
+    def test_new_manifest_has_file_checksums(self):
+        manifest = self._create_manifest(['a'])
+
+        self.assertEqual(_Manifest.VERSION, manifest['version'])
+        self.assertTrue(manifest.has_file_checksums)
+
+    def test_old_manifest_has_decoded_image_checksums(self):
+        for version in {'1.0', '1.1'}:
+            with self.subTest(version=version):
+                with open(self.manifest_path, 'w') as f:
+                    f.write(json.dumps({ 'version': version }) + '\n')
+                    f.write(json.dumps({ 'type': 'images' }) + '\n')
+                    f.write(json.dumps({ 'name': 'a', 'extension': '.jpg',
+                        'width': 10, 'height': 10, 'checksum': '0' * 32 }) + '\n')
+
+                manifest = ImageManifestManager(self.manifest_path)
+                manifest.set_index()
+
+                self.assertFalse(manifest.has_file_checksums)
+
+class ManifestSubsetTest(_ManifestTestCase):
+    def _create_manifest_with_files(self, files):
+        manifest = ImageManifestManager(self.manifest_path)
+        manifest.create(content=[
+            { 'name': name, 'extension': extension, 'width': width, 'height': 10 }
+            for width, (name, extension) in enumerate(files)
+        ])
+        return manifest
+
+    @staticmethod
+    def _get_files(subset):
+        return [(item['name'] + item['extension'], item['width']) for item in subset]
+
+    def test_can_get_subset_in_requested_order(self):
+        manifest = self._create_manifest_with_files([('a', '.jpg'), ('b', '.jpg'), ('c', '.jpg')])
+
+        subset = manifest.get_subset(['c.jpg', 'a.jpg', 'd.jpg'])
+
+        self.assertEqual([('c.jpg', 2), ('a.jpg', 0)], self._get_files(subset))
+
+    def test_can_distinguish_extensions(self):
+        manifest = self._create_manifest_with_files([('a', '.jpg'), ('a', '.png')])
+
+        subset = manifest.get_subset(['a.png'])
+
+        self.assertEqual([('a.png', 1)], self._get_files(subset))
+
+    def test_keeps_duplicate_manifest_names(self):
+        manifest = self._create_manifest_with_files([('a', '.jpg'), ('b', '.jpg'), ('a', '.jpg')])
+
+        subset = manifest.get_subset(['a.jpg', 'b.jpg'])
+
+        self.assertEqual([('a.jpg', 0), ('a.jpg', 2), ('b.jpg', 1)], self._get_files(subset))
+
+    def test_keeps_duplicate_requested_names(self):
+        manifest = self._create_manifest_with_files([('a', '.jpg'), ('b', '.jpg')])
+
+        subset = manifest.get_subset(['a.jpg', 'b.jpg', 'a.jpg'])
+
+        self.assertEqual([('a.jpg', 0), ('b.jpg', 1), ('a.jpg', 0)], self._get_files(subset))
+        self.assertIsNot(subset[0], subset[2])
@@ -0,0 +1,136 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from cvat.apps.engine import frame_provider
+from cvat.apps.engine.frame_provider import DecodedChunkCache, FrameProvider
+
+
+class DecodedChunkCacheTest(TestCase):
+    @staticmethod
+    def _make_frames(count, size):
+        return [(b'\0' * size, '{:06d}.jpeg'.format(i)) for i in range(count)]
+
+    def test_can_get_cached_chunk(self):
+        cache = DecodedChunkCache(capacity=100)
+        frames = self._make_frames(2, 10)
+
+        self.assertTrue(cache.put((1, 0, 'q'), frames))
+
+        self.assertIs(cache.get((1, 0, 'q')), frames)
+        self.assertIsNone(cache.get((1, 1, 'q')))
+        self.assertEqual(cache.size, 20)
+
+    def test_evicts_least_recently_used_chunks(self):
+        cache = DecodedChunkCache(capacity=50)
+        cache.put((1, 0, 'q'), self._make_frames(2, 10))
+        cache.put((1, 1, 'q'), self._make_frames(2, 10))
+        cache.get((1, 0, 'q'))
+
+        cache.put((1, 2, 'q'), self._make_frames(2, 10))
+
+        self.assertIsNotNone(cache.get((1, 0, 'q')))
+        self.assertIsNone(cache.get((1, 1, 'q')))
+        self.assertIsNotNone(cache.get((1, 2, 'q')))
+        self.assertEqual(cache.size, 40)
+
+    def test_does_not_keep_chunks_bigger_than_capacity(self):
+        cache = DecodedChunkCache(capacity=10)
+
+        self.assertFalse(cache.put((1, 0, 'q'), self._make_frames(2, 10)))
+        self.assertEqual(len(cache), 0)
+
+    def test_can_invalidate_data(self):
+        cache = DecodedChunkCache(capacity=100)
+        cache.put((1, 0, 'q'), self._make_frames(1, 10))
+        cache.put((2, 0, 'q'), self._make_frames(1, 10))
+
+        cache.invalidate(1)
+
+        self.assertIsNone(cache.get((1, 0, 'q')))
+        self.assertIsNotNone(cache.get((2, 0, 'q')))
+        self.assertEqual(cache.size, 10)
+
+    def test_remembers_chunks_bigger_than_capacity(self):
+        cache = DecodedChunkCache(capacity=10)
+        cache.put((1, 0, 'q'), self._make_frames(2, 10))
+
+        self.assertTrue(cache.is_oversized((1, 0, 'q')))
+        self.assertFalse(cache.is_oversized((1, 1, 'q')))
+
+        cache.invalidate(1)
+
+        self.assertFalse(cache.is_oversized((1, 0, 'q')))
+
+    def test_limits_remembered_chunks_bigger_than_capacity(self):
+        cache = DecodedChunkCache(capacity=10, oversized_keys_limit=2)
+        cache.put((1, 0, 'q'), self._make_frames(2, 10))
+        cache.put((1, 1, 'q'), self._make_frames(2, 10))
+        cache.is_oversized((1, 0, 'q'))
+
+        cache.put((1, 2, 'q'), self._make_frames(2, 10))
+
+        self.assertTrue(cache.is_oversized((1, 0, 'q')))
+        self.assertFalse(cache.is_oversized((1, 1, 'q')))
+        self.assertTrue(cache.is_oversized((1, 2, 'q')))
+
+class ChunkLoaderTest(TestCase):
+    FRAME_SIZE = 10
+
+    def setUp(self):
+        self.decoded_frames = 0
+
+        test = self
+        class _Reader:
+            def __init__(self, sources):
+                self.chunk_id = sources[0]
+
+            def __iter__(self):
+                for i in range(3):
+                    test.decoded_frames += 1
+                    yield (bytes([i]) * test.FRAME_SIZE,
+                        '{}_{}.jpeg'.format(self.chunk_id, i), i)
+        self.reader_class = _Reader
+
+    def _set_cache(self, capacity):
+        cache = DecodedChunkCache(capacity=capacity)
+        self.addCleanup(setattr, frame_provider, '_decoded_chunk_cache',
+            frame_provider._decoded_chunk_cache)
+        frame_provider._decoded_chunk_cache = cache
+        return cache
+
+    def _make_loader(self):
+        return FrameProvider.ChunkLoader(self.reader_class, lambda chunk_id: chunk_id,
+            FrameProvider.Quality.ORIGINAL, SimpleNamespace(id=1))
+
+    def test_can_cache_chunk(self):
+        cache = self._set_cache(capacity=100)
+
+        self._make_loader().load(5)
+        frames = self._make_loader().load(5)
+
+        self.assertEqual((bytes([1]) * self.FRAME_SIZE, '5_1.jpeg'), frames[1][:2])
+        self.assertEqual(3, self.decoded_frames)
+        self.assertEqual(30, cache.size)
+
+    def test_can_read_chunk_bigger_than_cache(self):
+        cache = self._set_cache(capacity=15)
+
+        frames = self._make_loader().load(5)
+
+        self.assertEqual((bytes([1]) * self.FRAME_SIZE, '5_1.jpeg'), frames[1][:2])
+        self.assertEqual((bytes([2]) * self.FRAME_SIZE, '5_2.jpeg'), frames[2][:2])
+        self.assertEqual(0, len(cache))
+
+    def test_does_not_decode_chunk_bigger_than_cache_for_caching_again(self):
+        self._set_cache(capacity=15)
+        self._make_loader().load(5)
+        self.decoded_frames = 0
+
+        frames = self._make_loader().load(5)
+
+        self.assertEqual('5_0.jpeg', frames[0][1])
+        self.assertEqual(1, self.decoded_frames)
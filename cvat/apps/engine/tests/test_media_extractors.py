@@ -0,0 +1,100 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import itertools
+import os
+from contextlib import closing
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import av
+import numpy as np
+
+from cvat.apps.engine.media_extractors import Mpeg4ChunkWriter, VideoReader
+
+
+class _VideoTestCase(TestCase):
+    FRAMES = 100
+    CODEC_OPTIONS = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._tmp_dir = TemporaryDirectory()
+        cls.video_path = os.path.join(cls._tmp_dir.name, 'video.mp4')
+
+        container = av.open(cls.video_path, 'w')
+        stream = container.add_stream('libx264', rate=25)
+        stream.width, stream.height = 64, 48
+        stream.pix_fmt = 'yuv420p'
+        stream.options = { 'g': '10', 'sc_threshold': '0', **cls.CODEC_OPTIONS }
+        for i in range(cls.FRAMES):
+            frame = av.VideoFrame.from_ndarray(
+                np.full((48, 64, 3), i, dtype=np.uint8), format='rgb24')
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+        container.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp_dir.cleanup()
+        super().tearDownClass()
+
+class VideoReaderSegmentsTest(_VideoTestCase):
+    CODEC_OPTIONS = { 'bf': '2' }
+
+    def _check_segments(self, chunk_size, **kwargs):
+        reader = VideoReader([self.video_path], **kwargs)
+        counter = itertools.count()
+        expected_chunks = [
+            (chunk_idx, [pts for _, _, pts in chunk_frames])
+            for chunk_idx, chunk_frames in itertools.groupby(reader,
+                lambda _: next(counter) // chunk_size)
+        ]
+
+        segments = reader.split_into_segments(chunk_size, chunks_per_segment=2)
+        self.assertGreater(len(segments), 1)
+
+        actual_chunks = []
+        for key_frame, frame_pts, chunks in segments:
+            decoded_pts = [pts for _, _, pts in reader.decode_segment(key_frame, frame_pts)]
+            for chunk_idx, chunk_frames in chunks:
+                chunk_pts = [frame_pts[number - key_frame[0]] for number in chunk_frames]
+                self.assertTrue(set(chunk_pts).issubset(decoded_pts))
+                actual_chunks.append((chunk_idx, chunk_pts))
+
+        self.assertEqual(actual_chunks, expected_chunks)
+
+    def test_can_split_video_into_segments(self):
+        self._check_segments(chunk_size=8)
+
+    def test_can_split_video_into_segments_with_step(self):
+        self._check_segments(chunk_size=5, start=3, stop=80, step=3)
+
+class Mpeg4ChunkWriterCopyTest(_VideoTestCase):
+    CODEC_OPTIONS = { 'profile': 'baseline' }
+
+    def _get_packets_pts(self):
+        with closing(av.open(self.video_path)) as container:
+            return [packet.pts for packet in container.demux(video=0) if packet.size]
+
+    def test_can_copy_chunk_from_key_frame(self):
+        frame_pts = sorted(self._get_packets_pts())
+        chunk = BytesIO()
+
+        self.assertTrue(Mpeg4ChunkWriter().copy_as_chunk(self.video_path,
+            frame_pts[20], 10, chunk, frame_pts=frame_pts[20:30]))
+
+        chunk.seek(0)
+        with closing(av.open(chunk)) as container:
+            self.assertEqual(len(list(container.decode(video=0))), 10)
+
+    def test_cannot_copy_chunk_from_not_key_frame(self):
+        frame_pts = sorted(self._get_packets_pts())
+
+        self.assertFalse(Mpeg4ChunkWriter().copy_as_chunk(self.video_path,
+            frame_pts[25], 10, BytesIO()))
@@ -0,0 +1,119 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from unittest import TestCase
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+from cvat.apps.engine.models import FloatBinaryArrayField
+
+
+class FloatBinaryArrayFieldTest(TestCase):
+    def setUp(self):
+        self.field = FloatBinaryArrayField()
+
+    def _save_and_load(self, value):
+        return self.field.from_db_value(self.field.get_prep_value(value), None, None)
+
+    def test_can_save_and_load_points(self):
+        points = [1.5, -2.25, 0.0, 1e-7, 123456.789]
+
+        self.assertEqual(points, self._save_and_load(points))
+
+    def test_keeps_float_precision(self):
+        points = [0.1 + 0.2, 1 / 3, 1e300, -5e-324]
+
+        self.assertEqual(points, self._save_and_load(points))
+
+    def test_can_save_and_load_empty_points(self):
+        self.assertEqual(b'', self.field.get_prep_value([]))
+        self.assertEqual([], self._save_and_load([]))
+
+    def test_can_save_integer_points(self):
+        loaded = self._save_and_load([1, 2])
+
+        self.assertEqual([1.0, 2.0], loaded)
+        self.assertTrue(all(isinstance(value, float) for value in loaded))
+
+    def test_can_load_points_from_memoryview(self):
+        # Postgres returns binary values as memoryview objects
+        value = memoryview(self.field.get_prep_value([3.0, 4.5]))
+
+        self.assertEqual([3.0, 4.5], self.field.from_db_value(value, None, None))
+
+    def test_keeps_none(self):
+        self.assertIsNone(self.field.get_prep_value(None))
+        self.assertIsNone(self.field.from_db_value(None, None, None))
+
+    def test_to_python_accepts_lists_and_bytes(self):
+        self.assertEqual([1.0, 2.0], self.field.to_python([1.0, 2.0]))
+        self.assertEqual([1.0, 2.0],
+            self.field.to_python(self.field.get_prep_value([1.0, 2.0])))
+
+class ShapePointsMigrationTest(TransactionTestCase):
+    MIGRATE_FROM = [('engine', '0059_labeledshape_outside')]
+    MIGRATE_TO = [('engine', '0060_shape_points_binary')]
+
+    LABELED_SHAPE_POINTS = [1.5, 2.0, 30.25, 40.125]
+    TRACKED_SHAPE_POINTS = [0.1, 0.2, 1 / 3, 1e-7]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def _create_shapes(self, apps):
+        db_data = apps.get_model('engine', 'Data').objects.create(chunk_size=1, size=1)
+        db_task = apps.get_model('engine', 'Task').objects.create(name='task',
+            mode='annotation', data=db_data)
+        db_segment = apps.get_model('engine', 'Segment').objects.create(task=db_task,
+            start_frame=0, stop_frame=0)
+        db_job = apps.get_model('engine', 'Job').objects.create(segment=db_segment)
+        db_label = apps.get_model('engine', 'Label').objects.create(task=db_task,
+            name='car')
+
+        db_shape = apps.get_model('engine', 'LabeledShape').objects.create(job=db_job,
+            label=db_label, frame=0, type='rectangle',
+            points=self.LABELED_SHAPE_POINTS)
+        db_empty_shape = apps.get_model('engine', 'LabeledShape').objects.create(
+            job=db_job, label=db_label, frame=0, type='skeleton', points=[])
+        db_track = apps.get_model('engine', 'LabeledTrack').objects.create(job=db_job,
+            label=db_label, frame=0)
+        db_tracked_shape = apps.get_model('engine', 'TrackedShape').objects.create(
+            track=db_track, frame=0, type='rectangle', points=self.TRACKED_SHAPE_POINTS)
+
+        return db_shape.id, db_empty_shape.id, db_tracked_shape.id
+
+    def _check_points(self, apps, shape_id, empty_shape_id, tracked_shape_id):
+        LabeledShape = apps.get_model('engine', 'LabeledShape')
+        TrackedShape = apps.get_model('engine', 'TrackedShape')
+
+        self.assertEqual(self.LABELED_SHAPE_POINTS,
+            LabeledShape.objects.get(id=shape_id).points)
+        self.assertEqual([], LabeledShape.objects.get(id=empty_shape_id).points)
+        self.assertEqual(self.TRACKED_SHAPE_POINTS,
+            TrackedShape.objects.get(id=tracked_shape_id).points)
+
+    def test_can_pack_points(self):
+        shape_ids = self._create_shapes(self._migrate(self.MIGRATE_FROM))
+
+        apps = self._migrate(self.MIGRATE_TO)
+
+        self._check_points(apps, *shape_ids)
+
+    def test_can_unpack_points(self):
+        self._migrate(self.MIGRATE_FROM)
+        shape_ids = self._create_shapes(self._migrate(self.MIGRATE_TO))
+
+        apps = self._migrate(self.MIGRATE_FROM)
+
+        self._check_points(apps, *shape_ids)
@@ -102,6 +102,15 @@ def md5_hash(frame):
         frame = Image.open(frame, 'r')
     return hashlib.md5(frame.tobytes()).hexdigest() # nosec
 
+def md5_file_hash(file, block_size=1024 * 1024):
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            return md5_file_hash(f, block_size)
+    file_hash = hashlib.md5() # nosec
+    for block in iter(lambda: file.read(block_size), b''):
+        file_hash.update(block)
+    return file_hash.hexdigest()
+
 def parse_specific_attributes(specific_attributes):
     assert isinstance(specific_attributes, str), 'Specific attributes must be a string'
     parsed_specific_attributes = urllib.parse.parse_qsl(specific_attributes)
@@ -8,6 +8,7 @@ import io
 import os
 import os.path as osp
 import pytz
+import re
 import shutil
 import traceback
 from datetime import datetime
@@ -22,8 +23,11 @@ from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseNotFound, HttpResponseBadRequest
+from django.http import (FileResponse, HttpResponse, HttpResponseNotFound,
+    HttpResponseBadRequest, StreamingHttpResponse)
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
@@ -43,6 +47,7 @@ from django_sendfile import sendfile
 
 import cvat.apps.dataset_manager as dm
 import cvat.apps.dataset_manager.views  # pylint: disable=unused-import
+from cvat.apps.engine.cache import schedule_chunks_preparation
 from cvat.apps.engine.cloud_provider import (
     db_storage_to_storage_instance, validate_bucket_status, Status as CloudStorageStatus)
 from cvat.apps.dataset_manager.bindings import CvatImportError
@@ -53,7 +58,7 @@ from cvat.apps.engine.mime_types import mimetypes
 from cvat.apps.engine.models import (
     Job, Task, Project, Issue, Data,
     Comment, StorageMethodChoice, StorageChoice, Image,
-    CloudProviderChoice, Location
+    CloudProviderChoice, Location, DataChoice
 )
 from cvat.apps.engine.models import CloudStorage as CloudStorageModel
 from cvat.apps.engine.serializers import (
@@ -598,6 +603,132 @@ class DataChunkGetter:
         self.dimension = task_dim
 
 
+    # Chunks are never changed after they are built, but they are available
+    # only to authorized users, so shared caches must not keep them
+    CHUNK_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+    RANGE_BLOCK_SIZE = 64 * 1024
+
+    def _get_validators(self, db_data, data_type, data_num, chunk_stat):
+        # The modification time of the chunk file is the build revision
+        # of the chunk: it changes only if the chunk is built again
+        if chunk_stat is None:
+            return None, None
+
+        etag = quote_etag('{}-{}-{}-{}-{:x}'.format(db_data.id, data_type,
+            data_num, self.quality.name.lower(), chunk_stat.st_mtime_ns))
+        return etag, int(chunk_stat.st_mtime)
+
+    @staticmethod
+    def _set_validators(response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+
+    @staticmethod
+    def _get_file_stat(chunk):
+        # Chunks saved by previous versions of the cache and chunks evicted
+        # from the cache right after building are kept in memory
+        if isinstance(chunk, io.BytesIO):
+            return None
+        try:
+            return os.fstat(chunk.fileno())
+        except (AttributeError, io.UnsupportedOperation):
+            return None
+
+    def _get_chunk_stat(self, frame_provider, db_data, chunk_number):
+        if settings.USE_CACHE and db_data.storage_method == StorageMethodChoice.CACHE:
+            chunk, _ = frame_provider.get_chunk_file(chunk_number, self.quality)
+            with chunk:
+                return self._get_file_stat(chunk)
+        return os.stat(frame_provider.get_chunk(chunk_number, self.quality))
+
+    @classmethod
+    def _iter_file_range(cls, chunk, start, length):
+        with chunk:
+            chunk.seek(start)
+            while length:
+                block = chunk.read(min(length, cls.RANGE_BLOCK_SIZE))
+                if not block:
+                    break
+                length -= len(block)
+                yield block
+
+    def _make_range_response(self, request, chunk, size, mime_type, etag):
+        """
+        Returns a partial response for a single byte range or None,
+        if the full chunk has to be sent
+        """
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)',
+            request.META.get('HTTP_RANGE', '').strip())
+        if not match or not any(match.groups()):
+            return None
+
+        # The range is applicable only to the same version of the chunk
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range and if_range != etag:
+            return None
+
+        first, last = match.groups()
+        if not first:
+            start, stop = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            stop = min(int(last), size - 1) if last else size - 1
+
+        if size <= start or stop < start:
+            chunk.close()
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+        response = StreamingHttpResponse(
+            self._iter_file_range(chunk, start, stop - start + 1),
+            status=status.HTTP_206_PARTIAL_CONTENT, content_type=mime_type)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, stop, size)
+        response['Content-Length'] = stop - start + 1
+        return response
+
+    def _make_chunk_response(self, request, db_data, chunk=None, mime_type=None,
+            path=None):
+        # Original video chunks are usually played by a video element,
+        # which requests them by parts
+        accept_ranges = self.quality == FrameProvider.Quality.ORIGINAL and \
+            db_data.original_chunk_type == DataChoice.VIDEO
+
+        chunk_stat = os.stat(path) if path else self._get_file_stat(chunk)
+        etag, last_modified = self._get_validators(db_data, 'chunk', self.number,
+            chunk_stat)
+
+        response = get_conditional_response(request, etag=etag,
+            last_modified=last_modified)
+        if response is not None:
+            if chunk is not None:
+                chunk.close()
+        elif accept_ranges and 'HTTP_RANGE' in request.META:
+            range_chunk = open(path, 'rb') if path else chunk
+            size = chunk_stat.st_size if chunk_stat else chunk.getbuffer().nbytes
+            response = self._make_range_response(request, range_chunk, size,
+                mime_type or mimetypes.guess_type(path)[0], etag)
+            if response is None and path:
+                range_chunk.close()
+
+        if response is None:
+            # The file is sent by the server without reading into memory
+            if path:
+                response = sendfile(request, path)
+            else:
+                response = FileResponse(chunk, content_type=mime_type)
+
+        self._set_validators(response, etag, last_modified)
+        if etag is not None and response.status_code in (status.HTTP_200_OK,
+                status.HTTP_206_PARTIAL_CONTENT, status.HTTP_304_NOT_MODIFIED):
+            response['Cache-Control'] = self.CHUNK_CACHE_CONTROL
+        if accept_ranges:
+            response['Accept-Ranges'] = 'bytes'
+        return response
+
     def __call__(self, request, start, stop, db_data, db_object):
         if not db_data:
             raise NotFound(detail='Cannot find requested data')
@@ -614,21 +745,39 @@ class DataChunkGetter:
 
             # TODO: av.FFmpegError processing
             if settings.USE_CACHE and db_data.storage_method == StorageMethodChoice.CACHE:
-                buff, mime_type = frame_provider.get_chunk(self.number, self.quality)
-                return HttpResponse(buff.getvalue(), content_type=mime_type)
+                chunk, mime_type = frame_provider.get_chunk_file(self.number, self.quality)
+
+                # Chunks are usually requested one after another, so prepare the next ones
+                read_ahead_stop = min(self.number + settings.CHUNK_READ_AHEAD, stop_chunk)
+                schedule_chunks_preparation(db_data,
+                    range(self.number + 1, read_ahead_stop + 1), self.quality, self.dimension)
+
+                return self._make_chunk_response(request, db_data,
+                    chunk=chunk, mime_type=mime_type)
 
             # Follow symbol links if the chunk is a link on a real image otherwise
             # mimetype detection inside sendfile will work incorrectly.
             path = os.path.realpath(frame_provider.get_chunk(self.number, self.quality))
-            return sendfile(request, path)
+            return self._make_chunk_response(request, db_data, path=path)
 
         elif self.type == 'frame':
             if not (start <= self.number <= stop):
                 raise ValidationError('The frame number should be in ' +
                     f'[{start}, {stop}] range')
 
-            buf, mime = frame_provider.get_frame(self.number, self.quality)
-            return HttpResponse(buf.getvalue(), content_type=mime)
+            # A frame is decoded from a chunk, so it is the same
+            # while the chunk is the same
+            chunk_stat = self._get_chunk_stat(frame_provider, db_data,
+                frame_provider.get_chunk_number(self.number))
+            etag, last_modified = self._get_validators(db_data, 'frame',
+                self.number, chunk_stat)
+            response = get_conditional_response(request, etag=etag,
+                last_modified=last_modified)
+            if response is None:
+                buf, mime = frame_provider.get_frame(self.number, self.quality)
+                response = HttpResponse(buf.getvalue(), content_type=mime)
+            self._set_validators(response, etag, last_modified)
+            return response
 
         elif self.type == 'preview':
             return sendfile(request, db_object.get_preview_path())
@@ -1281,6 +1430,12 @@ class JobViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
 
     @extend_schema(methods=['GET'], summary='Method returns annotations for a specific job',
         parameters=[
+            OpenApiParameter('start_frame', location=OpenApiParameter.QUERY,
+                description='The first frame of the returned annotations. Tracks are clipped to the frame range',
+                type=OpenApiTypes.INT, required=False),
+            OpenApiParameter('stop_frame', location=OpenApiParameter.QUERY,
+                description='The last frame of the returned annotations. Tracks are clipped to the frame range',
+                type=OpenApiTypes.INT, required=False),
             OpenApiParameter('format', location=OpenApiParameter.QUERY,
                 description='Desired output format name\nYou can get the list of supported formats at:\n/server/annotation/formats',
                 type=OpenApiTypes.STR, required=False),
@@ -1348,13 +1503,30 @@ class JobViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
     def annotations(self, request, pk):
         self._object = self.get_object() # force to call check_object_permissions
         if request.method == 'GET':
+            frame_range = {}
+            for param in ('start_frame', 'stop_frame'):
+                value = request.query_params.get(param)
+                if value is not None:
+                    try:
+                        frame_range[param] = int(value)
+                    except ValueError:
+                        raise ValidationError(
+                            "The '{}' parameter must be an integer".format(param))
+                    if frame_range[param] < 0:
+                        raise ValidationError(
+                            "The '{}' parameter must not be negative".format(param))
+            if len(frame_range) == 2 and \
+                    frame_range['stop_frame'] < frame_range['start_frame']:
+                raise ValidationError(
+                    "The 'start_frame' parameter must not be greater than 'stop_frame'")
+
             return self.export_annotations(
                 request=request,
                 pk=pk,
                 db_obj=self._object.segment.task,
                 export_func=_export_annotations,
                 callback=dm.views.export_job_annotations,
-                get_data=dm.task.get_job_data,
+                get_data=lambda pk: dm.task.get_job_data(pk, **frame_range),
             )
 
         elif request.method == 'POST' or request.method == 'OPTIONS':
@@ -1536,6 +1708,12 @@ class JobViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
                 if db_job.segment.task.project:
                     db_job.segment.task.project.save()
 
+        if request.method == 'GET':
+            # The job is being opened, prepare its chunks in advance
+            schedule_chunks_preparation(db_data,
+                range(start_frame // db_data.chunk_size, stop_frame // db_data.chunk_size + 1),
+                FrameProvider.Quality.COMPRESSED, db_job.segment.task.dimension)
+
         if hasattr(db_data, 'video'):
             media = [db_data.video]
         else:
@@ -3,7 +3,10 @@
 # SPDX-License-Identifier: MIT
 
 from abc import ABCMeta, abstractmethod
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from threading import Lock
+from time import monotonic
+import json
 import operator
 from rest_framework.exceptions import ValidationError
 
@@ -13,8 +16,128 @@ from django.db.models import Q
 from rest_framework.permissions import BasePermission
 
 from cvat.apps.organizations.models import Membership, Organization
+from cvat.apps.engine.log import slogger
 from cvat.apps.engine.models import Project, Task, Job, Issue
 
+class OpenPolicyAgentClient:
+    """
+    Sends queries to OPA using a pool of persistent connections and keeps
+    recent decisions for a short time. A decision depends only on the query
+    input, so the normalized payload is used as the cache key. The cache hit
+    rate and the OPA latency are written to the server log every
+    stats_interval seconds (0 disables the reports).
+    """
+
+    def __init__(self, timeout, cache_ttl, cache_size, stats_interval=0):
+        self._session = requests.Session()
+        self._timeout = timeout
+        self._cache_ttl = cache_ttl
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        self._stats_interval = stats_interval
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats_start = monotonic()
+        self._hits = 0
+        self._misses = 0
+        self._requests = 0
+        self._request_time = 0.0
+
+    @staticmethod
+    def _get_key(url, payload):
+        return url, json.dumps(payload, sort_keys=True, default=str)
+
+    def _get_cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and monotonic() < entry[0]:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return entry
+            self._cache.pop(key, None)
+            self._misses += 1
+            return None
+
+    def _put_cached(self, key, result):
+        with self._lock:
+            self._cache[key] = (monotonic() + self._cache_ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def query(self, url, payload):
+        result = self._query(url, payload)
+        if self._stats_interval > 0:
+            self._report_stats()
+        return result
+
+    def _query(self, url, payload):
+        use_cache = self._cache_ttl > 0 and self._cache_size > 0
+        if use_cache:
+            key = self._get_key(url, payload)
+            entry = self._get_cached(key)
+            if entry is not None:
+                return entry[1]
+
+        start = monotonic()
+        r = self._session.post(url, json=payload, timeout=self._timeout)
+        r.raise_for_status()
+        result = r.json()['result']
+        with self._lock:
+            self._requests += 1
+            self._request_time += monotonic() - start
+
+        if use_cache:
+            self._put_cached(key, result)
+
+        return result
+
+    def _get_stats(self):
+        lookups = self._hits + self._misses
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': self._hits / lookups if lookups else 0.0,
+            'entries': len(self._cache),
+            'requests': self._requests,
+            'average_latency': self._request_time / self._requests
+                if self._requests else 0.0,
+        }
+
+    def get_stats(self):
+        """ Returns the statistics collected since the last report """
+        with self._lock:
+            return self._get_stats()
+
+    def _report_stats(self):
+        with self._lock:
+            period = monotonic() - self._stats_start
+            if period < self._stats_interval:
+                return
+            stats = self._get_stats()
+            self._reset_stats()
+
+        slogger.glob.info('OPA client stats for the last {:.0f} s: '
+            '{hits} cache hits, {misses} misses (hit rate {hit_rate:.1%}), '
+            '{entries} cached decisions, {requests} requests to OPA '
+            '(average latency {average_latency:.3f} s)'.format(period, **stats))
+
+_opa_client = None
+_opa_client_lock = Lock()
+
+def get_opa_client():
+    global _opa_client # pylint: disable=global-statement
+    with _opa_client_lock:
+        if _opa_client is None:
+            _opa_client = OpenPolicyAgentClient(
+                timeout=settings.IAM_OPA_TIMEOUT,
+                cache_ttl=settings.IAM_OPA_CACHE_TTL,
+                cache_size=settings.IAM_OPA_CACHE_SIZE,
+                stats_interval=settings.IAM_OPA_STATS_INTERVAL)
+    return _opa_client
+
 class OpenPolicyAgentPermission(metaclass=ABCMeta):
     @classmethod
     def create_base_perm(cls, request, view, scope, obj=None, **kwargs):
@@ -75,19 +198,18 @@ class OpenPolicyAgentPermission(metaclass=ABCMeta):
         return None
 
     def __bool__(self):
-        r = requests.post(self.url, json=self.payload)
-        return r.json()['result']
+        return get_opa_client().query(self.url, self.payload)
 
     def filter(self, queryset):
         url = self.url.replace('/allow', '/filter')
-        r = requests.post(url, json=self.payload)
+        rules = get_opa_client().query(url, self.payload)
         q_objects = []
         ops_dict = {
             '|': operator.or_,
             '&': operator.and_,
             '~': operator.not_,
         }
-        for item in r.json()['result']:
+        for item in rules:
             if isinstance(item, str):
                 val1 = q_objects.pop()
                 if item == '~':
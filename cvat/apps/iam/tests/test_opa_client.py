@@ -0,0 +1,68 @@
+# Copyright (C) 2022 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from time import monotonic
+from unittest import TestCase, mock
+
+from cvat.apps.iam.permissions import OpenPolicyAgentClient
+
+
+class OpenPolicyAgentClientTest(TestCase):
+    URL = 'http://opa:8181/v1/data/tasks/allow'
+
+    @staticmethod
+    def _make_client(cache_ttl=10, cache_size=10, stats_interval=0):
+        client = OpenPolicyAgentClient(timeout=1,
+            cache_ttl=cache_ttl, cache_size=cache_size, stats_interval=stats_interval)
+        response = mock.Mock()
+        response.json.return_value = {'result': True}
+        client._session = mock.Mock()
+        client._session.post.return_value = response
+        return client
+
+    def test_can_reuse_decision(self):
+        client = self._make_client()
+
+        self.assertTrue(client.query(self.URL, {'input': {'a': 1, 'b': 2}}))
+        self.assertTrue(client.query(self.URL, {'input': {'b': 2, 'a': 1}}))
+
+        self.assertEqual(client._session.post.call_count, 1)
+        stats = client.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['requests'], 1)
+
+    def test_does_not_reuse_decision_for_another_input(self):
+        client = self._make_client()
+
+        client.query(self.URL, {'input': {'a': 1}})
+        client.query(self.URL, {'input': {'a': 2}})
+
+        self.assertEqual(client._session.post.call_count, 2)
+
+    def test_can_disable_cache(self):
+        client = self._make_client(cache_ttl=0)
+
+        client.query(self.URL, {'input': {'a': 1}})
+        client.query(self.URL, {'input': {'a': 1}})
+
+        self.assertEqual(client._session.post.call_count, 2)
+
+    @mock.patch('cvat.apps.iam.permissions.slogger')
+    def test_can_report_stats(self, slogger):
+        client = self._make_client(stats_interval=60)
+
+        client.query(self.URL, {'input': {'a': 1}})
+        client.query(self.URL, {'input': {'a': 1}})
+        self.assertFalse(slogger.glob.info.called)
+
+        with mock.patch('cvat.apps.iam.permissions.monotonic',
+                return_value=monotonic() + 60):
+            client.query(self.URL, {'input': {'a': 1}})
+
+        slogger.glob.info.assert_called_once()
+        message = slogger.glob.info.call_args[0][0]
+        self.assertIn('1 cache hits, 2 misses (hit rate 33.3%)', message)
+        self.assertIn('2 requests to OPA', message)
+        self.assertEqual(client.get_stats()['hits'], 0)
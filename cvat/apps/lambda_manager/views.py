@@ -5,6 +5,8 @@
 
 import base64
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from enum import Enum
 from copy import deepcopy
@@ -19,7 +21,9 @@ from rest_framework import status, viewsets
 from rest_framework.response import Response
 
 import cvat.apps.dataset_manager as dm
+from cvat.apps.dataset_manager.annotation import AnnotationIR
 from cvat.apps.engine.frame_provider import FrameProvider
+from cvat.apps.engine.models import Job as JobModel
 from cvat.apps.engine.models import Task as TaskModel
 from cvat.apps.engine.serializers import LabeledDataSerializer
 from cvat.apps.engine.models import ShapeType, SourceType
@@ -163,6 +167,49 @@ class LambdaFunction:
 
         return response
 
+    def _get_mappings(self, db_task, mapping):
+        task_attributes = {}
+        mapping_by_default = {}
+        for db_label in (db_task.project.label_set if db_task.project_id else db_task.label_set).prefetch_related("attributespec_set").all():
+            mapping_by_default[db_label.name] = {
+                'name': db_label.name,
+                'attributes': {}
+            }
+            task_attributes[db_label.name] = {}
+            for attribute in db_label.attributespec_set.all():
+                task_attributes[db_label.name][attribute.name] = {
+                    'input_type': attribute.input_type,
+                    'values': attribute.values.split('\n')
+                }
+        if not mapping:
+            # use mapping by default to avoid labels in mapping which
+            # don't exist in the task
+            mapping = mapping_by_default
+        else:
+            # filter labels in mapping which don't exist in the task
+            mapping = {k:v for k,v in mapping.items() if v['name'] in mapping_by_default}
+
+        attr_mapping = { label: mapping[label]['attributes'] if 'attributes' in mapping[label] else {} for label in mapping }
+        mapping = { modelLabel: mapping[modelLabel]['name'] for modelLabel in mapping }
+
+        supported_attrs = {}
+        for func_label, func_attrs in self.func_attributes.items():
+            if func_label not in mapping:
+                continue
+
+            mapped_label = mapping[func_label]
+            mapped_attributes = attr_mapping.get(func_label, {})
+            supported_attrs[func_label] = {}
+
+            if mapped_attributes:
+                task_attr_names = [task_attr for task_attr in task_attributes[mapped_label]]
+                for attr in func_attrs:
+                    mapped_attr = mapped_attributes.get(attr["name"])
+                    if mapped_attr in task_attr_names:
+                        supported_attrs[func_label].update({ attr["name"]: task_attributes[mapped_label][mapped_attr] })
+
+        return mapping, attr_mapping, supported_attrs
+
     def invoke(self, db_task, data):
         try:
             payload = {}
@@ -171,47 +218,8 @@ class LambdaFunction:
             if threshold:
                 payload.update({ "threshold": threshold })
             quality = data.get("quality")
-            mapping = data.get("mapping", {})
-
-            task_attributes = {}
-            mapping_by_default = {}
-            for db_label in (db_task.project.label_set if db_task.project_id else db_task.label_set).prefetch_related("attributespec_set").all():
-                mapping_by_default[db_label.name] = {
-                    'name': db_label.name,
-                    'attributes': {}
-                }
-                task_attributes[db_label.name] = {}
-                for attribute in db_label.attributespec_set.all():
-                    task_attributes[db_label.name][attribute.name] = {
-                        'input_type': attribute.input_type,
-                        'values': attribute.values.split('\n')
-                    }
-            if not mapping:
-                # use mapping by default to avoid labels in mapping which
-                # don't exist in the task
-                mapping = mapping_by_default
-            else:
-                # filter labels in mapping which don't exist in the task
-                mapping = {k:v for k,v in mapping.items() if v['name'] in mapping_by_default}
-
-            attr_mapping = { label: mapping[label]['attributes'] if 'attributes' in mapping[label] else {} for label in mapping }
-            mapping = { modelLabel: mapping[modelLabel]['name'] for modelLabel in mapping }
-
-            supported_attrs = {}
-            for func_label, func_attrs in self.func_attributes.items():
-                if func_label not in mapping:
-                    continue
-
-                mapped_label = mapping[func_label]
-                mapped_attributes = attr_mapping.get(func_label, {})
-                supported_attrs[func_label] = {}
-
-                if mapped_attributes:
-                    task_attr_names = [task_attr for task_attr in task_attributes[mapped_label]]
-                    for attr in func_attrs:
-                        mapped_attr = mapped_attributes.get(attr["name"])
-                        if mapped_attr in task_attr_names:
-                            supported_attrs[func_label].update({ attr["name"]: task_attributes[mapped_label][mapped_attr] })
+            mapping, attr_mapping, supported_attrs = self._get_mappings(
+                db_task, data.get("mapping", {}))
 
             if self.kind == LambdaType.DETECTOR:
                 payload.update({
@@ -254,6 +262,12 @@ class LambdaFunction:
                 code=status.HTTP_400_BAD_REQUEST)
 
         response = self.gateway.invoke(self, payload)
+        if self.kind == LambdaType.DETECTOR:
+            response = self._filter_detections(response,
+                mapping, attr_mapping, supported_attrs)
+        return response
+
+    def _filter_detections(self, response, mapping, attr_mapping, supported_attrs):
         response_filtered = []
         def check_attr_value(value, func_attr, db_attr):
             if db_attr is None:
@@ -284,39 +298,86 @@ class LambdaFunction:
                     return value in ["true", "false"]
                 else:
                     return False
-        if self.kind == LambdaType.DETECTOR:
-            for item in response:
-                item_label = item['label']
 
-                if item_label not in mapping:
-                    continue
+        for item in response:
+            item_label = item['label']
 
-                attributes = deepcopy(item.get("attributes", []))
-                item["attributes"] = []
-                mapped_attributes = attr_mapping[item_label]
+            if item_label not in mapping:
+                continue
 
-                for attr in attributes:
-                    if attr['name'] not in mapped_attributes:
-                        continue
+            attributes = deepcopy(item.get("attributes", []))
+            item["attributes"] = []
+            mapped_attributes = attr_mapping[item_label]
 
-                    func_attr = [func_attr for func_attr in self.func_attributes.get(item_label, []) if func_attr['name'] == attr["name"]]
-                    # Skip current attribute if it was not declared as supported in function config
-                    if not func_attr:
-                        continue
+            for attr in attributes:
+                if attr['name'] not in mapped_attributes:
+                    continue
 
-                    db_attr = supported_attrs.get(item_label, {}).get(attr["name"])
+                func_attr = [func_attr for func_attr in self.func_attributes.get(item_label, []) if func_attr['name'] == attr["name"]]
+                # Skip current attribute if it was not declared as supported in function config
+                if not func_attr:
+                    continue
+
+                db_attr = supported_attrs.get(item_label, {}).get(attr["name"])
 
-                    if check_attr_value(attr["value"], func_attr[0], db_attr):
-                        attr["name"] = mapped_attributes[attr['name']]
-                        item["attributes"].append(attr)
+                if check_attr_value(attr["value"], func_attr[0], db_attr):
+                    attr["name"] = mapped_attributes[attr['name']]
+                    item["attributes"].append(attr)
 
-                item['label'] = mapping[item['label']]
-                response_filtered.append(item)
-                response = response_filtered
+            item['label'] = mapping[item['label']]
+            response_filtered.append(item)
+            response = response_filtered
 
         return response
 
-    def _get_image(self, db_task, frame, quality):
+    def detect(self, db_task, quality=None, threshold=None, mapping=None,
+            max_inflight=1):
+        """
+        Runs the detector on all frames of the task and yields
+        (frame, detections) pairs in order of frames. Frames are decoded
+        chunk by chunk in the calling thread, while up to max_inflight
+        invocations of the function are running concurrently.
+        """
+        quality = self._get_quality(quality)
+        mapping, attr_mapping, supported_attrs = self._get_mappings(
+            db_task, mapping or {})
+
+        def invoke(image):
+            payload = {
+                "image": base64.b64encode(image.getvalue()).decode('utf-8')
+            }
+            if threshold:
+                payload.update({ "threshold": threshold })
+            response = self.gateway.invoke(self, payload)
+            return self._filter_detections(response,
+                mapping, attr_mapping, supported_attrs)
+
+        deleted_frames = set(db_task.data.deleted_frames)
+        frame_provider = FrameProvider(db_task.data)
+        # Keep a few more frames than running invocations to have
+        # the next images ready when an invocation is finished
+        max_pending = 2 * max_inflight
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+            try:
+                frames = frame_provider.get_frames(quality)
+                for frame, (image, _) in enumerate(frames):
+                    if frame in deleted_frames:
+                        continue
+
+                    pending.append((frame, executor.submit(invoke, image)))
+                    if len(pending) >= max_pending:
+                        frame, future = pending.popleft()
+                        yield frame, future.result()
+
+                while pending:
+                    frame, future = pending.popleft()
+                    yield frame, future.result()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def _get_quality(self, quality):
         if quality is None or quality == "original":
             quality = FrameProvider.Quality.ORIGINAL
         elif  quality == "compressed":
@@ -327,6 +388,10 @@ class LambdaFunction:
                 'with wrong arguments (quality={})'.format(quality),
                 code=status.HTTP_400_BAD_REQUEST)
 
+        return quality
+
+    def _get_image(self, db_task, frame, quality):
+        quality = self._get_quality(quality)
         frame_provider = FrameProvider(db_task.data)
         image = frame_provider.get_frame(frame, quality=quality)
 
@@ -448,6 +513,13 @@ class LambdaJob:
         class Results:
             def __init__(self, task_id):
                 self.task_id = task_id
+                # Results are written directly to jobs without building
+                # annotations of the whole task
+                self.jobs = [
+                    (db_job.id, db_job.segment.start_frame, db_job.segment.stop_frame)
+                    for db_job in JobModel.objects.select_related('segment') \
+                        .filter(segment__task_id=task_id).order_by('id')
+                ]
                 self.reset()
 
             def append_shape(self, shape):
@@ -460,7 +532,11 @@ class LambdaJob:
                 if not self.is_empty():
                     serializer = LabeledDataSerializer(data=self.data)
                     if serializer.is_valid(raise_exception=True):
-                        dm.task.patch_task_data(self.task_id, serializer.data, "create")
+                        data = AnnotationIR(serializer.data)
+                        for job_id, start_frame, stop_frame in self.jobs:
+                            job_data = data.slice(start_frame, stop_frame)
+                            if job_data.tags or job_data.shapes or job_data.tracks:
+                                dm.task.patch_job_data(job_id, job_data, "create")
                     self.reset()
 
             def is_empty(self):
@@ -473,12 +549,10 @@ class LambdaJob:
 
         results = Results(db_task.id)
 
-        for frame in range(db_task.data.size):
-            if frame in db_task.data.deleted_frames:
-                continue
-            annotations = function.invoke(db_task, data={
-                "frame": frame, "quality": quality, "mapping": mapping,
-                "threshold": threshold })
+        detections = function.detect(db_task, quality=quality,
+            threshold=threshold, mapping=mapping,
+            max_inflight=settings.LAMBDA_MAX_INFLIGHT_REQUESTS)
+        for frame, annotations in detections:
             progress = (frame + 1) / db_task.data.size
             if not LambdaJob._update_progress(progress):
                 break
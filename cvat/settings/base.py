@@ -242,6 +242,14 @@ IAM_ADMIN_ROLE = 'admin'
 # Index in the list below corresponds to the priority (0 has highest priority)
 IAM_ROLES = [IAM_ADMIN_ROLE, 'business', 'user', 'worker']
 IAM_OPA_DATA_URL = 'http://opa:8181/v1/data'
+# Timeout (in seconds) of a request to OPA
+IAM_OPA_TIMEOUT = float(os.getenv('CVAT_IAM_OPA_TIMEOUT', 5))
+# OPA decisions are cached for the given time (in seconds), 0 disables the cache
+IAM_OPA_CACHE_TTL = float(os.getenv('CVAT_IAM_OPA_CACHE_TTL', 5))
+IAM_OPA_CACHE_SIZE = int(os.getenv('CVAT_IAM_OPA_CACHE_SIZE', 10000))
+# Interval (in seconds) of OPA cache hit rate and latency reports in the server log,
+# 0 disables the reports
+IAM_OPA_STATS_INTERVAL = float(os.getenv('CVAT_IAM_OPA_STATS_INTERVAL', 600))
 LOGIN_URL = 'rest_login'
 LOGIN_REDIRECT_URL = '/'
 
@@ -287,6 +295,9 @@ NUCLIO = {
     'DEFAULT_TIMEOUT': os.getenv('CVAT_NUCLIO_DEFAULT_TIMEOUT', 120)
 }
 
+# Number of concurrent function invocations during automatic annotation
+LAMBDA_MAX_INFLIGHT_REQUESTS = int(os.getenv('CVAT_LAMBDA_MAX_INFLIGHT_REQUESTS', 4))
+
 RQ_SHOW_ADMIN_LINK = True
 RQ_EXCEPTION_HANDLERS = ['cvat.apps.engine.views.rq_handler']
 
@@ -380,6 +391,9 @@ os.makedirs(CLOUD_STORAGE_ROOT, exist_ok=True)
 TMP_FILES_ROOT = os.path.join(DATA_ROOT, 'tmp')
 os.makedirs(TMP_FILES_ROOT, exist_ok=True)
 
+EXPORT_CACHE_ROOT = os.path.join(DATA_ROOT, 'export_cache')
+os.makedirs(EXPORT_CACHE_ROOT, exist_ok=True)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -473,6 +487,43 @@ CACHES = {
 
 USE_CACHE = True
 
+# Size limit (in bytes) of the in-process cache of decoded chunks, per worker
+DECODED_CHUNK_CACHE_SIZE = int(os.getenv('CVAT_DECODED_CHUNK_CACHE_SIZE', 256 * 1024 * 1024))
+
+# Number of processes used to write chunks and to prepare manifests
+# during task creation
+CHUNK_CREATE_WORKERS = int(os.getenv('CVAT_CHUNK_CREATE_WORKERS', os.cpu_count() or 1))
+
+# Number of chunks in a segment of a video, which is decoded and written
+# by one process during task creation
+VIDEO_SEGMENT_CHUNKS = int(os.getenv('CVAT_VIDEO_SEGMENT_CHUNKS', 4))
+
+# Number of chunks prepared in the background after the requested one
+CHUNK_READ_AHEAD = int(os.getenv('CVAT_CHUNK_READ_AHEAD', 2))
+
+# Number of threads used to prepare chunks in the background
+CHUNK_PREPARATION_WORKERS = int(os.getenv('CVAT_CHUNK_PREPARATION_WORKERS', 4))
+
+# Number of threads used to download images of a chunk from a cloud storage
+CLOUD_STORAGE_DOWNLOAD_WORKERS = int(os.getenv('CVAT_CLOUD_STORAGE_DOWNLOAD_WORKERS', 8))
+
+# Number of threads used to extract media files for dataset exports
+EXPORT_MEDIA_WORKERS = int(os.getenv('CVAT_EXPORT_MEDIA_WORKERS', os.cpu_count() or 1))
+
+# Image format ('.png' or '.jpg') of video frames in CVAT format dataset exports
+EXPORT_VIDEO_FRAME_EXT = os.getenv('CVAT_EXPORT_VIDEO_FRAME_EXT', '.PNG')
+
+# Quality (1-100) of JPEG video frames in CVAT format dataset exports
+EXPORT_VIDEO_FRAME_QUALITY = int(os.getenv('CVAT_EXPORT_VIDEO_FRAME_QUALITY', 95))
+
+# Size limit (in bytes) of the cache of intermediate export results,
+# which are reused by the next exports (annotations of jobs, video frames).
+# The cache is kept in EXPORT_CACHE_ROOT on the data volume, and it takes
+# up to this size of the disk space there. Encoded video frames take about
+# as much space as the exported images, so the limit should be chosen
+# for the biggest exported videos. The cache is disabled by default (0).
+EXPORT_CACHE_SIZE = int(os.getenv('CVAT_EXPORT_CACHE_SIZE', 0))
+
 CORS_ALLOW_HEADERS = list(default_headers) + [
     # tus upload protocol headers
     'upload-offset',
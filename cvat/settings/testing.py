@@ -49,6 +49,9 @@ os.makedirs(CLOUD_STORAGE_ROOT, exist_ok=True)
 TMP_FILES_ROOT = os.path.join(DATA_ROOT, 'tmp')
 os.makedirs(TMP_FILES_ROOT, exist_ok=True)
 
+EXPORT_CACHE_ROOT = os.path.join(DATA_ROOT, 'export_cache')
+os.makedirs(EXPORT_CACHE_ROOT, exist_ok=True)
+
 # To avoid ERROR django.security.SuspiciousFileOperation:
 # The joined path (...) is located outside of the base path component
 MEDIA_ROOT = BASE_DIR
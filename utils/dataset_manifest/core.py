@@ -2,25 +2,38 @@
 #
 # SPDX-License-Identifier: MIT
 
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from itertools import islice
 import av
 import json
+import mmap
 import os
+import sys
 
 from abc import ABC, abstractmethod, abstractproperty, abstractstaticmethod
 from contextlib import closing
 from tempfile import NamedTemporaryFile
+from time import perf_counter
 from PIL import Image
 from json.decoder import JSONDecodeError
 
-from .utils import SortingMethod, md5_hash, rotate_image, sort
+from .utils import SortingMethod, md5_file_hash, md5_hash, rotate_image, sort
 
 class VideoStreamReader:
-    def __init__(self, source_path, chunk_size, force):
+    # Number of key frames checked by a worker process at once
+    KEY_FRAMES_PER_SEGMENT = 16
+
+    def __init__(self, source_path, chunk_size, force, workers=1):
         self._source_path = source_path
         self._frames_number = None
         self._force = force
         self._upper_bound = 3 * chunk_size + 1
+        self._workers = workers
+        self._decoded_frames_number = None
+        self._processing_time = None
 
         with closing(av.open(self.source_path, mode='r')) as container:
             video_stream = VideoStreamReader._get_video_stream(container)
@@ -66,86 +79,151 @@ class VideoStreamReader:
     def resolution(self):
         return (self.width, self.height)
 
+    @property
+    def throughput(self):
+        """ Number of frames per second processed by the last pass over the video """
+        if not self._processing_time:
+            return None
+        return self._decoded_frames_number / self._processing_time
+
     def validate_key_frame(self, container, video_stream, key_frame):
+        return _validate_key_frame(container, video_stream, key_frame)
+
+    def _iter_frames(self, container, video_stream):
+        frame_pts, frame_dts = -1, -1
+        index, key_frame_number = 0, 0
         for packet in container.demux(video_stream):
             for frame in packet.decode():
-                if md5_hash(frame) != key_frame['md5'] or frame.pts != key_frame['pts']:
-                    return False
-                return True
-
-    def __iter__(self):
+                if None not in {frame.pts, frame_pts} and frame.pts <= frame_pts:
+                    raise Exception('Invalid pts sequences')
+                if None not in {frame.dts, frame_dts} and frame.dts <= frame_dts:
+                    raise Exception('Invalid dts sequences')
+                frame_pts, frame_dts = frame.pts, frame.dts
+
+                if frame.key_frame:
+                    key_frame_number += 1
+                    ratio = (index + 1) // key_frame_number
+
+                    if ratio >= self._upper_bound and not self._force:
+                        raise AssertionError('Too few keyframes')
+
+                    yield (index, frame.pts, md5_hash(frame))
+                else:
+                    yield index
+                index += 1
+
+        self._decoded_frames_number = index
+        # not all videos contain information about numbers of frames
+        if not self._frames_number:
+            self._frames_number = index
+
+    def _validate_key_frames(self, items):
+        # All the key frames are checked in one container, which is reused for the seeks
         with closing(av.open(self.source_path, mode='r')) as container:
             video_stream = self._get_video_stream(container)
-            frame_pts, frame_dts = -1, -1
-            index, key_frame_number = 0, 0
-            for packet in container.demux(video_stream):
-                for frame in packet.decode():
-                    if None not in {frame.pts, frame_pts} and frame.pts <= frame_pts:
-                        raise Exception('Invalid pts sequences')
-                    if None not in {frame.dts, frame_dts} and frame.dts <= frame_dts:
-                        raise Exception('Invalid dts sequences')
-                    frame_pts, frame_dts = frame.pts, frame.dts
-
-                    if frame.key_frame:
-                        key_frame_number += 1
-                        ratio = (index + 1) // key_frame_number
-
-                        if ratio >= self._upper_bound and not self._force:
-                            raise AssertionError('Too few keyframes')
-
-                        key_frame = {
-                            'index': index,
-                            'pts': frame.pts,
-                            'md5': md5_hash(frame)
-                        }
-
-                        with closing(av.open(self.source_path, mode='r')) as checked_container:
-                            checked_container.seek(offset=key_frame['pts'], stream=video_stream)
-                            isValid = self.validate_key_frame(checked_container, video_stream, key_frame)
-                            if isValid:
-                                yield (index, key_frame['pts'], key_frame['md5'])
-                    else:
-                        yield index
-                    index += 1
-            if not self._frames_number:
-                self._frames_number = index
+            for item in items:
+                if not isinstance(item, tuple) or \
+                        self.validate_key_frame(container, video_stream, item):
+                    yield item
+
+    def _validate_key_frames_in_parallel(self, items):
+        # Key frames are checked by a process pool in segments of the video,
+        # while results are returned in the original order. The number of
+        # segments in flight is limited to keep memory consumption bounded.
+        max_in_flight = 2 * self._workers
+        in_flight = deque()
+
+        def _get_results(segment, future):
+            valid_key_frames = set(future.result())
+            for item in segment:
+                if not isinstance(item, tuple) or item[0] in valid_key_frames:
+                    yield item
+
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            segment, key_frames = [], []
+            for item in items:
+                segment.append(item)
+                if isinstance(item, tuple):
+                    key_frames.append(item)
+                if len(key_frames) < self.KEY_FRAMES_PER_SEGMENT:
+                    continue
+
+                if len(in_flight) == max_in_flight:
+                    yield from _get_results(*in_flight.popleft())
+                in_flight.append((segment, executor.submit(_get_valid_key_frames,
+                    self.source_path, key_frames)))
+                segment, key_frames = [], []
+
+            if segment:
+                in_flight.append((segment, executor.submit(_get_valid_key_frames,
+                    self.source_path, key_frames)))
+            while in_flight:
+                yield from _get_results(*in_flight.popleft())
+
+    def _iter_validated_frames(self):
+        start_time = perf_counter()
+        with closing(av.open(self.source_path, mode='r')) as container:
+            video_stream = self._get_video_stream(container)
+            frames = self._iter_frames(container, video_stream)
+            if self._workers > 1:
+                frames = self._validate_key_frames_in_parallel(frames)
+            else:
+                frames = self._validate_key_frames(frames)
+            yield from frames
+        self._processing_time = perf_counter() - start_time
+
+    def __iter__(self):
+        yield from self._iter_validated_frames()
 
 class KeyFramesVideoStreamReader(VideoStreamReader):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
     def __iter__(self):
-        with closing(av.open(self.source_path, mode='r')) as container:
-            video_stream = self._get_video_stream(container)
-            frame_pts, frame_dts = -1, -1
-            index, key_frame_number = 0, 0
-            for packet in container.demux(video_stream):
-                for frame in packet.decode():
-                    if None not in {frame.pts, frame_pts} and frame.pts <= frame_pts:
-                        raise Exception('Invalid pts sequences')
-                    if None not in {frame.dts, frame_dts} and frame.dts <= frame_dts:
-                        raise Exception('Invalid dts sequences')
-                    frame_pts, frame_dts = frame.pts, frame.dts
-
-                    if frame.key_frame:
-                        key_frame_number += 1
-                        ratio = (index + 1) // key_frame_number
-                        if ratio >= self._upper_bound and not self._force:
-                            raise AssertionError('Too few keyframes')
-                        key_frame = {
-                            'index': index,
-                            'pts': frame.pts,
-                            'md5': md5_hash(frame)
-                        }
-
-                        with closing(av.open(self.source_path, mode='r')) as checked_container:
-                            checked_container.seek(offset=key_frame['pts'], stream=video_stream)
-                            isValid = self.validate_key_frame(checked_container, video_stream, key_frame)
-                            if isValid:
-                                yield (index, key_frame['pts'], key_frame['md5'])
-                    index += 1
+        for item in self._iter_validated_frames():
+            if isinstance(item, tuple):
+                yield item
+
+def _validate_key_frame(container, video_stream, key_frame):
+    _, pts, md5 = key_frame
+    container.seek(offset=pts, stream=video_stream)
+    for packet in container.demux(video_stream):
+        for frame in packet.decode():
+            return md5_hash(frame) == md5 and frame.pts == pts
+    return False
+
+def _get_valid_key_frames(source_path, key_frames):
+    with closing(av.open(source_path, mode='r')) as container:
+        video_stream = VideoStreamReader._get_video_stream(container)
+        return [key_frame[0] for key_frame in key_frames
+            if _validate_key_frame(container, video_stream, key_frame)]
+
+def _get_image_properties(image, data_dir, use_image_hash):
+    # Only the image header is read here, pixels are not decoded
+    with Image.open(image, mode='r') as img:
+        orientation = img.getexif().get(274, 1)
+        width, height = img.width, img.height
+    img_name = os.path.relpath(image, data_dir) if data_dir \
+        else os.path.basename(image)
+    name, extension = os.path.splitext(img_name)
+    if orientation > 4:
+        width, height = height, width
+    image_properties = {
+        'name': name.replace('\\', '/'),
+        'extension': extension,
+        'width': width,
+        'height': height,
+    }
+    checksum = md5_file_hash(image) if use_image_hash else None
+    return img_name, image_properties, checksum
+
+def _get_images_properties(images, data_dir, use_image_hash):
+    return [_get_image_properties(image, data_dir, use_image_hash) for image in images]
 
 class DatasetImagesReader:
+    # Number of images passed to a worker process at once
+    BATCH_SIZE = 64
+
     def __init__(self,
                 sources,
                 meta=None,
@@ -154,6 +232,7 @@ class DatasetImagesReader:
                 start = 0,
                 step = 1,
                 stop = None,
+                workers = 1,
                 *args,
                 **kwargs):
         self._sources = sort(sources, sorting_method)
@@ -163,6 +242,7 @@ class DatasetImagesReader:
         self._start = start
         self._stop = stop if stop else len(sources)
         self._step = step
+        self._workers = workers
 
     @property
     def start(self):
@@ -188,29 +268,37 @@ class DatasetImagesReader:
     def step(self, value):
         self._step = int(value)
 
+    def _iter_properties(self, sources):
+        if self._workers <= 1:
+            for image in sources:
+                yield _get_image_properties(image, self._data_dir, self._use_image_hash)
+            return
+
+        # Images are read by a process pool in batches, while results are
+        # returned in the original order. The number of batches in flight
+        # is limited to keep memory consumption bounded.
+        max_in_flight = 2 * self._workers
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            for batch_start in range(0, len(sources), self.BATCH_SIZE):
+                if len(in_flight) == max_in_flight:
+                    yield from in_flight.popleft().result()
+                in_flight.append(executor.submit(_get_images_properties,
+                    sources[batch_start:batch_start + self.BATCH_SIZE],
+                    self._data_dir, self._use_image_hash))
+
+            while in_flight:
+                yield from in_flight.popleft().result()
+
     def __iter__(self):
-        sources = (i for i in self._sources)
+        properties = self._iter_properties(list(islice(self._sources, len(self))))
         for idx in range(self._stop):
             if idx in self.range_:
-                image = next(sources)
-                img = Image.open(image, mode='r')
-                orientation = img.getexif().get(274, 1)
-                img_name = os.path.relpath(image, self._data_dir) if self._data_dir \
-                    else os.path.basename(image)
-                name, extension = os.path.splitext(img_name)
-                width, height = img.width, img.height
-                if orientation > 4:
-                    width, height = height, width
-                image_properties = {
-                    'name': name.replace('\\', '/'),
-                    'extension': extension,
-                    'width': width,
-                    'height': height,
-                }
+                img_name, image_properties, checksum = next(properties)
                 if self._meta and img_name in self._meta:
                     image_properties['meta'] = self._meta[img_name]
-                if self._use_image_hash:
-                    image_properties['checksum'] = md5_hash(img)
+                if checksum:
+                    image_properties['checksum'] = checksum
                 yield image_properties
             else:
                 yield dict()
@@ -248,6 +336,7 @@ class _Manifest:
     class SupportedVersion(str, Enum):
         V1 = '1.0'
         V1_1 = '1.1'
+        V1_2 = '1.2'
 
         @classmethod
         def choices(cls):
@@ -257,7 +346,7 @@ class _Manifest:
             return self.value
 
     FILE_NAME = 'manifest.jsonl'
-    VERSION = SupportedVersion.V1_1
+    VERSION = SupportedVersion.V1_2
 
     def __init__(self, path, upload_dir=None):
         assert path, 'A path to manifest file not found'
@@ -274,56 +363,125 @@ class _Manifest:
             else os.path.relpath(self._path, self._upload_dir)
 
 # Needed for faster iteration over the manifest file, will be generated to work inside CVAT
-# and will not be generated when manually creating a manifest
+# and will not be generated when manually creating a manifest.
+# The index is a file of fixed-width uint64 (little-endian) line offsets,
+# which is memory-mapped on loading.
 class _Index:
-    FILE_NAME = 'index.json'
+    FILE_NAME = 'index.bin'
+    LEGACY_FILE_NAME = 'index.json'
+    ITEM_FORMAT = 'Q'
 
     def __init__(self, path):
         assert path and os.path.isdir(path), 'No index directory path'
         self._path = os.path.join(path, self.FILE_NAME)
-        self._index = {}
+        self._legacy_path = os.path.join(path, self.LEGACY_FILE_NAME)
+        self._index = array(self.ITEM_FORMAT)
+        self._mmap = None
 
     @property
     def path(self):
         return self._path
 
+    def exists(self):
+        return os.path.exists(self._path) or os.path.exists(self._legacy_path)
+
     def dump(self):
-        with open(self._path, 'w') as index_file:
-            json.dump(self._index, index_file,  separators=(',', ':'))
+        index = self._index
+        if not isinstance(index, array):
+            index = array(self.ITEM_FORMAT, index)
+        if sys.byteorder != 'little':
+            index.byteswap()
+        # The index is written to a temporary file and then is moved in place,
+        # so other processes never read a partially written index and
+        # memory maps of the previous index stay valid
+        index_file = NamedTemporaryFile(mode='wb', dir=os.path.dirname(self._path),
+            prefix=self.FILE_NAME, suffix='.tmp', delete=False)
+        try:
+            with index_file:
+                index.tofile(index_file)
+            os.replace(index_file.name, self._path)
+        except Exception:
+            os.remove(index_file.name)
+            raise
+
+    def _load_legacy(self):
+        with open(self._legacy_path, 'r') as index_file:
+            legacy_index = json.load(index_file,
+                object_hook=lambda d: {int(k): v for k, v in d.items()})
+        self._index = array(self.ITEM_FORMAT,
+            (legacy_index[i] for i in range(len(legacy_index))))
+        self.dump()
+        try:
+            os.remove(self._legacy_path)
+        except FileNotFoundError:
+            pass # the index is converted by another process
 
     def load(self):
-        with open(self._path, 'r') as index_file:
-            self._index = json.load(index_file,
-                object_hook=lambda d: {int(k): v for k, v in d.items()})
+        self.close()
+        if not os.path.exists(self._path) and os.path.exists(self._legacy_path):
+            try:
+                self._load_legacy()
+                return
+            except FileNotFoundError:
+                # The legacy index is converted by another process,
+                # so the new index is loaded instead
+                pass
+
+        with open(self._path, 'rb') as index_file:
+            if not os.fstat(index_file.fileno()).st_size or sys.byteorder != 'little':
+                self._index = array(self.ITEM_FORMAT)
+                self._index.fromfile(index_file,
+                    os.fstat(index_file.fileno()).st_size // self._index.itemsize)
+                if sys.byteorder != 'little':
+                    self._index.byteswap()
+            else:
+                self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._index = memoryview(self._mmap).cast(self.ITEM_FORMAT)
+
+    def close(self):
+        if self._mmap is not None:
+            self._index.release()
+            self._mmap.close()
+            self._mmap = None
+            self._index = array(self.ITEM_FORMAT)
 
     def remove(self):
-        os.remove(self._path)
+        self.close()
+        for path in (self._path, self._legacy_path):
+            if os.path.exists(path):
+                os.remove(path)
 
     def create(self, manifest, skip):
         assert os.path.exists(manifest), 'A manifest file not exists, index cannot be created'
-        with open(manifest, 'r+') as manifest_file:
+        self.close()
+        self._index = array(self.ITEM_FORMAT)
+        with open(manifest, 'rb') as manifest_file:
             while skip:
                 manifest_file.readline()
                 skip -= 1
-            image_number = 0
             position = manifest_file.tell()
             line = manifest_file.readline()
             while line:
                 if line.strip():
-                    self._index[image_number] = position
-                    image_number += 1
-                    position = manifest_file.tell()
+                    self._index.append(position)
+                position = manifest_file.tell()
                 line = manifest_file.readline()
 
     def partial_update(self, manifest, number):
         assert os.path.exists(manifest), 'A manifest file not exists, index cannot be updated'
-        with open(manifest, 'r+') as manifest_file:
+        if not isinstance(self._index, array):
+            index = array(self.ITEM_FORMAT, self._index)
+            self.close()
+            self._index = index
+        with open(manifest, 'rb') as manifest_file:
             manifest_file.seek(self._index[number])
+            del self._index[number:]
+            position = manifest_file.tell()
             line = manifest_file.readline()
             while line:
                 if line.strip():
-                    self._index[number] = manifest_file.tell()
-                    number += 1
+                    self._index.append(position)
+                position = manifest_file.tell()
                 line = manifest_file.readline()
 
     def __getitem__(self, number):
@@ -357,39 +515,77 @@ class _ManifestManager(ABC):
         self._index = _Index(os.path.dirname(self._manifest.path))
         self._reader = None
         self._create_index = create_index
+        self._manifest_file = None
+
+    def __del__(self):
+        self._close_manifest_file()
 
     @property
     def reader(self):
         return self._reader
 
+    def _get_manifest_file(self):
+        # Keep one opened handle for all the lookups. Items are read with pread(),
+        # which doesn't depend on the file position.
+        if self._manifest_file is None:
+            self._manifest_file = open(self._manifest.path, 'rb')
+        return self._manifest_file
+
+    def _close_manifest_file(self):
+        if getattr(self, '_manifest_file', None) is not None:
+            self._manifest_file.close()
+            self._manifest_file = None
+
+    def _read_items(self, start, stop):
+        assert self._index, 'No prepared index'
+        assert 0 <= start < stop <= len(self._index), \
+            'Invalid index range: [{}, {})\nMax: {}'.format(start, stop, len(self._index))
+
+        manifest_file = self._get_manifest_file()
+        begin = self._index[start]
+        end = self._index[stop] if stop < len(self._index) \
+            else os.fstat(manifest_file.fileno()).st_size
+        content = os.pread(manifest_file.fileno(), end - begin, begin)
+
+        items = []
+        for line in content.splitlines():
+            if line.strip():
+                parsed_properties = json.loads(line)
+                self._json_item_is_valid(**parsed_properties)
+                items.append(parsed_properties)
+        return items
+
     def _parse_line(self, line):
         """ Getting a random line from the manifest file """
-        with open(self._manifest.path, 'r') as manifest_file:
-            if isinstance(line, str):
-                assert line in self.BASE_INFORMATION.keys(), \
-                    'An attempt to get non-existent information from the manifest'
-                for _ in range(self.BASE_INFORMATION[line]):
-                    fline = manifest_file.readline()
-                return json.loads(fline)[line]
-            else:
-                assert self._index, 'No prepared index'
-                offset = self._index[line]
-                manifest_file.seek(offset)
-                properties = manifest_file.readline()
-                parsed_properties = json.loads(properties)
-                self._json_item_is_valid(**parsed_properties)
-                return parsed_properties
+        if isinstance(line, str):
+            assert line in self.BASE_INFORMATION.keys(), \
+                'An attempt to get non-existent information from the manifest'
+            manifest_file = self._get_manifest_file()
+            manifest_file.seek(0)
+            for _ in range(self.BASE_INFORMATION[line]):
+                fline = manifest_file.readline()
+            return json.loads(fline)[line]
+        else:
+            return self._read_items(line, line + 1)[0]
+
+    def get_range(self, start, stop):
+        """ Getting the items in the [start; stop) range with a single read """
+        return self._read_items(start, stop)
 
     def init_index(self):
-        if os.path.exists(self._index.path):
+        if self._index.exists():
             self._index.load()
-        else:
+        # An empty index can be left by an interrupted write, so it is
+        # recreated unless the manifest has no items indeed
+        if not self._index.exists() or not len(self._index):
+            index_exists = self._index.exists()
             self._index.create(self._manifest.path, 3 if self._manifest.TYPE == 'video' else 2)
-            self._index.dump()
+            if not index_exists or len(self._index):
+                self._index.dump()
 
     def reset_index(self):
-        if os.path.exists(self._index.path):
-            self._index.remove()
+        self._close_manifest_file()
+        self._index.remove()
 
     def set_index(self):
         self.reset_index()
@@ -409,7 +605,7 @@ class _ManifestManager(ABC):
         pass
 
     def __iter__(self):
-        with open(self._manifest.path, 'r') as manifest_file:
+        with open(self._manifest.path, 'rb') as manifest_file:
             manifest_file.seek(self._index[0])
             image_number = 0
             line = manifest_file.readline()
@@ -454,12 +650,14 @@ class VideoManifestManager(_ManifestManager):
         setattr(self._manifest, 'TYPE', 'video')
         self.BASE_INFORMATION['properties'] = 3
 
-    def link(self, media_file, upload_dir=None, chunk_size=36, force=False, only_key_frames=False, **kwargs):
+    def link(self, media_file, upload_dir=None, chunk_size=36, force=False, only_key_frames=False,
+            workers=1, **kwargs):
         ReaderClass = VideoStreamReader if not only_key_frames else KeyFramesVideoStreamReader
         self._reader = ReaderClass(
-            os.path.join(upload_dir, media_file) if upload_dir else media_file,
-            chunk_size,
-            force)
+            source_path=os.path.join(upload_dir, media_file) if upload_dir else media_file,
+            chunk_size=chunk_size,
+            force=force,
+            workers=workers)
 
     def _write_base_information(self, file):
         base_info = {
@@ -601,7 +799,7 @@ class ImageManifestManager(_ManifestManager):
         """ Creating and saving a manifest file for the specialized dataset"""
         with open(self._manifest.path, 'w') as manifest_file:
             self._write_base_information(manifest_file)
-            obj = content if content else self._reader
+            obj = content if content is not None else self._reader
             self._write_core_part(manifest_file, obj, _tqdm)
 
     def partial_update(self, number, properties):
@@ -611,25 +809,41 @@ class ImageManifestManager(_ManifestManager):
     def data(self):
         return (f"{image['name']}{image['extension']}" for _, image in self)
 
+    @property
+    def has_file_checksums(self):
+        """ Image checksums are computed over the file contents since version 1.2,
+        older manifests contain checksums of decoded images """
+        return self['version'] not in {
+            _Manifest.SupportedVersion.V1, _Manifest.SupportedVersion.V1_1
+        }
+
     def get_subset(self, subset_names):
-        index_list = []
-        subset = []
+        """ Getting the items with the given names in the requested order.
+        All the items with a repeated name are returned, and the items
+        of a repeated requested name are returned for each request """
+        requested_names = set(subset_names)
+        items = defaultdict(list)
         for _, image in self:
             image_name = f"{image['name']}{image['extension']}"
-            if image_name in subset_names:
-                index_list.append(subset_names.index(image_name))
-                properties = {
-                    'name': f"{image['name']}",
-                    'extension': f"{image['extension']}",
-                    'width': image['width'],
-                    'height': image['height'],
-                }
-                for optional_field in {'meta', 'checksum'}:
-                    value = image.get(optional_field)
-                    if value:
-                        properties[optional_field] =  value
-                subset.append(properties)
-        return index_list, subset
+            if image_name not in requested_names:
+                continue
+            properties = {
+                'name': f"{image['name']}",
+                'extension': f"{image['extension']}",
+                'width': image['width'],
+                'height': image['height'],
+            }
+            for optional_field in {'meta', 'checksum'}:
+                value = image.get(optional_field)
+                if value:
+                    properties[optional_field] =  value
+            items[image_name].append(properties)
+        # the returned items can be changed by the caller, so they are copied
+        return [
+            dict(properties)
+            for name in subset_names
+            for properties in items.get(name, [])
+        ]
 
 
 class _BaseManifestValidator(ABC):
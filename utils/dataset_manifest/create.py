@@ -19,6 +19,8 @@ def get_args():
         default=os.getcwd())
     parser.add_argument('--sorting', choices=['lexicographical', 'natural', 'predefined', 'random'],
                         type=str, default='lexicographical')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+        help='Number of processes used to read images or to check key frames of a video')
     parser.add_argument('source', type=str, help='Source paths')
     return parser.parse_args()
 
@@ -66,7 +68,7 @@ def main():
             assert len(sources), 'A images was not found'
             manifest = ImageManifestManager(manifest_path=manifest_directory)
             manifest.link(sources=sources, meta=meta, sorting_method=args.sorting,
-                    use_image_hash=True, data_dir=data_dir)
+                    use_image_hash=True, data_dir=data_dir, workers=args.workers)
             manifest.create(_tqdm=tqdm)
         except Exception as ex:
             sys.exit(str(ex))
@@ -74,9 +76,11 @@ def main():
         try:
             assert is_video(source), 'You can specify a video path or a directory/pattern with images'
             manifest = VideoManifestManager(manifest_path=manifest_directory)
-            manifest.link(media_file=source, force=args.force)
+            manifest.link(media_file=source, force=args.force, workers=args.workers)
             try:
                 manifest.create(_tqdm=tqdm)
+                print('Video frames were processed at {:.1f} frames/s'.format(
+                    manifest.reader.throughput))
             except AssertionError as ex:
                 if str(ex) == 'Too few keyframes':
                     msg = 'NOTE: prepared manifest file contains too few key frames for smooth decoding.\n' \
@@ -30,6 +30,16 @@ def md5_hash(frame):
         frame = frame.to_image()
     return hashlib.md5(frame.tobytes()).hexdigest() # nosec
 
+def md5_file_hash(file, block_size=1024 * 1024):
+    """ Getting the hash of the file content without decoding the image """
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            return md5_file_hash(f, block_size)
+    file_hash = hashlib.md5() # nosec
+    for block in iter(lambda: file.read(block_size), b''):
+        file_hash.update(block)
+    return file_hash.hexdigest()
+
 def _define_data_type(media):
     return mimetypes.guess_type(media)[0]
 